@@ -1,64 +1,261 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Request
 from loguru import logger
-from typing import Dict, Any
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from fastapi.responses import StreamingResponse
+from app.core.concurrency import LimiterRejected
+from app.core.config import settings
+from app.core.errors import BackendUnavailable
+from app.data.registry import get_registry
+from app.core.responses import ORJSONResponse, RawJSONResponse
 from app.models.schemas import ChatRequest, ChatResponse, ODataGetRequest, ODataPostRequest
-from app.services.odata_client import ODataService
-from app.services.nlp_router import available as nlp_available, parse_to_intent
+from app.services.chat_plan import PlanStep, execute_plan, parse_plan, writes
+from app.services.odata_client import ODataService, extract_rows
+from app.services.nlp_router import NLPResult, available as nlp_available, aparse_to_intent, chain_stats
+from app.services.query_planner import QueryValidationError, plan_query
+from app.utils.result_format import clean_rows, compact_rows, sse_event
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# How often to check whether the client went away while the LLM is working
+DISCONNECT_POLL_SECONDS = 0.5
+
 def get_service() -> ODataService:
     return ODataService()
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest, service: ODataService = Depends(get_service)):
+async def _cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """Await `work`, cancelling it if the HTTP client disconnects first."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected; cancelling NLP call")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _get_request(intent: Dict[str, Any], result_format: str) -> ODataGetRequest:
+    return ODataGetRequest(**{
+        "service": intent["service"],
+        "entity": intent["entity"],
+        "fields": intent.get("fields"),
+        "filters": intent.get("filters"),
+        "top": intent.get("top", 100),
+        "skip": intent.get("skip", 0),
+        "orderby": intent.get("orderby"),
+        "result_format": result_format,
+    })
+
+def _post_request(kind: str, intent: Dict[str, Any], confirm: bool) -> ODataPostRequest:
+    return ODataPostRequest(**{
+        "action": "create" if kind == "create" else "update",
+        "service": intent["service"],
+        "entity": intent["entity"],
+        "key_fields": intent.get("key_fields"),
+        "payload": intent.get("payload") or {},
+        "confirm": bool(intent.get("confirm", False) or confirm)
+    })
+
+def _require_confirm(req: ChatRequest, steps: List[PlanStep]) -> None:
+    """Plans with writes follow the same preview/confirm rules as single intents."""
+    if writes(steps) and not req.preview_only and not req.confirm:
+        raise HTTPException(status_code=400, detail="confirm must be true to execute create/update")
+
+async def _run_plan(req: ChatRequest, steps: List[PlanStep], service: ODataService,
+                    on_outcome: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+
+    async def run(intent: Dict[str, Any]) -> Tuple[str, Any, List[Dict[str, Any]]]:
+        kind = intent["intent"]
+        if kind == "get":
+            get_body = _get_request(intent, req.result_format)
+            body = await service.execute_get(get_body)
+            if isinstance(body, dict) and "error" in body:
+                raise ValueError(f"gateway error: {body['error']}")
+            rows, _ = extract_rows(body)
+            return "get", (body if req.result_format == "odata" else service.compact(get_body, body)), rows
+        post_body = _post_request(kind, intent, req.confirm)
+        if req.preview_only:
+            return "preview", (await service.preview_post(post_body)).model_dump(), []
+        data = await service.execute_post(post_body)
+        created = data.get("d") if isinstance(data, dict) else None
+        return "executed", data, [created] if isinstance(created, dict) else []
+
+    return await execute_plan(steps, run, on_outcome)
+
+async def _understand(req: ChatRequest, request: Request) -> Tuple[NLPResult, Optional[List[PlanStep]]]:
+    """Parse the message into an intent (or plan) and apply `allowed_services`; errors map to HTTP status."""
     if not nlp_available():
         raise HTTPException(status_code=503, detail="NLP (LangChain) is disabled or unavailable")
     try:
-        nlp = parse_to_intent(req.message)
+        nlp = await _cancel_on_disconnect(request, aparse_to_intent(req.message, req.allowed_services))
+    except HTTPException:
+        raise
+    except LimiterRejected as e:
+        raise HTTPException(status_code=503, detail=f"NLP busy: {e}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="NLP parsing timed out")
     except Exception as e:
         logger.exception("NLP parsing failed")
         raise HTTPException(status_code=400, detail=f"NLP parsing failed: {e}")
 
-    # Optional restriction to allowed_services
     intent = nlp.intent_json
-    if req.allowed_services and intent.get("service") not in set(req.allowed_services):
+    steps = None
+    if intent.get("intent") == "plan":
+        try:
+            steps = parse_plan(intent)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid plan: {e}")
+        services = {s.intent.get("service") for s in steps}
+    else:
+        services = {intent.get("service")}
+
+    # Optional restriction to allowed_services
+    if req.allowed_services and not services <= set(req.allowed_services):
         raise HTTPException(status_code=403, detail="Service not allowed by policy")
+    return nlp, steps
 
-    # Route based on intent
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest, request: Request, service: ODataService = Depends(get_service)):
+    nlp, steps = await _understand(req, request)
+    intent = nlp.intent_json
     kind = intent.get("intent")
+
+    # Route based on intent
+    if kind == "plan":
+        _require_confirm(req, steps)
+        outcomes = await _run_plan(req, steps, service)
+        return ChatResponse(ok=all(o["ok"] for o in outcomes), stage="plan", intent="plan", nlp_json=intent,
+                            nlp_source=nlp.source, result={"steps": outcomes})
     if kind == "get":
-        get_body = ODataGetRequest(**{
-            "service": intent["service"],
-            "entity": intent["entity"],
-            "fields": intent.get("fields"),
-            "filters": intent.get("filters"),
-            "top": intent.get("top", 100),
-            "skip": intent.get("skip", 0),
-            "orderby": intent.get("orderby")
-        })
-        data = await service.execute_get(get_body)
-        return ChatResponse(ok=True, stage="get", intent="get", nlp_json=intent, result=data)
+        get_body = _get_request(intent, req.result_format)
+        envelope = ChatResponse(ok=True, stage="get", intent="get", nlp_json=intent, nlp_source=nlp.source)
+        if req.result_format != "odata":
+            data = await service.execute_get_compact(get_body)
+            return ORJSONResponse({**envelope.model_dump(mode="json", exclude={"result"}), "result": data})
+        if settings.ODATA_RAW_PASSTHROUGH:
+            raw = await service.execute_get_raw(get_body)
+            return RawJSONResponse(envelope.model_dump(mode="json", exclude={"result"}), "result", raw)
+        return envelope.model_copy(update={"result": await service.execute_get(get_body)})
 
     elif kind in ("create","update"):
-        post_body = ODataPostRequest(**{
-            "action": "create" if kind == "create" else "update",
-            "service": intent["service"],
-            "entity": intent["entity"],
-            "key_fields": intent.get("key_fields"),
-            "payload": intent.get("payload") or {},
-            "confirm": bool(intent.get("confirm", False) or req.confirm)
-        })
+        post_body = _post_request(kind, intent, req.confirm)
 
         # Always preview first unless explicitly told not to
         if req.preview_only:
             preview = await service.preview_post(post_body)
-            return ChatResponse(ok=True, stage="preview", intent=kind, nlp_json=intent, resolved_endpoint=preview.url, result=preview.model_dump())
+            return ChatResponse(ok=True, stage="preview", intent=kind, nlp_json=intent, nlp_source=nlp.source, resolved_endpoint=preview.url, result=preview.model_dump())
         else:
             if not post_body.confirm:
                 raise HTTPException(status_code=400, detail="confirm must be true to execute create/update")
             data = await service.execute_post(post_body)
-            return ChatResponse(ok=True, stage="executed", intent=kind, nlp_json=intent, result=data)
+            return ChatResponse(ok=True, stage="executed", intent=kind, nlp_json=intent, nlp_source=nlp.source, result=data)
 
     else:
         raise HTTPException(status_code=400, detail="Unsupported intent")
+
+def _stream_status(e: Exception) -> int:
+    if isinstance(e, HTTPException):
+        return e.status_code
+    if isinstance(e, QueryValidationError):
+        return 400
+    if isinstance(e, BackendUnavailable):
+        return 503
+    return 500
+
+async def _get_events(req: ChatRequest, request: Request, get_body: ODataGetRequest, service: ODataService) -> AsyncIterator[bytes]:
+    """`rows` events, one per gateway page, without holding more than a page."""
+    total = get_body.top or 100
+    _, entity = get_registry().entity(get_body.service, get_body.entity)
+    pages = service.iter_pages(get_body.model_copy(update={"top": min(total, settings.CHAT_STREAM_PAGE_SIZE)}), limit=total)
+    sent = 0
+    try:
+        async for rows in pages:
+            if await request.is_disconnected():
+                logger.info("Chat stream: client disconnected, stopping")
+                return
+            sent += len(rows)
+            if req.result_format == "odata":
+                yield sse_event("rows", {"rows": clean_rows(rows)})
+            else:
+                yield sse_event("rows", compact_rows(rows, get_body.fields, entity.field_types, req.result_format))
+    finally:
+        await pages.aclose()
+    yield sse_event("done", {"ok": True, "count": sent})
+
+async def _plan_events(req: ChatRequest, steps: List[PlanStep], service: ODataService) -> AsyncIterator[bytes]:
+    """One `step` event per plan step, in completion order."""
+    finished: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    task = asyncio.ensure_future(_run_plan(req, steps, service, finished.put_nowait))
+    try:
+        for _ in steps:
+            yield sse_event("step", await finished.get())
+        outcomes = await task
+    finally:
+        task.cancel()
+    yield sse_event("done", {"ok": all(o["ok"] for o in outcomes), "count": len(outcomes)})
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request, service: ODataService = Depends(get_service)):
+    """Server-sent events for a chat turn, sent as each stage finishes.
+
+    `intent` (nlp_json), then `endpoint` and `rows` chunks for reads, `endpoint` and `preview` /
+    `executed` for writes, or one `step` per plan step; `done` closes the stream. NLP, policy and
+    query validation errors are HTTP errors; anything failing later arrives as an `error` event.
+    """
+    nlp, steps = await _understand(req, request)
+    intent = nlp.intent_json
+    kind = intent.get("intent")
+    if kind not in ("get", "create", "update", "plan"):
+        raise HTTPException(status_code=400, detail="Unsupported intent")
+    get_body = post_body = None
+    endpoint = None
+    if kind == "plan":
+        _require_confirm(req, steps)
+    elif kind == "get":
+        get_body = _get_request(intent, req.result_format)
+        try:
+            endpoint = plan_query(get_body, allow_key_lookup=False).url(
+                service.base_url, min(get_body.top or 100, settings.CHAT_STREAM_PAGE_SIZE), get_body.skip)
+        except QueryValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        post_body = _post_request(kind, intent, req.confirm)
+        if not req.preview_only and not post_body.confirm:
+            raise HTTPException(status_code=400, detail="confirm must be true to execute create/update")
+
+    async def events() -> AsyncIterator[bytes]:
+        yield sse_event("intent", {"intent": kind, "nlp_json": intent, "nlp_source": nlp.source})
+        try:
+            if kind == "plan":
+                async for event in _plan_events(req, steps, service):
+                    yield event
+            elif kind == "get":
+                yield sse_event("endpoint", {"resolved_endpoint": endpoint, "method": "GET"})
+                async for event in _get_events(req, request, get_body, service):
+                    yield event
+            else:
+                preview = await service.preview_post(post_body)
+                yield sse_event("endpoint", {"resolved_endpoint": preview.url, "method": preview.method})
+                if req.preview_only:
+                    yield sse_event("preview", preview.model_dump())
+                else:
+                    yield sse_event("executed", {"result": await service.execute_post(post_body)})
+                yield sse_event("done", {"ok": True})
+        except Exception as e:
+            logger.exception("Chat stream failed")
+            yield sse_event("error", {"status": _stream_status(e), "detail": getattr(e, "detail", None) or str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/chat/stats")
+def chat_stats():
+    """Cached NLP chains with their registry version and system-prompt token count."""
+    return chain_stats()
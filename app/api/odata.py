@@ -1,7 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from app.models.schemas import (
     ODataGetRequest,
+    ODataJoinRequest,
+    ODataStreamRequest,
+    ODataBatchRequest,
+    ODataBatchResponse,
     ODataPostRequest,
     ODataPreviewResponse,
     ODataExecResponse,
@@ -9,6 +14,14 @@ from app.models.schemas import (
 )
 from app.services.odata_client import ODataService
 from app.core.config import settings
+from app.core.errors import BackendUnavailable
+from app.core.responses import ORJSONResponse, RawJSONResponse
+from app.data import registry as registry_store
+from app.services.response_cache import response_cache
+from app.services.replica import get_replica
+from app.services.query_planner import QueryValidationError, plan_stats
+from app.services.csrf_cache import csrf_cache
+from app.utils.result_format import CsvWriter, ndjson_lines
 
 router = APIRouter()
 
@@ -20,17 +33,106 @@ def get_registry(service: ODataService = Depends(get_service)):
     """Return the dynamic service/entity/field registry used to build OData URLs."""
     return service.get_registry()
 
+@router.get("/registry/version")
+def get_registry_version():
+    """Version and content hash of the in-memory registry (bumped on hot reload)."""
+    reg = registry_store.get_registry()
+    return {"version": reg.version, "digest": reg.digest, "services": len(reg.services)}
+
+@router.get("/cache/stats")
+def cache_stats():
+    """GET response cache, CSRF token cache and query plan cache counters."""
+    return {"get": response_cache.stats(), "csrf": csrf_cache.stats(), "plans": plan_stats()}
+
+@router.get("/replica/stats")
+def replica_stats():
+    """Replicated entity sets (rows, watermark, age of the last sync) and local read counters."""
+    replica = get_replica()
+    return replica.stats() if replica is not None else {"enabled": False}
+
+@router.post("/replica/sync")
+async def replica_sync(full: bool = False, service: ODataService = Depends(get_service)):
+    """Sync the replicated entity sets now; `full=true` reloads them completely."""
+    replica = get_replica()
+    if replica is None:
+        raise HTTPException(status_code=409, detail="Replica is disabled (REPLICA_ENABLED=false)")
+    return await replica.sync(service, full=full)
+
 @router.post("/get", response_model=ODataExecResponse)
 async def odata_get(request: ODataGetRequest, service: ODataService = Depends(get_service)):
     """Execute a GET on the target entity with optional filters."""
     logger.info(f"GET flow: service={request.service}, entity={request.entity}, filters={request.filters}")
     try:
+        if request.result_format != "odata":
+            data = await service.execute_get_compact(request)
+            return ORJSONResponse({"ok": True, "step": "get", "message": "GET executed", "data": data})
+        if settings.ODATA_RAW_PASSTHROUGH:
+            raw = await service.execute_get_raw(request)
+            return RawJSONResponse({"ok": True, "step": "get", "message": "GET executed"}, "data", raw)
         data = await service.execute_get(request)
         return ODataExecResponse(ok=True, step="get", message="GET executed", data=data)
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception("GET failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/get/joined", response_model=ODataExecResponse)
+async def odata_get_joined(request: ODataJoinRequest, service: ODataService = Depends(get_service)):
+    """Read header rows with their items nested, via $expand or a server-side join."""
+    logger.info(f"GET joined: service={request.service}, header={request.header}, items={request.items}, strategy={request.strategy}")
+    try:
+        strategy, data = await service.execute_get_joined(request)
+        return ORJSONResponse({"ok": True, "step": "get", "message": f"GET executed ({strategy})", "data": data})
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.exception("GET joined failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/get/stream")
+async def odata_get_stream(request: ODataStreamRequest, http_request: Request, service: ODataService = Depends(get_service)):
+    """Stream all matching rows as NDJSON or CSV, following server paging up to `limit` rows."""
+    logger.info(f"GET stream: service={request.service}, entity={request.entity}, limit={request.limit}, format={request.format}")
+    if request.parallel:
+        pages = service.iter_pages_parallel(request, limit=request.limit)
+    else:
+        pages = service.iter_pages(request, limit=request.limit)
+    try:
+        # fetch the first page before committing to a 200 so errors still map to HTTP status
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.exception("GET stream failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    encode = CsvWriter(request.fields).lines if request.format == "csv" else ndjson_lines
+
+    async def body():
+        try:
+            for line in encode(first):
+                yield line
+            async for rows in pages:
+                if await http_request.is_disconnected():
+                    logger.info("GET stream: client disconnected, stopping")
+                    break
+                for line in encode(rows):
+                    yield line
+        finally:
+            await pages.aclose()
+
+    media_type = "text/csv" if request.format == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
+
 @router.post("/post/preview", response_model=ODataPreviewResponse)
 async def odata_post_preview(request: ODataPostRequest, service: ODataService = Depends(get_service)):
     """Return a preview of the POST (create/update) call: resolved URL, payload, headers (sans secrets)."""
@@ -51,6 +153,33 @@ async def odata_post_confirm(request: ODataPostRequest, service: ODataService =
     try:
         data = await service.execute_post(request)
         return ODataExecResponse(ok=True, step="post", message="POST executed", data=data)
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception("POST execution failed")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch/preview", response_model=list[ODataPreviewResponse])
+async def odata_batch_preview(request: ODataBatchRequest, service: ODataService = Depends(get_service)):
+    """Preview every operation of a batch (resolved URL, method, payload)."""
+    logger.info(f"BATCH preview: {len(request.operations)} operations")
+    try:
+        return [await service.preview_post(op) for op in request.operations]
+    except Exception as e:
+        logger.exception("BATCH preview failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch/confirm", response_model=ODataBatchResponse)
+async def odata_batch_confirm(request: ODataBatchRequest, service: ODataService = Depends(get_service)):
+    """Execute create/update operations as OData $batch requests ONLY when confirm=True."""
+    if not request.confirm:
+        raise HTTPException(status_code=400, detail="confirm must be true to execute BATCH")
+    logger.info(f"BATCH execute: {len(request.operations)} operations, atomic={request.atomic}")
+    try:
+        results = await service.execute_batch(request.operations, atomic=request.atomic, batch_size=request.batch_size)
+        return ODataBatchResponse(ok=all(r.ok for r in results), results=results)
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.exception("BATCH execution failed")
+        raise HTTPException(status_code=500, detail=str(e))
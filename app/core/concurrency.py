@@ -0,0 +1,103 @@
+import asyncio, time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from app.core.errors import BackendUnavailable
+
+class LimiterRejected(BackendUnavailable):
+    """Raised when a limiter's wait queue is full or the caller waited longer than allowed."""
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue and an optional queue timeout.
+
+    At most ``max_concurrency`` holders run at once; up to ``max_queue`` more may wait
+    (``None`` = unbounded). Waiting longer than ``queue_timeout`` seconds raises
+    LimiterRejected so callers can fail fast instead of piling up.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self._sem.locked() and not self.waiting:
+            # free slot and nobody queued: take it without suspending (wait_for would yield to
+            # other callers first); with waiters, a newcomer queues behind them instead of barging
+            await self._sem.acquire()
+        else:
+            if self.max_queue is not None and self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LimiterRejected(f"{self.name}: queue full ({self.waiting} waiting)")
+            self.waiting += 1
+            try:
+                if self.queue_timeout is not None:
+                    await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+                else:
+                    await self._sem.acquire()
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LimiterRejected(f"{self.name}: queued longer than {self.queue_timeout}s")
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+class TokenBucket:
+    """Rate limiter: `rate` tokens per second, bursts up to `burst`.
+
+    Callers reserve a token and sleep until it is due; if that would take longer than
+    `timeout` seconds they are rejected instead.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[int] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst or int(rate) or 1)
+        self.tokens = float(self.burst)
+        self._last = time.monotonic()
+        self.rejected = 0
+
+    async def take(self, timeout: Optional[float] = None) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return
+        wait = (1 - self.tokens) / self.rate
+        if timeout is not None and wait > timeout:
+            self.rejected += 1
+            raise LimiterRejected(f"{self.name}: rate limited ({self.rate}/s)")
+        self.tokens -= 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.refund()
+            raise
+
+    def refund(self) -> None:
+        """Return a token taken by a caller that never made its call (cancelled or rejected later)."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "tokens": round(self.tokens, 2), "rejected": self.rejected}
@@ -21,9 +21,98 @@ class Settings(BaseModel):
     SAP_OAUTH_CLIENT_ID: str = os.getenv("SAP_OAUTH_CLIENT_ID", "")
     SAP_OAUTH_CLIENT_SECRET: str = os.getenv("SAP_OAUTH_CLIENT_SECRET", "")
     SAP_OAUTH_SCOPE: str = os.getenv("SAP_OAUTH_SCOPE", "openid")
+    SAP_OAUTH_REFRESH_MARGIN: float = float(os.getenv("SAP_OAUTH_REFRESH_MARGIN", "60"))
+
+    # Shared HTTP connection pool to the SAP gateway
+    SAP_HTTP_MAX_CONNECTIONS: int = int(os.getenv("SAP_HTTP_MAX_CONNECTIONS", "100"))
+    SAP_HTTP_MAX_KEEPALIVE: int = int(os.getenv("SAP_HTTP_MAX_KEEPALIVE", "20"))
+    SAP_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("SAP_HTTP_KEEPALIVE_EXPIRY", "30"))
+    SAP_HTTP2: bool = os.getenv("SAP_HTTP2", "false").lower() == "true"
+    SAP_HTTP_VERIFY: bool = os.getenv("SAP_HTTP_VERIFY", "true").lower() == "true"
+    SAP_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("SAP_HTTP_CONNECT_TIMEOUT", "10"))
+    SAP_HTTP_READ_TIMEOUT: float = float(os.getenv("SAP_HTTP_READ_TIMEOUT", "60"))
+    SAP_HTTP_WRITE_TIMEOUT: float = float(os.getenv("SAP_HTTP_WRITE_TIMEOUT", "60"))
+    SAP_HTTP_POOL_TIMEOUT: float = float(os.getenv("SAP_HTTP_POOL_TIMEOUT", "10"))
+
+    # Retries: attempts per call, backoff (seconds), global budget (retry tokens earned per request,
+    # refill per second, max tokens) and per-service circuit breaker
+    SAP_RETRY_MAX_ATTEMPTS: int = int(os.getenv("SAP_RETRY_MAX_ATTEMPTS", "3"))
+    SAP_RETRY_BASE_DELAY: float = float(os.getenv("SAP_RETRY_BASE_DELAY", "0.25"))
+    SAP_RETRY_MAX_DELAY: float = float(os.getenv("SAP_RETRY_MAX_DELAY", "8"))
+    SAP_RETRY_BUDGET_RATIO: float = float(os.getenv("SAP_RETRY_BUDGET_RATIO", "0.2"))
+    SAP_RETRY_BUDGET_MIN_PER_SEC: float = float(os.getenv("SAP_RETRY_BUDGET_MIN_PER_SEC", "1"))
+    SAP_RETRY_BUDGET_CAP: float = float(os.getenv("SAP_RETRY_BUDGET_CAP", "50"))
+    SAP_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("SAP_BREAKER_FAILURE_THRESHOLD", "5"))
+    SAP_BREAKER_RESET_TIMEOUT: float = float(os.getenv("SAP_BREAKER_RESET_TIMEOUT", "30"))
+
+    # Bulkheads: per-service defaults (registry.json "limits" overrides) and a global cap on SAP calls
+    SAP_SERVICE_MAX_CONCURRENCY: int = int(os.getenv("SAP_SERVICE_MAX_CONCURRENCY", "16"))
+    SAP_SERVICE_MAX_QUEUE: int = int(os.getenv("SAP_SERVICE_MAX_QUEUE", "100"))
+    SAP_GLOBAL_MAX_CONCURRENCY: int = int(os.getenv("SAP_GLOBAL_MAX_CONCURRENCY", "64"))
+    SAP_GLOBAL_MAX_QUEUE: int = int(os.getenv("SAP_GLOBAL_MAX_QUEUE", "500"))
+    SAP_LIMIT_QUEUE_TIMEOUT: float = float(os.getenv("SAP_LIMIT_QUEUE_TIMEOUT", "2"))
+
+    # Upper bound for ODataGetRequest.parallel (concurrent $skip windows per read)
+    SAP_FANOUT_MAX_PARALLEL: int = int(os.getenv("SAP_FANOUT_MAX_PARALLEL", "8"))
+    # Header keys per item request in header/item joins (`(Key eq 'a' or Key eq 'b' ...)`);
+    # chunks are fetched SAP_FANOUT_MAX_PARALLEL at a time
+    ODATA_JOIN_CHUNK_SIZE: int = int(os.getenv("ODATA_JOIN_CHUNK_SIZE", "40"))
+    # ...and at most this many URL-encoded characters of key filter, so the URL stays under the gateway limit
+    ODATA_JOIN_MAX_FILTER_LENGTH: int = int(os.getenv("ODATA_JOIN_MAX_FILTER_LENGTH", "2048"))
+
+    # Compiled GET query plans kept per request shape (service, entity, fields, filter ops, orderby)
+    QUERY_PLAN_CACHE_SIZE: int = int(os.getenv("QUERY_PLAN_CACHE_SIZE", "512"))
+
+    # Splice the gateway's JSON body into GET responses without decoding/re-encoding it
+    ODATA_RAW_PASSTHROUGH: bool = os.getenv("ODATA_RAW_PASSTHROUGH", "true").lower() == "true"
+
+    # Operations per $batch request (ODataBatchRequest.batch_size overrides)
+    SAP_BATCH_SIZE: int = int(os.getenv("SAP_BATCH_SIZE", "100"))
+
+    # GET response cache (opt-in: cached reads can be up to the TTL stale): default TTL for entities
+    # without registry "cache_ttl" (0 = not cached)
+    SAP_GET_CACHE_ENABLED: bool = os.getenv("SAP_GET_CACHE_ENABLED", "false").lower() == "true"
+    SAP_GET_CACHE_TTL: float = float(os.getenv("SAP_GET_CACHE_TTL", "0"))
+    SAP_GET_CACHE_MAX_BYTES: int = int(os.getenv("SAP_GET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Local replica of registry entities flagged "replica" (SQLite; empty path = app/data/replica.sqlite3).
+    # Synced every REPLICA_SYNC_INTERVAL s by the change field, in full every REPLICA_FULL_SYNC_INTERVAL s;
+    # reads are answered locally while the last sync is younger than REPLICA_MAX_STALENESS s (and, unless the
+    # change field tracks updates, the last full sync younger than REPLICA_FULL_SYNC_INTERVAL s)
+    REPLICA_ENABLED: bool = os.getenv("REPLICA_ENABLED", "false").lower() == "true"
+    REPLICA_PATH: str = os.getenv("REPLICA_PATH", "")
+    REPLICA_SYNC_INTERVAL: float = float(os.getenv("REPLICA_SYNC_INTERVAL", "60"))
+    REPLICA_FULL_SYNC_INTERVAL: float = float(os.getenv("REPLICA_FULL_SYNC_INTERVAL", "86400"))
+    REPLICA_MAX_STALENESS: float = float(os.getenv("REPLICA_MAX_STALENESS", "300"))
+    REPLICA_PAGE_SIZE: int = int(os.getenv("REPLICA_PAGE_SIZE", "1000"))
+
+    # Cached CSRF token lifetime per service path (seconds); a 403 "Required" refreshes early
+    SAP_CSRF_TTL: float = float(os.getenv("SAP_CSRF_TTL", "900"))
+
+    # Service registry (empty path = bundled app/data/registry.json; interval 0 disables hot reload)
+    REGISTRY_PATH: str = os.getenv("REGISTRY_PATH", "")
+    REGISTRY_RELOAD_INTERVAL: float = float(os.getenv("REGISTRY_RELOAD_INTERVAL", "5"))
+    # Services typed from their $metadata at startup: "NAME=BASE_PATH,..." (parsed EDMX cached by hash)
+    REGISTRY_EDMX_SERVICES: str = os.getenv("REGISTRY_EDMX_SERVICES", "")
+    REGISTRY_EDMX_CACHE_DIR: str = os.getenv("REGISTRY_EDMX_CACHE_DIR", "")
 
     USE_LANGCHAIN: bool = os.getenv("USE_LANGCHAIN", "false").lower() == "true"
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gpt-4o-mini")
+    # Async NLP path: concurrent LLM calls, waiting callers, max wait and per-call timeout (seconds)
+    NLP_MAX_CONCURRENCY: int = int(os.getenv("NLP_MAX_CONCURRENCY", "8"))
+    NLP_MAX_QUEUE: int = int(os.getenv("NLP_MAX_QUEUE", "64"))
+    NLP_QUEUE_TIMEOUT: float = float(os.getenv("NLP_QUEUE_TIMEOUT", "10"))
+    NLP_TIMEOUT: float = float(os.getenv("NLP_TIMEOUT", "30"))
+    # Cache of validated GET intents by normalized message (TTL seconds; 0 disables)
+    NLP_CACHE_SIZE: int = int(os.getenv("NLP_CACHE_SIZE", "1024"))
+    NLP_CACHE_TTL: float = float(os.getenv("NLP_CACHE_TTL", "600"))
+    # Rule-based parser for simple GET/key lookups; below the threshold the LLM is used
+    FAST_INTENT_ENABLED: bool = os.getenv("FAST_INTENT_ENABLED", "true").lower() == "true"
+    FAST_INTENT_THRESHOLD: float = float(os.getenv("FAST_INTENT_THRESHOLD", "0.8"))
+    # Most steps accepted in one multi-step chat plan
+    CHAT_PLAN_MAX_STEPS: int = int(os.getenv("CHAT_PLAN_MAX_STEPS", "8"))
+    # Gateway page size behind /api/chat/stream: each page becomes one `rows` event
+    CHAT_STREAM_PAGE_SIZE: int = int(os.getenv("CHAT_STREAM_PAGE_SIZE", "200"))
 
 settings = Settings()
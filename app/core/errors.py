@@ -0,0 +1,2 @@
+class BackendUnavailable(RuntimeError):
+    """The SAP backend is refusing work right now (circuit open, queue full, ...); maps to HTTP 503."""
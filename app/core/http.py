@@ -0,0 +1,92 @@
+import httpx, weakref
+from typing import Any, Dict, Optional
+from loguru import logger
+from app.core.config import settings
+
+# One process-wide client so every ODataService reuses the same keep-alive pool
+_client: Optional[httpx.AsyncClient] = None
+# HTTP/2 as actually applied per client built here (SAP_HTTP2 falls back without the h2 package)
+_http2_applied: "weakref.WeakKeyDictionary[httpx.AsyncClient, bool]" = weakref.WeakKeyDictionary()
+
+def _http2_enabled() -> bool:
+    if not settings.SAP_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except Exception:
+        logger.warning("SAP_HTTP2=true but the 'h2' package is not installed; falling back to HTTP/1.1")
+        return False
+
+def build_http_client(**overrides) -> httpx.AsyncClient:
+    """Create an AsyncClient tuned from settings (limits, keep-alive, per-phase timeouts)."""
+    limits = httpx.Limits(
+        max_connections=settings.SAP_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SAP_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.SAP_HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=settings.SAP_HTTP_CONNECT_TIMEOUT,
+        read=settings.SAP_HTTP_READ_TIMEOUT,
+        write=settings.SAP_HTTP_WRITE_TIMEOUT,
+        pool=settings.SAP_HTTP_POOL_TIMEOUT,
+    )
+    kwargs: Dict[str, Any] = {
+        "limits": limits,
+        "timeout": timeout,
+        "verify": settings.SAP_HTTP_VERIFY,
+        "http2": _http2_enabled(),
+    }
+    kwargs.update(overrides)
+    client = httpx.AsyncClient(**kwargs)
+    _http2_applied[client] = bool(kwargs["http2"])
+    return client
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily if the app lifespan did not."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_http_client()
+    return _client
+
+def set_http_client(client: Optional[httpx.AsyncClient]) -> None:
+    """Install a specific client (used by tests and benchmarks)."""
+    global _client
+    _client = client
+
+async def startup_http_client() -> httpx.AsyncClient:
+    client = get_http_client()
+    logger.info(
+        "HTTP pool started (max_connections={}, keepalive={}, http2={})",
+        settings.SAP_HTTP_MAX_CONNECTIONS, settings.SAP_HTTP_MAX_KEEPALIVE, _http2_applied.get(client),
+    )
+    return client
+
+async def shutdown_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("HTTP pool closed")
+    _client = None
+
+def pool_stats() -> Dict[str, Any]:
+    """Snapshot of the shared pool: configured limits and live connection states."""
+    stats: Dict[str, Any] = {
+        "started": _client is not None and not _client.is_closed,
+        "max_connections": settings.SAP_HTTP_MAX_CONNECTIONS,
+        "max_keepalive": settings.SAP_HTTP_MAX_KEEPALIVE,
+        "keepalive_expiry": settings.SAP_HTTP_KEEPALIVE_EXPIRY,
+        "http2": _http2_applied.get(_client) if _client is not None else None,   # None: not built here
+        "connections": 0,
+        "active": 0,
+        "idle": 0,
+    }
+    if not stats["started"]:
+        return stats
+    # httpcore keeps the pool on the transport; not every transport (e.g. MockTransport) has one
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    conns = list(getattr(pool, "connections", []) or [])
+    stats["connections"] = len(conns)
+    stats["idle"] = sum(1 for c in conns if c.is_idle())
+    stats["active"] = stats["connections"] - stats["idle"]
+    return stats
@@ -0,0 +1,172 @@
+"""Minimal in-process metrics with Prometheus text exposition (no extra dependency).
+
+Counters and histograms are plain dicts keyed by label tuples, so recording a sample is a
+dict lookup and a few additions. Gauges are read from callbacks at scrape time. Metrics join
+the process-wide list rendered at /metrics unless given their own `registry` list.
+"""
+import asyncio, functools, math, time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics: List["_Metric"] = []
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional[List["_Metric"]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        (_metrics if registry is None else registry).append(self)
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional[List[_Metric]] = None):
+        super().__init__(name, help, labelnames, registry)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, v in list(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 registry: Optional[List[_Metric]] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: Any) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: Any):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def count(self, *labels: Any) -> int:
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+class GaugeCallback(_Metric):
+    """Gauge whose samples come from `fn()` -> {label values tuple: number} at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], fn: Callable[[], Dict[tuple, float]],
+                 registry: Optional[List[_Metric]] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.fn = fn
+
+    def samples(self) -> Iterable[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        for labels, v in values.items():
+            if v is not None:
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+def timed(hist: Histogram, labels: Callable[..., Tuple], result_labels: Optional[Callable[[Any], Tuple]] = None):
+    """Decorator timing a sync or async function into `hist`.
+
+    `labels(*args, **kwargs)` gives the label values; with `result_labels`, its output on the
+    return value is appended (or "error" for every appended label if the call raised).
+    """
+    def decorate(fn):
+        def _observe(t0: float, args, kwargs, result: Any, failed: bool) -> None:
+            values = tuple(labels(*args, **kwargs))
+            if result_labels is not None:
+                values += ("error",) * (len(hist.labelnames) - len(values)) if failed else tuple(result_labels(result))
+            hist.observe(time.perf_counter() - t0, *values)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    _observe(t0, args, kwargs, None, True)
+                    raise
+                _observe(t0, args, kwargs, result, False)
+                return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    _observe(t0, args, kwargs, None, True)
+                    raise
+                _observe(t0, args, kwargs, result, False)
+                return result
+        return wrapper
+    return decorate
+
+def render(registry: Optional[List[_Metric]] = None) -> str:
+    """Exposition text of the process-wide metrics, or of a separate `registry` list."""
+    return "\n".join(m.render() for m in (_metrics if registry is None else registry)) + "\n"
+
+# ---------------- pipeline metrics ----------------
+HTTP_REQUESTS = Counter("app_http_requests_total", "API requests by route, method and status", ("route", "method", "status"))
+HTTP_LATENCY = Histogram("app_http_request_duration_seconds", "API request latency by route and method", ("route", "method"))
+ODATA_LATENCY = Histogram("odata_operation_duration_seconds", "ODataService operation latency (incl. cache, retries)", ("operation", "service", "entity"))
+SAP_HTTP_LATENCY = Histogram("sap_http_request_duration_seconds", "Single HTTP attempt against the SAP gateway", ("service", "method", "status"))
+SAP_RETRIES = Counter("sap_http_retries_total", "Retries of SAP HTTP requests", ("service", "method"))
+CSRF_LATENCY = Histogram("sap_csrf_fetch_duration_seconds", "CSRF token fetch latency", ("service",))
+NLP_LATENCY = Histogram("nlp_parse_duration_seconds", "Chat intent parsing latency by serving path", ("path",))
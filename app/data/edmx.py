@@ -0,0 +1,246 @@
+"""EDMX `$metadata` ingestion into the typed registry format.
+
+The document is read with a streaming parser (`iterparse`); only the entity types, associations
+and entity sets needed for the registry are kept. A service becomes a registry entry whose
+entities carry `field_types`, `key_fields`, `navigation` and the `non_filterable` /
+`non_sortable` lists from the SAP annotations. Results are cached on disk by the EDMX content
+hash, so unchanged metadata is parsed once.
+
+    python -m app.data.edmx Z_SALES Z_SALES_SRV --file metadata.xml      # print typed entry
+    python -m app.data.edmx Z_SALES Z_SALES_SRV --fetch --merge           # fetch and merge into registry.json
+"""
+import argparse, asyncio, hashlib, io, json, os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+from loguru import logger
+from app.core.config import settings
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / "edmx_cache"
+SAP_NS = "http://www.sap.com/Protocols/SAPData"
+
+# Edm type -> registry field type (drives literal formatting and typed results)
+EDM_TYPES = {
+    "Edm.String": "string",
+    "Edm.Byte": "int", "Edm.SByte": "int", "Edm.Int16": "int", "Edm.Int32": "int",
+    "Edm.Int64": "int64",
+    "Edm.Decimal": "decimal",
+    "Edm.Double": "float",
+    "Edm.Single": "single",
+    "Edm.Boolean": "bool",
+    "Edm.DateTime": "datetime",
+    "Edm.DateTimeOffset": "datetimeoffset",
+    "Edm.Time": "time",
+    "Edm.Guid": "guid",
+    "Edm.Binary": "binary",
+}
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _sap(attrib: Dict[str, str], name: str, default: str = "true") -> str:
+    return attrib.get(f"{{{SAP_NS}}}{name}", default)
+
+def _short(qualified: str) -> str:
+    return qualified.rsplit(".", 1)[-1]
+
+def parse_edmx(source: Any) -> Dict[str, Dict[str, Any]]:
+    """Entity sets of an EDMX document (bytes, path or file object) as typed registry entities."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    types: Dict[str, Dict[str, Any]] = {}
+    ends: Dict[Tuple[str, str], Tuple[str, str]] = {}   # (association, role) -> (entity type, multiplicity)
+    sets: List[Dict[str, str]] = []
+    current: Optional[Dict[str, Any]] = None
+    association: Optional[str] = None
+    in_key = False
+    for event, elem in iterparse(source, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            if tag == "EntityType":
+                current = {"name": elem.get("Name"), "keys": [], "props": [], "nav": []}
+            elif tag == "Key" and current is not None:
+                in_key = True
+            elif tag == "PropertyRef" and in_key:
+                current["keys"].append(elem.get("Name"))
+            elif tag == "Property" and current is not None:
+                current["props"].append(dict(elem.attrib))
+            elif tag == "NavigationProperty" and current is not None:
+                current["nav"].append(dict(elem.attrib))
+            elif tag == "Association":
+                association = elem.get("Name")
+            elif tag == "End" and association is not None and elem.get("Type"):
+                ends[(association, elem.get("Role"))] = (_short(elem.get("Type")), elem.get("Multiplicity", "1"))
+            elif tag == "EntitySet":
+                sets.append(dict(elem.attrib))
+            continue
+        # end events: free what we no longer need so memory stays flat on large documents
+        if tag == "Key":
+            in_key = False
+        elif tag == "EntityType" and current is not None:
+            types[current["name"]] = current
+            current = None
+        elif tag == "Association":
+            association = None
+        if tag in ("EntityType", "Association", "EntityContainer", "Schema"):
+            elem.clear()
+
+    set_by_type = {_short(s["EntityType"]): s["Name"] for s in sets}
+    entities: Dict[str, Dict[str, Any]] = {}
+    for s in sets:
+        et = types.get(_short(s["EntityType"]))
+        if et is None:
+            continue
+        field_types: Dict[str, str] = {}
+        non_filterable, non_sortable = [], []
+        for p in et["props"]:
+            name = p["Name"]
+            kind = EDM_TYPES.get(p.get("Type", ""), "string")
+            if kind == "datetime" and _sap(p, "display-format", "") == "Date":
+                kind = "date"
+            field_types[name] = kind
+            if _sap(p, "filterable") == "false":
+                non_filterable.append(name)
+            if _sap(p, "sortable") == "false":
+                non_sortable.append(name)
+        navigation = {}
+        for n in et["nav"]:
+            target = ends.get((_short(n.get("Relationship", "")), n.get("ToRole")))
+            if target is not None:
+                navigation[n["Name"]] = {"entity": set_by_type.get(target[0], target[0]), "multiplicity": target[1]}
+        entity: Dict[str, Any] = {
+            "name": s["Name"],
+            "path": s["Name"],
+            "key_fields": et["keys"],
+            "fields": [p["Name"] for p in et["props"]],
+            "field_types": field_types,
+        }
+        if non_filterable or _sap(s, "filterable") == "false":
+            entity["non_filterable"] = list(field_types) if _sap(s, "filterable") == "false" else non_filterable
+        if non_sortable:
+            entity["non_sortable"] = non_sortable
+        if navigation:
+            entity["navigation"] = navigation
+        lengths = {p["Name"]: int(p["MaxLength"]) for p in et["props"]
+                   if p["Name"] in et["keys"] and field_types[p["Name"]] == "string" and p.get("MaxLength", "").isdigit()}
+        if lengths:
+            entity["key_max_lengths"] = lengths
+        entities[s["Name"]] = entity
+    return entities
+
+def typed_service(name: str, base_path: str, edmx: bytes) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "base_path": base_path,
+        "metadata_digest": hashlib.sha256(edmx).hexdigest(),
+        "entities": parse_edmx(edmx),
+    }
+
+def _cache_dir() -> Path:
+    return Path(settings.REGISTRY_EDMX_CACHE_DIR or DEFAULT_CACHE_DIR)
+
+def load_or_parse(name: str, base_path: str, edmx: bytes) -> Dict[str, Any]:
+    """Typed service for `edmx`, from the on-disk cache when this exact document was parsed before."""
+    digest = hashlib.sha256(edmx).hexdigest()
+    path = _cache_dir() / f"{name}.{digest[:16]}.json"
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    service = typed_service(name, base_path, edmx)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(service, f, indent=2)
+    os.replace(tmp, path)
+    logger.info("EDMX for {} parsed: {} entity sets (cached as {})", name, len(service["entities"]), path.name)
+    return service
+
+def latest_cached(name: str) -> Optional[Dict[str, Any]]:
+    """Most recently written typed service for `name`, used when the gateway is unreachable."""
+    candidates = sorted(_cache_dir().glob(f"{name}.*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    if not candidates:
+        return None
+    with open(candidates[0], encoding="utf-8") as f:
+        return json.load(f)
+
+# Hand-maintained keys that EDMX must not overwrite (curated field lists keep prompts small)
+_CURATED = ("name", "path", "fields", "cache_ttl", "replica", "key_formats")
+
+def merge_typed(registry: Dict[str, Any], typed: Dict[str, Any]) -> Dict[str, Any]:
+    """registry.json data with `typed` merged in: types, keys, flags and navigation come from the
+    EDMX, while curated entity keys (fields, cache_ttl, ...) and service limits are kept."""
+    services = dict(registry.get("services", {}))
+    current = dict(services.get(typed["name"], {"name": typed["name"], "base_path": typed["base_path"], "entities": {}}))
+    entities = dict(current.get("entities", {}))
+    for ename, edef in typed["entities"].items():
+        existing = entities.get(ename)
+        if existing is None:
+            entities[ename] = edef
+            continue
+        merged = {**edef, **{k: existing[k] for k in _CURATED if k in existing}}
+        # keep types only for fields the entity exposes, plus its keys
+        exposed = set(merged.get("fields") or edef["fields"]) | set(edef["key_fields"])
+        merged["field_types"] = {f: t for f, t in edef["field_types"].items() if f in exposed}
+        entities[ename] = merged
+    current["entities"] = entities
+    current["metadata_digest"] = typed["metadata_digest"]
+    services[typed["name"]] = current
+    return {**registry, "services": services}
+
+def parse_service_specs(spec: str) -> List[Tuple[str, str]]:
+    """`"Z_SALES=Z_SALES_SRV,Z_MM=Z_MM_PURCH_SRV"` -> [(name, base_path), ...]."""
+    out = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, base_path = item.partition("=")
+        out.append((name.strip(), (base_path or name).strip()))
+    return out
+
+async def fetch_metadata(base_path: str) -> bytes:
+    from app.services.odata_client import ODataService   # services depend on the registry, not vice versa
+    return await ODataService().fetch_metadata(base_path)
+
+async def sync_services(specs: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Fetch (or fall back to cached) EDMX for each service and return the typed services."""
+    typed = []
+    for name, base_path in specs:
+        try:
+            typed.append(load_or_parse(name, base_path, await fetch_metadata(base_path)))
+        except Exception as e:
+            cached = latest_cached(name)
+            if cached is None:
+                logger.warning("EDMX for {} unavailable and not cached: {}", name, e)
+                continue
+            logger.warning("EDMX fetch for {} failed ({}); using cached metadata {}", name, e, cached["metadata_digest"][:16])
+            typed.append(cached)
+    return typed
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("service", help="registry service name, e.g. Z_SALES")
+    ap.add_argument("base_path", help="gateway service path, e.g. Z_SALES_SRV")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="read EDMX from a file")
+    src.add_argument("--fetch", action="store_true", help="GET <SAP_BASE_URL>/<base_path>/$metadata")
+    ap.add_argument("--merge", nargs="?", const="", metavar="REGISTRY",
+                    help="merge into registry.json (default: the configured registry) instead of printing")
+    args = ap.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            edmx = f.read()
+    else:
+        edmx = asyncio.run(fetch_metadata(args.base_path))
+    typed = load_or_parse(args.service, args.base_path, edmx)
+    if args.merge is None:
+        print(json.dumps(typed, indent=2))
+        return
+    from app.data.registry import DEFAULT_REGISTRY_PATH
+    path = args.merge or settings.REGISTRY_PATH or str(DEFAULT_REGISTRY_PATH)
+    with open(path, encoding="utf-8") as f:
+        registry = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(merge_typed(registry, typed), f, indent=2)
+    print(f"merged {len(typed['entities'])} entity sets of {args.service} into {path}")
+
+if __name__ == "__main__":
+    main()
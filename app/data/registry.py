@@ -0,0 +1,222 @@
+import hashlib, json, os, threading, time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from loguru import logger
+from app.core.config import settings
+from app.data.edmx import merge_typed
+from app.models.schemas import ServiceLimits, ServiceRegistryOut
+
+DEFAULT_REGISTRY_PATH = Path(__file__).resolve().parent / "registry.json"
+
+@dataclass(frozen=True)
+class EntityIndex:
+    name: str
+    path: str
+    key_fields: Tuple[str, ...]
+    fields: Tuple[str, ...]
+    key_set: frozenset
+    field_set: frozenset
+    cache_ttl: Optional[float]
+    field_types: Mapping[str, str]
+    non_filterable: frozenset
+    non_sortable: frozenset
+    navigation: Mapping[str, Any]
+    key_formats: Mapping[str, str]           # key field -> regex of its values (curated)
+    key_max_lengths: Mapping[str, int]       # from EDMX MaxLength
+    replica: Optional[Mapping[str, Any]]     # registry `replica` flag (change_field, max_staleness, tracks_updates)
+    raw: Mapping[str, Any]
+
+@dataclass(frozen=True)
+class ServiceIndex:
+    name: str
+    base_path: str
+    entities: Mapping[str, EntityIndex]
+    limits: Optional[ServiceLimits]
+    raw: Mapping[str, Any]
+
+@dataclass(frozen=True)
+class CompiledRegistry:
+    """Immutable, indexed view of registry.json. Swapped as a whole on reload."""
+    version: int
+    path: str
+    mtime: float
+    digest: str
+    services: Mapping[str, ServiceIndex]
+    by_base_path: Mapping[str, ServiceIndex]
+    out: ServiceRegistryOut
+    prompt_view: Mapping[str, Any]
+
+    def service(self, name: str) -> ServiceIndex:
+        svc = self.services.get(name)
+        if not svc:
+            raise ValueError(f"Service '{name}' not found in registry")
+        return svc
+
+    def entity(self, service: str, entity: str) -> Tuple[ServiceIndex, EntityIndex]:
+        svc = self.service(service)
+        ent = svc.entities.get(entity)
+        if not ent:
+            raise ValueError(f"Entity '{entity}' not found in service '{service}'")
+        return svc, ent
+
+def _compile(data: Dict[str, Any], version: int, path: str, mtime: float, digest: str) -> CompiledRegistry:
+    services: Dict[str, ServiceIndex] = {}
+    prompt_view: Dict[str, Any] = {}
+    for sname, sdef in data.get("services", {}).items():
+        entities: Dict[str, EntityIndex] = {}
+        for ename, edef in sdef.get("entities", {}).items():
+            keys = tuple(edef.get("key_fields", []))
+            fields = tuple(edef.get("fields", []))
+            entities[ename] = EntityIndex(
+                name=edef.get("name", ename),
+                path=edef.get("path", ename),
+                key_fields=keys,
+                fields=fields,
+                key_set=frozenset(keys),
+                field_set=frozenset(fields),
+                cache_ttl=edef.get("cache_ttl"),
+                field_types=MappingProxyType(dict(edef.get("field_types") or {})),
+                non_filterable=frozenset(edef.get("non_filterable") or ()),
+                non_sortable=frozenset(edef.get("non_sortable") or ()),
+                navigation=MappingProxyType(dict(edef.get("navigation") or {})),
+                key_formats=MappingProxyType(dict(edef.get("key_formats") or {})),
+                key_max_lengths=MappingProxyType(dict(edef.get("key_max_lengths") or {})),
+                replica=MappingProxyType(dict(edef["replica"])) if edef.get("replica") else None,
+                raw=MappingProxyType(dict(edef)),
+            )
+        services[sname] = ServiceIndex(
+            name=sdef.get("name", sname),
+            base_path=sdef.get("base_path"),
+            entities=MappingProxyType(entities),
+            limits=ServiceLimits(**sdef["limits"]) if sdef.get("limits") else None,
+            raw=MappingProxyType(dict(sdef)),
+        )
+        # Compressed to what's needed for prompting
+        prompt_view[sname] = {
+            "base_path": sdef.get("base_path"),
+            "entities": {
+                ename: {"key_fields": list(e.key_fields), "fields": list(e.fields)}
+                for ename, e in entities.items()
+            },
+        }
+    return CompiledRegistry(
+        version=version,
+        path=path,
+        mtime=mtime,
+        digest=digest,
+        services=MappingProxyType(services),
+        by_base_path=MappingProxyType({s.base_path.strip("/"): s for s in services.values() if s.base_path}),
+        out=ServiceRegistryOut(**data),
+        prompt_view=MappingProxyType(prompt_view),
+    )
+
+class RegistryStore:
+    """Loads registry.json once and hot-swaps it when the file's mtime and content hash change.
+
+    The file is stat'ed at most once per ``reload_interval`` seconds (0 disables hot reload),
+    so regular lookups never touch the filesystem.
+    """
+
+    def __init__(self, path: Optional[os.PathLike] = None, reload_interval: Optional[float] = None):
+        self.path = str(path or settings.REGISTRY_PATH or DEFAULT_REGISTRY_PATH)
+        self.reload_interval = settings.REGISTRY_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._lock = threading.Lock()
+        self._current: Optional[CompiledRegistry] = None
+        self._next_check = 0.0
+        self._overlays: Dict[str, Dict[str, Any]] = {}   # service name -> typed service from EDMX
+
+    def _read(self) -> Tuple[Dict[str, Any], float, str]:
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        digest = hashlib.sha256(raw)
+        for name in sorted(self._overlays):
+            typed = self._overlays[name]
+            data = merge_typed(data, typed)
+            digest.update(typed["metadata_digest"].encode())
+        return data, mtime, digest.hexdigest()
+
+    def _load(self) -> CompiledRegistry:
+        data, mtime, digest = self._read()
+        compiled = _compile(data, 1, self.path, mtime, digest)
+        logger.info("Registry loaded: {} services (version {})", len(compiled.services), compiled.version)
+        return compiled
+
+    def _maybe_reload(self, current: CompiledRegistry) -> CompiledRegistry:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning("Registry stat failed, keeping version {}: {}", current.version, e)
+            return current
+        if mtime == current.mtime:
+            return current
+        try:
+            data, mtime, digest = self._read()
+        except Exception as e:
+            logger.warning("Registry reload failed, keeping version {}: {}", current.version, e)
+            return current
+        if digest == current.digest:
+            # touched but unchanged: remember the new mtime, keep the version
+            return replace(current, mtime=mtime)
+        try:
+            compiled = _compile(data, current.version + 1, self.path, mtime, digest)
+        except Exception as e:
+            logger.warning("Registry reload rejected, keeping version {}: {}", current.version, e)
+            return current
+        logger.info("Registry reloaded: {} services (version {})", len(compiled.services), compiled.version)
+        return compiled
+
+    def get(self) -> CompiledRegistry:
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = self._load()
+                    self._next_check = time.monotonic() + self.reload_interval
+                return self._current
+        if self.reload_interval > 0 and time.monotonic() >= self._next_check:
+            with self._lock:
+                if time.monotonic() >= self._next_check:
+                    self._current = self._maybe_reload(self._current)
+                    self._next_check = time.monotonic() + self.reload_interval
+                current = self._current
+        return current
+
+    def apply_typed(self, typed_services: Iterable[Dict[str, Any]]) -> CompiledRegistry:
+        """Overlay services parsed from EDMX (see app.data.edmx); kept across hot reloads."""
+        current = self.get()
+        with self._lock:
+            for typed in typed_services:
+                self._overlays[typed["name"]] = typed
+            data, mtime, digest = self._read()
+            if digest != current.digest:
+                self._current = _compile(data, current.version + 1, self.path, mtime, digest)
+                logger.info("Registry typed from EDMX: {} (version {})", sorted(self._overlays), self._current.version)
+            return self._current
+
+    def refresh(self) -> CompiledRegistry:
+        """Check the file now, regardless of the reload interval."""
+        current = self.get()
+        with self._lock:
+            self._current = self._maybe_reload(self._current or current)
+            self._next_check = time.monotonic() + self.reload_interval
+            return self._current
+
+_store: Optional[RegistryStore] = None
+
+def get_store() -> RegistryStore:
+    global _store
+    if _store is None:
+        _store = RegistryStore()
+    return _store
+
+def set_store(store: Optional[RegistryStore]) -> None:
+    """Install a specific store (used by tests and benchmarks)."""
+    global _store
+    _store = store
+
+def get_registry() -> CompiledRegistry:
+    return get_store().get()
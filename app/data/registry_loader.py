@@ -1,21 +1,12 @@
-import json
-from pathlib import Path
-
-REGISTRY_PATH = Path(__file__).resolve().parents[1] / "data" / "registry.json"
+from app.data.registry import get_registry
 
 def load_registry_services():
-    with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # Compress to what's needed for prompting
-    out = {}
-    for sname, sdef in data.get("services", {}).items():
-        out[sname] = {
-            "base_path": sdef.get("base_path"),
-            "entities": {
-                ename: {
-                    "key_fields": edef.get("key_fields", []),
-                    "fields": edef.get("fields", []),
-                } for ename, edef in sdef.get("entities", {}).items()
-            }
+    """Registry compressed to what's needed for prompting (served from the in-memory registry)."""
+    view = get_registry().prompt_view
+    return {
+        sname: {
+            "base_path": sdef["base_path"],
+            "entities": {ename: dict(edef) for ename, edef in sdef["entities"].items()},
         }
-    return out
+        for sname, sdef in view.items()
+    }
@@ -1,12 +1,57 @@
-from fastapi import FastAPI
+import asyncio, time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.core.http import startup_http_client, shutdown_http_client, pool_stats
+from app.core.errors import BackendUnavailable
+from app.core.responses import ORJSONResponse
+from app.services.oauth_token import get_token_provider
+from app.services.resilience import resilience_stats
+from app.services.bulkhead import bulkhead_stats
+from app.services.nlp_router import get_nlp_limiter
+from app.services.response_cache import response_cache
+from app.services.replica import get_replica, sync_forever
+from app.services.odata_client import ODataService
+from app.services.query_planner import QueryValidationError
+from app.data import edmx
+from app.data.registry import get_store
+from app.core import metrics
 from app.api.routers import api_router
+from loguru import logger
 
 configure_logging()
 
-app = FastAPI(title=settings.APP_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_http_client()
+    if settings.SAP_AUTH_MODE == "oauth2":
+        # warm the token so the first request doesn't pay for the grant
+        try:
+            await get_token_provider().get_token()
+        except Exception as e:
+            logger.warning("OAuth token prefetch failed: {}", e)
+    if settings.REGISTRY_EDMX_SERVICES:
+        # type the registry from $metadata (falls back to the last cached EDMX per service)
+        try:
+            typed = await edmx.sync_services(edmx.parse_service_specs(settings.REGISTRY_EDMX_SERVICES))
+            get_store().apply_typed(typed)
+        except Exception as e:
+            logger.warning("EDMX registry sync failed: {}", e)
+    replica = get_replica()
+    # keep the replicated entity sets synced in the background (reads fall back to SAP until then)
+    replica_sync = asyncio.create_task(sync_forever(replica, ODataService)) if replica is not None else None
+    try:
+        yield
+    finally:
+        if replica_sync is not None:
+            replica_sync.cancel()
+            await asyncio.gather(replica_sync, return_exceptions=True)
+        await shutdown_http_client()
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -17,9 +62,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(path, request.method, str(status))
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - t0, path, request.method)
+
+# Gauges sampled at scrape time
+metrics.GaugeCallback("sap_pool_connections", "Connections in the shared SAP HTTP pool", ("state",),
+                      lambda: {("active",): pool_stats()["active"], ("idle",): pool_stats()["idle"]})
+metrics.GaugeCallback("sap_bulkhead_active", "Calls holding a bulkhead slot", ("bulkhead",),
+                      lambda: {(name,): b["active"] for name, b in _bulkheads().items()})
+metrics.GaugeCallback("sap_bulkhead_waiting", "Calls queued for a bulkhead slot", ("bulkhead",),
+                      lambda: {(name,): b["waiting"] for name, b in _bulkheads().items()})
+metrics.GaugeCallback("sap_circuit_open", "1 when the service's circuit breaker is not closed", ("service",),
+                      lambda: {(name,): int(b["state"] != "closed") for name, b in resilience_stats()["breakers"].items()})
+metrics.GaugeCallback("nlp_limiter_active", "LLM calls in flight", (), lambda: {(): get_nlp_limiter().active})
+metrics.GaugeCallback("nlp_limiter_waiting", "Chat requests waiting for an LLM slot", (), lambda: {(): get_nlp_limiter().waiting})
+metrics.GaugeCallback("odata_get_cache_bytes", "Bytes held by the GET response cache", (), lambda: {(): response_cache.bytes})
+metrics.GaugeCallback("odata_replica_age_seconds", "Seconds since the replicated entity set was last synced", ("entity",),
+                      lambda: {(name,): e["age"] for name, e in _replica_entities().items() if e["age"] is not None})
+
+def _replica_entities():
+    replica = get_replica()
+    return replica.stats()["entities"] if replica is not None else {}
+
+def _bulkheads():
+    stats = bulkhead_stats()
+    return {"global": stats["global"], **stats["services"]}
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition of request, SAP, CSRF, NLP, retry and pool/queue metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.exception_handler(QueryValidationError)
+async def query_validation_handler(request: Request, exc: QueryValidationError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 @app.get("/", tags=["health"])
 def health():
     return {"status": "ok", "app": settings.APP_NAME, "env": settings.APP_ENV}
 
+@app.get("/health/pool", tags=["health"])
+def health_pool():
+    """Connection pool stats for the shared SAP HTTP client."""
+    return pool_stats()
+
+@app.get("/health/resilience", tags=["health"])
+def health_resilience():
+    """Retry budget and per-service circuit breaker states."""
+    return resilience_stats()
+
+@app.get("/health/bulkheads", tags=["health"])
+def health_bulkheads():
+    """Concurrency, queue depth and rate-limit state of the per-service and global bulkheads."""
+    return bulkhead_stats()
+
 # Mount API
 app.include_router(api_router, prefix="/api")
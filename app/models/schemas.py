@@ -14,6 +14,33 @@ class ODataGetRequest(BaseModel):
     top: Optional[int] = Field(default=100, ge=1, le=1000)
     skip: Optional[int] = Field(default=0, ge=0)
     orderby: Optional[str] = None
+    # Fan-out: count the matches, then fetch `top`-sized $skip windows this many at a time
+    parallel: Optional[int] = Field(default=None, ge=1, le=32)
+    limit: Optional[int] = Field(default=None, ge=1)   # total rows across pages (paged reads only)
+    # odata: the gateway body as is; columnar/rows: {fields, columns|rows} without envelopes or __metadata
+    result_format: Literal["odata","columnar","rows"] = "odata"
+    # navigation properties (registry `navigation`) to inline; `fields` may name "Nav/Field"
+    expand: Optional[List[str]] = None
+
+class ODataJoinRequest(BaseModel):
+    """Header rows with their item rows nested under `items_field`, in one call."""
+    service: str
+    header: str                                    # e.g. SalesOrderSet
+    items: str                                     # e.g. SalesItemSet
+    header_fields: Optional[List[str]] = None
+    item_fields: Optional[List[str]] = None
+    filters: Optional[List[FilterItem]] = None     # on the header
+    item_filters: Optional[List[FilterItem]] = None
+    top: Optional[int] = Field(default=100, ge=1, le=1000)   # headers
+    skip: Optional[int] = Field(default=0, ge=0)
+    orderby: Optional[str] = None
+    # auto: $expand when the header has a navigation to `items` (and no item_filters), else join
+    strategy: Literal["auto","expand","join"] = "auto"
+    items_field: str = "items"
+
+class ODataStreamRequest(ODataGetRequest):
+    """GET that follows server paging; `top` is the page size, `limit` caps the total rows."""
+    format: Literal["ndjson","csv"] = "ndjson"
 
 class ODataPostRequest(BaseModel):
     action: Literal["create","update"] = "create"
@@ -23,6 +50,25 @@ class ODataPostRequest(BaseModel):
     payload: Dict[str, Any]
     confirm: bool = False
 
+class ODataBatchRequest(BaseModel):
+    operations: List[ODataPostRequest] = Field(min_length=1)
+    # atomic=True: each $batch chunk is one changeset (all-or-nothing); otherwise one changeset per operation
+    atomic: bool = False
+    batch_size: Optional[int] = Field(default=None, ge=1, le=1000)
+    confirm: bool = False
+
+class ODataBatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    status_code: Optional[int] = None
+    data: Any = None
+    error: Optional[str] = None
+
+class ODataBatchResponse(BaseModel):
+    ok: bool
+    step: str = "batch"
+    results: List[ODataBatchItemResult]
+
 class ODataPreviewResponse(BaseModel):
     ok: bool = True
     step: str = "preview"
@@ -37,15 +83,41 @@ class ODataExecResponse(BaseModel):
     message: str
     data: Any
 
+class ReplicaSpec(BaseModel):
+    """Registry `replica` flag: mirror the entity set locally (see app.services.replica)."""
+    change_field: str                     # creation/change timestamp driving incremental sync
+    max_staleness: Optional[float] = Field(default=None, gt=0)   # seconds; REPLICA_MAX_STALENESS otherwise
+    tracks_updates: bool = False          # change_field moves on every update, not only on creation
+
 class ServiceEntity(BaseModel):
     name: str
     path: str
     key_fields: List[str] = []
     fields: List[str] = []
+    cache_ttl: Optional[float] = None     # seconds GET responses may be served from cache
+    # Edm-like type per field for typed compact results: string|int|decimal|float|bool|date|datetime
+    field_types: Dict[str, str] = {}
+    # from the service's $metadata (sap:filterable / sap:sortable = false, navigation properties)
+    non_filterable: List[str] = []
+    non_sortable: List[str] = []
+    navigation: Dict[str, Dict[str, str]] = {}
+    # shape of key values, so free-text numbers are only read as keys when they fit
+    key_formats: Dict[str, str] = {}       # regex per key field (curated)
+    key_max_lengths: Dict[str, int] = {}   # from the EDMX MaxLength of string keys
+    replica: Optional[ReplicaSpec] = None
+
+class ServiceLimits(BaseModel):
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    max_queue: Optional[int] = Field(default=None, ge=0)
+    queue_timeout: Optional[float] = Field(default=None, gt=0)   # seconds before 503
+    rate_per_sec: Optional[float] = Field(default=None, gt=0)
+    burst: Optional[int] = Field(default=None, ge=1)
 
 class ServiceDef(BaseModel):
     name: str
     base_path: str
+    limits: Optional[ServiceLimits] = None
+    metadata_digest: Optional[str] = None     # sha256 of the EDMX the types were taken from
     entities: Dict[str, ServiceEntity]
 
 class ServiceRegistryOut(BaseModel):
@@ -77,7 +149,12 @@ class IntentUpdate(BaseModel):
     key_fields: Dict[str, Any]
     payload: Dict[str, Any]
 
-IntentSchema = Union[IntentGet, IntentCreate, IntentUpdate]
+class IntentPlan(BaseModel):
+    """Several intents in one message; see app.services.chat_plan for step ids, depends_on and $ref."""
+    intent: Literal["plan"]
+    steps: List[Dict[str, Any]] = Field(min_length=1)
+
+IntentSchema = Union[IntentGet, IntentCreate, IntentUpdate, IntentPlan]
 
 class ChatRequest(BaseModel):
     message: str
@@ -85,11 +162,13 @@ class ChatRequest(BaseModel):
     allowed_services: Optional[List[str]] = None
     preview_only: bool = True   # for create/update: preview first unless explicitly false
     confirm: bool = False       # honor only when preview_only is False
+    result_format: Literal["odata","columnar","rows"] = "odata"   # shape of `result` for get intents
 
 class ChatResponse(BaseModel):
     ok: bool
-    stage: Literal["nlp","preview","executed","get"]
+    stage: Literal["nlp","preview","executed","get","plan"]
     intent: Optional[str] = None
     nlp_json: Optional[Dict[str, Any]] = None
+    nlp_source: Optional[str] = None          # llm | cache | fast_path
     resolved_endpoint: Optional[str] = None
     result: Any = None
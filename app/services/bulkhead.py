@@ -0,0 +1,90 @@
+"""Per-service and global admission control for SAP calls.
+
+Each SAP service (keyed by its base_path) gets a ConcurrencyLimiter and, optionally, a
+TokenBucket rate limit, configured by the service's "limits" block in registry.json with
+SAP_SERVICE_* settings as defaults. A global limiter caps the total across services.
+Callers that cannot get a slot within the queue timeout get LimiterRejected (HTTP 503).
+"""
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+from app.core.concurrency import ConcurrencyLimiter, TokenBucket
+from app.core.config import settings
+from app.data.registry import get_registry
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrency: int, max_queue: Optional[int], queue_timeout: Optional[float],
+                 rate_per_sec: Optional[float] = None, burst: Optional[int] = None):
+        self.name = name
+        self.queue_timeout = queue_timeout
+        self.limiter = ConcurrencyLimiter(name, max_concurrency, max_queue, queue_timeout)
+        self.bucket = TokenBucket(name, rate_per_sec, burst) if rate_per_sec else None
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.bucket is not None:
+            await self.bucket.take(self.queue_timeout)
+        admitted = False
+        try:
+            async with self.limiter.acquire():
+                admitted = True
+                yield
+        except BaseException:
+            if not admitted and self.bucket is not None:
+                self.bucket.refund()     # cancelled or rejected while queued: the call never went out
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.limiter.stats()
+        if self.bucket is not None:
+            out["rate"] = self.bucket.stats()
+        return out
+
+_global: Optional[Bulkhead] = None
+_services: Dict[str, Tuple[tuple, Bulkhead]] = {}
+
+def _global_bulkhead() -> Bulkhead:
+    global _global
+    if _global is None:
+        _global = Bulkhead("global", settings.SAP_GLOBAL_MAX_CONCURRENCY, settings.SAP_GLOBAL_MAX_QUEUE,
+                           settings.SAP_LIMIT_QUEUE_TIMEOUT)
+    return _global
+
+def _service_bulkhead(base_path: str) -> Bulkhead:
+    svc = get_registry().by_base_path.get(base_path)
+    limits = svc.limits if svc is not None and svc.limits is not None else None
+
+    def limit(name: str, default: Any) -> Any:
+        value = getattr(limits, name, None)
+        return value if value is not None else default   # an explicit 0 is a limit, not "unset"
+
+    config = (
+        limit("max_concurrency", settings.SAP_SERVICE_MAX_CONCURRENCY),
+        limit("max_queue", settings.SAP_SERVICE_MAX_QUEUE),
+        limit("queue_timeout", settings.SAP_LIMIT_QUEUE_TIMEOUT),
+        getattr(limits, "rate_per_sec", None),
+        getattr(limits, "burst", None),
+    )
+    current = _services.get(base_path)
+    if current is None or current[0] != config:
+        # new service or limits changed by a registry reload; in-flight holders finish on the old one
+        current = (config, Bulkhead(base_path, *config))
+        _services[base_path] = current
+    return current[1]
+
+@asynccontextmanager
+async def admit(base_path: str):
+    """Hold a slot of the service's bulkhead and of the global one (always in that order)."""
+    async with _service_bulkhead(base_path).acquire():
+        async with _global_bulkhead().acquire():
+            yield
+
+def reset() -> None:
+    global _global
+    _global = None
+    _services.clear()
+
+def bulkhead_stats() -> Dict[str, Any]:
+    return {
+        "global": _global_bulkhead().stats(),
+        "services": {name: b.stats() for name, (_, b) in _services.items()},
+    }
@@ -0,0 +1,162 @@
+"""Multi-step chat plans.
+
+The NLP layer may answer with `{"intent": "plan", "steps": [...]}` instead of a single intent.
+Each step is a get/create/update intent with an `id` and optional `depends_on`; a step can use
+rows of an earlier step through `{"$ref": "<step id>.<Field>"}` values (a filter value becomes
+the distinct values of that field, a payload or key value its first one). Every step runs as
+its own task that waits only for the steps it depends on, so independent reads overlap and the
+plan takes about as long as its slowest chain.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import IntentCreate, IntentGet, IntentUpdate
+
+_INTENTS = {"get": IntentGet, "create": IntentCreate, "update": IntentUpdate}
+
+@dataclass(frozen=True)
+class PlanStep:
+    id: str
+    intent: Dict[str, Any]          # get/create/update intent JSON, possibly with $ref values
+    depends_on: Tuple[str, ...]
+
+# runner(resolved intent) -> (stage, result, rows other steps may reference)
+StepRunner = Callable[[Dict[str, Any]], Awaitable[Tuple[str, Any, List[Dict[str, Any]]]]]
+
+def _refs(value: Any) -> List[str]:
+    """Step ids referenced anywhere inside `value`."""
+    if isinstance(value, dict):
+        if set(value) == {"$ref"}:
+            return [str(value["$ref"]).partition(".")[0]]
+        return [r for v in value.values() for r in _refs(v)]
+    if isinstance(value, list):
+        return [r for v in value for r in _refs(v)]
+    return []
+
+def parse_plan(intent_json: Dict[str, Any]) -> List[PlanStep]:
+    """Steps of a plan (a single intent is a one-step plan); raises ValueError when invalid."""
+    if intent_json.get("intent") != "plan":
+        raw_steps = [{**intent_json, "id": "s1"}]
+    else:
+        raw_steps = intent_json.get("steps") or []
+        if not raw_steps:
+            raise ValueError("plan has no steps")
+        if len(raw_steps) > settings.CHAT_PLAN_MAX_STEPS:
+            raise ValueError(f"plan has {len(raw_steps)} steps (max {settings.CHAT_PLAN_MAX_STEPS})")
+    steps: List[PlanStep] = []
+    for i, raw in enumerate(raw_steps):
+        raw = dict(raw)
+        sid = str(raw.pop("id", None) or f"s{i + 1}")
+        declared = raw.pop("depends_on", None) or []
+        model = _INTENTS.get(raw.get("intent"))
+        if model is None:
+            raise ValueError(f"step {sid}: intent must be one of: get|create|update")
+        model(**raw)
+        steps.append(PlanStep(sid, raw, tuple(dict.fromkeys([*map(str, declared), *_refs(raw)]))))
+    ids = [s.id for s in steps]
+    if len(set(ids)) != len(ids):
+        raise ValueError("plan step ids must be unique")
+    by_id = {s.id: s for s in steps}
+    for s in steps:
+        missing = [d for d in s.depends_on if d not in by_id]
+        if missing:
+            raise ValueError(f"step {s.id} depends on unknown step(s): {', '.join(missing)}")
+    _check_acyclic(by_id)
+    return steps
+
+def _check_acyclic(by_id: Dict[str, PlanStep]) -> None:
+    state: Dict[str, int] = {}      # 1 = visiting, 2 = done
+
+    def visit(sid: str) -> None:
+        if state.get(sid) == 2:
+            return
+        if state.get(sid) == 1:
+            raise ValueError(f"plan has a dependency cycle through step {sid}")
+        state[sid] = 1
+        for dep in by_id[sid].depends_on:
+            visit(dep)
+        state[sid] = 2
+
+    for sid in by_id:
+        visit(sid)
+
+def _ref_values(ref: str, rows: Dict[str, List[Dict[str, Any]]]) -> List[Any]:
+    sid, _, field = ref.partition(".")
+    if not field:
+        raise ValueError(f"$ref '{ref}' must name a field (<step>.<Field>)")
+    return list(dict.fromkeys(r.get(field) for r in rows.get(sid, []) if r.get(field) is not None))
+
+def _is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and set(value) == {"$ref"}
+
+def resolve(intent: Dict[str, Any], rows: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """`intent` with $ref values replaced by the referenced rows' values."""
+    out = dict(intent)
+    filters = []
+    for f in intent.get("filters") or []:
+        f = dict(f)
+        if _is_ref(f.get("value")):
+            values = _ref_values(f["value"]["$ref"], rows)
+            if f.get("op", "eq") in ("eq", "in"):
+                f["op"], f["value"] = "in", values      # in () matches nothing; the planner skips the gateway
+            elif values:
+                f["value"] = values[0]
+            else:
+                raise ValueError(f"$ref '{f['value']['$ref']}' has no values")
+        filters.append(f)
+    if filters:
+        out["filters"] = filters
+    for part in ("payload", "key_fields"):
+        if isinstance(intent.get(part), dict):
+            resolved = {}
+            for k, v in intent[part].items():
+                if _is_ref(v):
+                    values = _ref_values(v["$ref"], rows)
+                    if not values:
+                        raise ValueError(f"$ref '{v['$ref']}' has no values")
+                    v = values[0]
+                resolved[k] = v
+            out[part] = resolved
+    return out
+
+async def execute_plan(steps: List[PlanStep], run: StepRunner,
+                       on_outcome: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Run the steps concurrently, each after its dependencies; one outcome dict per step, in order.
+
+    A failing step does not stop independent steps; steps depending on it are skipped.
+    `on_outcome` is called with each outcome as soon as its step finishes.
+    """
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    tasks: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+    async def run_step(step: PlanStep) -> Dict[str, Any]:
+        outcome = await _run_step(step)
+        if on_outcome is not None:
+            on_outcome(outcome)
+        return outcome
+
+    async def _run_step(step: PlanStep) -> Dict[str, Any]:
+        outcome: Dict[str, Any] = {"id": step.id, "intent": step.intent.get("intent"), "depends_on": list(step.depends_on)}
+        if step.depends_on:
+            deps = await asyncio.gather(*(tasks[d] for d in step.depends_on))
+            failed = [d["id"] for d in deps if not d["ok"]]
+            if failed:
+                return {**outcome, "ok": False, "stage": "skipped", "error": f"depends on failed step(s): {', '.join(failed)}"}
+        try:
+            stage, result, step_rows = await run(resolve(step.intent, rows))
+        except Exception as e:
+            return {**outcome, "ok": False, "stage": "error", "error": getattr(e, "detail", None) or str(e)}
+        rows[step.id] = step_rows
+        return {**outcome, "ok": True, "stage": stage, "result": result}
+
+    for step in steps:
+        tasks[step.id] = asyncio.ensure_future(run_step(step))
+    try:
+        return list(await asyncio.gather(*tasks.values()))
+    finally:
+        for t in tasks.values():
+            t.cancel()
+
+def writes(steps: List[PlanStep]) -> List[PlanStep]:
+    return [s for s in steps if s.intent.get("intent") in ("create", "update")]
@@ -0,0 +1,69 @@
+import asyncio, time
+from typing import Awaitable, Callable, Dict, Optional
+from pydantic import BaseModel
+from loguru import logger
+from app.core.config import settings
+
+class CsrfEntry(BaseModel):
+    token: Optional[str] = None
+    cookies: Dict[str, str] = {}
+    fetched_at: float = 0.0
+
+    def cookie_header(self) -> Optional[str]:
+        if not self.cookies:
+            return None
+        return "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+
+class CsrfCache:
+    """Per-service-path cache of CSRF token + session cookies with single-flight fetches."""
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.SAP_CSRF_TTL if ttl is None else ttl
+        self._entries: Dict[str, CsrfEntry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, entry: Optional[CsrfEntry]) -> bool:
+        return entry is not None and bool(entry.token) and (time.monotonic() - entry.fetched_at) < self.ttl
+
+    async def get(self, svc_path: str, fetch: Callable[[], Awaitable[CsrfEntry]]) -> CsrfEntry:
+        entry = self._entries.get(svc_path)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        fut = self._inflight.get(svc_path)
+        if fut is None:
+            # first writer to miss starts the fetch; everyone awaits the same future, shielded so a
+            # cancelled caller does not cancel it, and the token is stored when it lands
+            fut = asyncio.ensure_future(fetch())
+            self._inflight[svc_path] = fut
+            fut.add_done_callback(lambda f: self._store(svc_path, f))
+        return await asyncio.shield(fut)
+
+    def _store(self, svc_path: str, fut: asyncio.Future) -> None:
+        if self._inflight.get(svc_path) is fut:
+            del self._inflight[svc_path]
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        entry = fut.result()
+        entry.fetched_at = time.monotonic()
+        self._entries[svc_path] = entry
+
+    def invalidate(self, svc_path: str, stale: Optional[CsrfEntry] = None) -> None:
+        """Drop the cached entry; when ``stale`` is given, only if it is still the cached one."""
+        current = self._entries.get(svc_path)
+        if current is None:
+            return
+        if stale is None or current.token == stale.token:
+            self._entries.pop(svc_path, None)
+            logger.info("CSRF token invalidated for {}", svc_path)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "inflight": len(self._inflight), "hits": self.hits, "misses": self.misses}
+
+csrf_cache = CsrfCache()
@@ -0,0 +1,228 @@
+"""Rule-based intent parser for simple GET / key-lookup questions.
+
+Messages that name an entity from the registry and only use recognizable clauses
+(`top N`, `skip N`, `order by F [asc|desc]`, `select A,B`, `F op value`, `for F value`,
+bare key values) are turned into the same `get` intent the LLM would produce, with a
+confidence score. Anything else (writes, unknown words, ambiguous entities) scores low
+and is left to the LangChain chain. A bare value only becomes a key filter when it has the
+key's shape (registry `key_formats`, EDMX `key_max_lengths`); dates, years and ordinals
+("from 2024", "the 2nd") never do, so such messages go to the LLM.
+"""
+import re, threading
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from app.data.registry import CompiledRegistry, get_registry
+from app.models.schemas import IntentGet
+
+# Confidence contributions
+STRONG_ENTITY = 0.6     # entity named exactly or by its full phrase ("sales orders")
+WEAK_ENTITY = 0.4       # entity named by a shared prefix ("PO")
+CLEAN_PARSE = 0.4       # every word in the message was understood
+UNKNOWN_WORD_PENALTY = 0.25
+
+_WRITE_VERBS = re.compile(r"\b(create|update|change|modify|delete|remove|insert|add|new|post|cancel|approve)\b", re.I)
+_STOPWORDS = frozenset("""
+show me list get find fetch display give return all the a an of for with where and please records
+rows entries entry from whose which that is are number no id details detail data lines my our any
+""".split())
+
+_VALUE = r"('[^']*'|\"[^\"]*\"|[\w\-.:/]+)"
+_TOP = re.compile(r"\b(?:top|first|limit)\s+(\d+)\b", re.I)
+_SKIP = re.compile(r"\b(?:skip|offset)\s+(\d+)\b", re.I)
+_ORDER = re.compile(r"\b(?:order(?:ed)?|sort(?:ed)?)\s+by\s+([A-Za-z_]\w*)(?:\s+(asc|desc|ascending|descending)\b)?", re.I)
+_SELECT = re.compile(r"\b(?:select|fields?|columns?)\s+([A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)", re.I)
+_COMPARE = re.compile(r"\b([A-Za-z_]\w*)\s*(>=|<=|!=|=|>|<|\b(?:eq|ne|gt|lt|ge|le)\b)\s*" + _VALUE, re.I)
+_FOR_FIELD = re.compile(r"\b(?:for|with|of|by|where)\s+([A-Za-z_]\w*)\s+" + _VALUE, re.I)
+_WORD = re.compile(r"'[^']*'|\"[^\"]*\"|[\w\-.:/]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_HAS_DIGIT = re.compile(r"\d")
+# bare values that read as dates, years or ordinals rather than document numbers
+_NOT_A_KEY = re.compile(r"\d{4}-\d{1,2}(-\d{1,2})?|\d{1,2}[./]\d{1,2}[./]\d{2,4}|(19|20)\d{2}|\d+(st|nd|rd|th)", re.I)
+
+_SYMBOL_OPS = {"=": "eq", "!=": "ne", ">": "gt", "<": "lt", ">=": "ge", "<=": "le"}
+
+class FastIntent(BaseModel):
+    intent_json: Dict[str, Any]
+    confidence: float
+
+class _EntityRef(BaseModel):
+    service: str
+    entity: str
+    key_fields: List[str]
+    fields: Dict[str, str]   # lowercase -> registry spelling
+    key_formats: Dict[str, str] = {}      # key field -> regex a bare value must match
+    key_max_lengths: Dict[str, int] = {}
+
+class _Index(BaseModel):
+    version: int
+    services: Dict[str, str]                       # lowercase -> registry spelling
+    strong: Dict[Tuple[str, ...], List[_EntityRef]]  # alias phrase -> entities
+    weak: Dict[str, List[_EntityRef]]              # first-word alias -> entities
+    max_phrase: int
+
+def _singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+def _build_index(reg: CompiledRegistry) -> _Index:
+    strong: Dict[Tuple[str, ...], List[_EntityRef]] = {}
+    weak: Dict[str, List[_EntityRef]] = {}
+    for sname, svc in reg.services.items():
+        for ename, ent in svc.entities.items():
+            ref = _EntityRef(service=sname, entity=ename, key_fields=list(ent.key_fields),
+                             fields={f.lower(): f for f in ent.fields},
+                             key_formats=dict(ent.key_formats), key_max_lengths=dict(ent.key_max_lengths))
+            words = [w.lower() for w in _CAMEL.findall(ename)]
+            if len(words) > 1 and words[-1] == "set":
+                words = words[:-1]
+            aliases = {(ename.lower(),), tuple(words), ("".join(words),)}
+            for alias in aliases:
+                strong.setdefault(alias, []).append(ref)
+            if len(words) > 1:
+                weak.setdefault(words[0], []).append(ref)
+    max_phrase = max((len(a) for a in strong), default=1)
+    return _Index(version=reg.version, services={s.lower(): s for s in reg.services},
+                  strong=strong, weak=weak, max_phrase=max_phrase)
+
+_index: Optional[_Index] = None
+_index_lock = threading.Lock()
+
+def _get_index() -> _Index:
+    global _index
+    reg = get_registry()
+    idx = _index
+    if idx is None or idx.version != reg.version:
+        with _index_lock:
+            if _index is None or _index.version != reg.version:
+                _index = _build_index(reg)
+            idx = _index
+    return idx
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+def _typed(op: str, value: str) -> Any:
+    # range comparisons on plain numbers are numeric; equality keeps SAP's string ids intact
+    if op in ("gt", "lt", "ge", "le") and re.fullmatch(r"-?\d+(\.\d+)?", value):
+        return float(value) if "." in value else int(value)
+    return value
+
+def _fits_key(value: str, key: str, ref: _EntityRef) -> bool:
+    """Whether a bare value has the shape of `key`; anything doubtful is left to the LLM."""
+    fmt = ref.key_formats.get(key)
+    if fmt is not None:
+        return re.fullmatch(fmt, value) is not None
+    if _NOT_A_KEY.fullmatch(value):
+        return False
+    max_length = ref.key_max_lengths.get(key)
+    return max_length is None or len(value) <= max_length
+
+def _find_entity(idx: _Index, words: List[str], allowed: Optional[set]) -> Tuple[Optional[_EntityRef], float, set, Optional[str]]:
+    """Return (entity, strength, consumed word positions, explicit service)."""
+    service = None
+    consumed: set = set()
+    for i, w in enumerate(words):
+        if w in idx.services:
+            service = idx.services[w]
+            consumed.add(i)
+
+    def usable(refs: List[_EntityRef]) -> List[_EntityRef]:
+        return [r for r in refs if (service is None or r.service == service) and (allowed is None or r.service in allowed)]
+
+    for i in range(len(words)):
+        for n in range(min(idx.max_phrase, len(words) - i), 0, -1):
+            phrase = words[i:i + n]
+            for candidate in (tuple(phrase), tuple(phrase[:-1] + [_singular(phrase[-1])])):
+                refs = usable(idx.strong.get(candidate, []))
+                if len(refs) == 1:
+                    return refs[0], STRONG_ENTITY, consumed | set(range(i, i + n)), service
+    for i, w in enumerate(words):
+        refs = usable(idx.weak.get(w, []))
+        if refs:
+            # a bare prefix like "PO" means the header: the entity with the fewest key fields
+            refs = sorted(refs, key=lambda r: len(r.key_fields))
+            if len(refs) > 1 and len(refs[0].key_fields) == len(refs[1].key_fields):
+                return None, 0.0, consumed, service
+            return refs[0], WEAK_ENTITY, consumed | {i}, service
+    return None, 0.0, consumed, service
+
+def fast_parse(message: str, allowed_services: Optional[List[str]] = None) -> Optional[FastIntent]:
+    """Parse `message` into a `get` intent without the LLM, or return None if it can't."""
+    if _WRITE_VERBS.search(message):
+        return None
+    idx = _get_index()
+    allowed = set(allowed_services) if allowed_services else None
+    tokens = list(_WORD.finditer(message))
+    words = [t.group(0).lower() for t in tokens]
+    ref, strength, consumed, _ = _find_entity(idx, words, allowed)
+    if ref is None:
+        return None
+
+    spans: List[Tuple[int, int]] = []
+
+    def claim(m: re.Match) -> bool:
+        if any(m.start() < e and s < m.end() for s, e in spans):
+            return False
+        spans.append((m.start(), m.end()))
+        return True
+
+    intent: Dict[str, Any] = {"intent": "get", "service": ref.service, "entity": ref.entity, "top": 100, "skip": 0}
+    for m in _TOP.finditer(message):
+        if claim(m):
+            intent["top"] = int(m.group(1))
+    for m in _SKIP.finditer(message):
+        if claim(m):
+            intent["skip"] = int(m.group(1))
+    for m in _ORDER.finditer(message):
+        field = ref.fields.get(m.group(1).lower())
+        if field and claim(m):
+            direction = "desc" if (m.group(2) or "").lower().startswith("desc") else "asc"
+            intent["orderby"] = f"{field} {direction}"
+    for m in _SELECT.finditer(message):
+        names = [n.strip().lower() for n in m.group(1).split(",")]
+        if all(n in ref.fields for n in names) and claim(m):
+            intent["fields"] = [ref.fields[n] for n in names]
+    filters: List[Dict[str, Any]] = []
+    for m in _COMPARE.finditer(message):
+        field = ref.fields.get(m.group(1).lower())
+        if field and claim(m):
+            op = _SYMBOL_OPS.get(m.group(2), m.group(2).lower())
+            filters.append({"field": field, "op": op, "value": _typed(op, _unquote(m.group(3)))})
+    for m in _FOR_FIELD.finditer(message):
+        field = ref.fields.get(m.group(1).lower())
+        if field and claim(m):
+            filters.append({"field": field, "op": "eq", "value": _unquote(m.group(2))})
+
+    # whatever is left must be stopwords, the entity/service words, or bare key values
+    bare_values: List[str] = []
+    unknown = 0
+    for i, t in enumerate(tokens):
+        if i in consumed or any(s <= t.start() and t.end() <= e for s, e in spans):
+            continue
+        w = words[i]
+        if w in _STOPWORDS:
+            continue
+        if _HAS_DIGIT.search(w) or w[0] in "'\"":
+            bare_values.append(_unquote(t.group(0)))
+            continue
+        unknown += 1
+
+    if bare_values:
+        filtered = {f["field"] for f in filters}
+        free_keys = [k for k in ref.key_fields if k not in filtered]
+        if len(bare_values) > len(free_keys):
+            return None
+        for key, value in zip(free_keys, bare_values):
+            if not _fits_key(value, key, ref):
+                return None
+            filters.append({"field": key, "op": "eq", "value": value})
+    if filters:
+        intent["filters"] = filters
+
+    try:
+        IntentGet(**intent)
+    except Exception:
+        return None
+    confidence = max(0.0, min(1.0, strength + CLEAN_PARSE - UNKNOWN_WORD_PENALTY * unknown))
+    return FastIntent(intent_json=intent, confidence=round(confidence, 3))
@@ -0,0 +1,47 @@
+import copy, re
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.data.registry import get_registry
+from app.utils.lru import LRUTTLCache
+
+_WS = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?.!]+$")
+
+def normalize_message(message: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation so trivial variants share an entry."""
+    return _TRAILING.sub("", _WS.sub(" ", message.strip().casefold()))
+
+class IntentCache:
+    """LRU+TTL cache of validated GET intents, keyed by normalized message and everything that
+    influences the LLM answer (registry version, model name, allowed_services)."""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        self._cache = LRUTTLCache(
+            settings.NLP_CACHE_SIZE if maxsize is None else maxsize,
+            settings.NLP_CACHE_TTL if ttl is None else ttl,
+        )
+
+    @staticmethod
+    def key(message: str, allowed_services: Optional[List[str]] = None) -> tuple:
+        allowed = tuple(sorted(set(allowed_services))) if allowed_services else None
+        return (normalize_message(message), get_registry().version, settings.MODEL_NAME, allowed)
+
+    def get(self, message: str, allowed_services: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        hit = self._cache.get(self.key(message, allowed_services))
+        # callers may mutate the intent dict; hand out a copy
+        return copy.deepcopy(hit) if hit is not None else None
+
+    def put(self, message: str, intent_json: Dict[str, Any], allowed_services: Optional[List[str]] = None) -> None:
+        # create/update intents carry payloads that must always come from the user's latest words
+        steps = intent_json.get("steps") if intent_json.get("intent") == "plan" else [intent_json]
+        if not steps or any(s.get("intent") != "get" for s in steps):
+            return
+        self._cache.set(self.key(message, allowed_services), copy.deepcopy(intent_json))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+intent_cache = IntentCache()
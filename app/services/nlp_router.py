@@ -1,16 +1,23 @@
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 from loguru import logger
 from app.core.config import settings
-from app.models.schemas import IntentSchema, IntentGet, IntentCreate, IntentUpdate
-from app.data.registry_loader import load_registry_services
+from app.models.schemas import IntentSchema, IntentGet, IntentCreate, IntentUpdate, IntentPlan
+from app.data.registry import get_registry
+from app.core.concurrency import ConcurrencyLimiter
+from app.core.metrics import NLP_LATENCY, timed
+from app.services.intent_cache import intent_cache
+from app.services.fast_intent import fast_parse
+from app.services.chat_plan import parse_plan
 from pydantic import BaseModel
-import json
+import asyncio, threading
 
 # LangChain imports kept local so the app runs even if langchain isn't installed
 try:
     from langchain_openai import ChatOpenAI
     from langchain_core.prompts import ChatPromptTemplate
     from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.messages import SystemMessage
     LANGCHAIN_AVAILABLE = True
 except Exception as e:
     logger.warning("LangChain not available or failed to import: {}", e)
@@ -19,36 +26,38 @@ except Exception as e:
 class NLPResult(BaseModel):
     intent_json: Dict[str, Any]
     raw_text: str
+    source: str = "llm"   # which path produced the intent: llm | cache | fast_path
+    confidence: Optional[float] = None
 
 def available() -> bool:
     return settings.USE_LANGCHAIN and LANGCHAIN_AVAILABLE
 
-def _build_system_prompt() -> str:
+def _registry_hint(allowed_services: Optional[Tuple[str, ...]] = None) -> str:
+    """Registry as one line per entity: `SERVICE Entity k=Key,.. f=Field,..` (far fewer tokens than JSON)."""
+    lines = []
+    for sname, svc in get_registry().services.items():
+        if allowed_services is not None and sname not in allowed_services:
+            continue
+        for ename, ent in svc.entities.items():
+            lines.append(f"{sname} {ename} k={','.join(ent.key_fields)} f={','.join(ent.fields)}")
+    return "\n".join(lines)
+
+def _build_system_prompt(allowed_services: Optional[Tuple[str, ...]] = None) -> str:
     # Registry services guide the model to valid services/entities/fields
-    registry = load_registry_services()
-    registry_hint = json.dumps(registry, ensure_ascii=False, indent=2)
+    registry_hint = _registry_hint(allowed_services)
     return f"""You are an assistant that converts natural language into a STRICT JSON for SAP OData actions.
 
 You must ONLY return minified JSON with keys from one of the following shapes:
 1) Get:
-{{
-  "intent":"get","service":"<SERVICE>","entity":"<ENTITY>",
-  "fields":["Field",...],
-  "filters":[{{"field":"Field","op":"eq|ne|gt|lt|ge|le|like|in","value":<str|num|list>}}],
-  "top":100,"skip":0,"orderby":"Field asc|desc"
-}}
-
+{{"intent":"get","service":"<SERVICE>","entity":"<ENTITY>","fields":["Field",...],"filters":[{{"field":"Field","op":"eq|ne|gt|lt|ge|le|like|in","value":<str|num|list>}}],"top":100,"skip":0,"orderby":"Field asc|desc"}}
 2) Create:
-{{
-  "intent":"create","service":"<SERVICE>","entity":"<ENTITY>","payload":{{ "Field":"Value", ... }}
-}}
-
+{{"intent":"create","service":"<SERVICE>","entity":"<ENTITY>","payload":{{"Field":"Value",...}}}}
 3) Update:
-{{
-  "intent":"update","service":"<SERVICE>","entity":"<ENTITY>","key_fields":{{"Key":"Value"}}, "payload":{{ "Field":"Value", ... }}
-}}
+{{"intent":"update","service":"<SERVICE>","entity":"<ENTITY>","key_fields":{{"Key":"Value"}},"payload":{{"Field":"Value",...}}}}
+4) Plan (only when the request needs several of the above):
+{{"intent":"plan","steps":[{{"id":"s1",<shape 1-3 keys>}},{{"id":"s2","depends_on":["s1"],<shape 1-3 keys>}}]}}
 
-ALLOWED services/entities/fields (from service registry):
+ALLOWED services/entities (one per line: SERVICE ENTITY k=key fields f=fields):
 {registry_hint}
 
 Rules:
@@ -56,37 +65,180 @@ Rules:
 - Prefer valid field names listed.
 - Use ISO dates (YYYY-MM-DD) when dates are implied.
 - If user asks to create/update, include only fields likely required by the entity.
+- Use a plan only for several reads/writes in one request. Steps without depends_on run in parallel.
+- To use rows of an earlier step, set a value to {{"$ref":"<step id>.<Field>"}} (filter op "in" takes all its values).
 - Do NOT include commentary or code blocks. ONLY return pure JSON.
 """
 
-def _build_chain():
+_encoder = None
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when its encoding is available, else a ~4 chars/token estimate."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4)
+
+class ChainEntry(BaseModel):
+    model_config = {"arbitrary_types_allowed": True, "protected_namespaces": ()}
+
+    chain: Any
+    system_prompt: str
+    prompt_tokens: int
+    registry_version: int
+    model_name: str
+    allowed_services: Optional[List[str]] = None
+
+_CHAIN_CACHE_SIZE = 32
+_chain_cache: "OrderedDict[tuple, ChainEntry]" = OrderedDict()
+_chain_lock = threading.Lock()
+_llm_cache: Dict[tuple, Any] = {}
+
+def _get_llm(model_name: str):
+    key = (model_name, settings.OPENAI_API_KEY)
+    llm = _llm_cache.get(key)
+    if llm is None:
+        _llm_cache.clear()  # settings changed: drop the old client
+        llm = ChatOpenAI(model=model_name, temperature=0, api_key=settings.OPENAI_API_KEY)
+        _llm_cache[key] = llm
+    return llm
+
+def _build_chain(allowed_services: Optional[Tuple[str, ...]] = None):
     model_name = settings.MODEL_NAME or "gpt-4o-mini"
-    llm = ChatOpenAI(model=model_name, temperature=0, api_key=settings.OPENAI_API_KEY)
+    system_prompt = _build_system_prompt(allowed_services)
     prompt = ChatPromptTemplate.from_messages([
-        ("system", _build_system_prompt()),
+        SystemMessage(content=system_prompt),
         ("human", "{message}")
     ])
     parser = JsonOutputParser()
-    return prompt | llm | parser
+    return prompt | _get_llm(model_name) | parser, system_prompt
 
-def parse_to_intent(user_message: str) -> NLPResult:
-    if not available():
-        raise RuntimeError("LangChain is disabled or unavailable. Set USE_LANGCHAIN=true and install deps.")
-    chain = _build_chain()
-    intent_json = chain.invoke({"message": user_message})
-    logger.info("NLP intent JSON: {}", intent_json)
-    # Validate with our Pydantic union schema
+def get_chain(allowed_services: Optional[List[str]] = None) -> ChainEntry:
+    """Cached chain keyed by registry version, model settings and the allowed-services filter."""
+    allowed = tuple(sorted(set(allowed_services))) if allowed_services else None
+    model_name = settings.MODEL_NAME or "gpt-4o-mini"
+    version = get_registry().version
+    key = (version, model_name, settings.OPENAI_API_KEY, allowed)
+    with _chain_lock:
+        entry = _chain_cache.get(key)
+        if entry is not None:
+            _chain_cache.move_to_end(key)
+            return entry
+        chain, system_prompt = _build_chain(allowed)
+        entry = ChainEntry(
+            chain=chain,
+            system_prompt=system_prompt,
+            prompt_tokens=count_tokens(system_prompt),
+            registry_version=version,
+            model_name=model_name,
+            allowed_services=list(allowed) if allowed else None,
+        )
+        _chain_cache[key] = entry
+        while len(_chain_cache) > _CHAIN_CACHE_SIZE:
+            _chain_cache.popitem(last=False)
+    logger.info("NLP chain built: model={} registry_version={} allowed={} prompt_tokens={}",
+                model_name, version, entry.allowed_services, entry.prompt_tokens)
+    return entry
+
+def chain_stats() -> Dict[str, Any]:
+    return {
+        "limiter": get_nlp_limiter().stats(),
+        "intent_cache": intent_cache.stats(),
+        "sources": dict(_source_counts),
+        "cached_chains": len(_chain_cache),
+        "chains": [
+            {"registry_version": e.registry_version, "model": e.model_name,
+             "allowed_services": e.allowed_services, "prompt_tokens": e.prompt_tokens}
+            for e in _chain_cache.values()
+        ],
+    }
+
+_nlp_limiter: Optional[ConcurrencyLimiter] = None
+
+def get_nlp_limiter() -> ConcurrencyLimiter:
+    global _nlp_limiter
+    if _nlp_limiter is None:
+        _nlp_limiter = ConcurrencyLimiter(
+            "nlp",
+            max_concurrency=settings.NLP_MAX_CONCURRENCY,
+            max_queue=settings.NLP_MAX_QUEUE,
+            queue_timeout=settings.NLP_QUEUE_TIMEOUT,
+        )
+    return _nlp_limiter
+
+def _validate_intent(intent_json: Dict[str, Any]) -> None:
+    # Pydantic won't validate Union directly from dict unless we choose the class; do a simple route
     try:
-        # Pydantic won't validate Union directly from dict unless we choose the class; do a simple route
         if intent_json.get("intent") == "get":
             IntentGet(**intent_json)
         elif intent_json.get("intent") == "create":
             IntentCreate(**intent_json)
         elif intent_json.get("intent") == "update":
             IntentUpdate(**intent_json)
+        elif intent_json.get("intent") == "plan":
+            IntentPlan(**intent_json)
+            parse_plan(intent_json)
         else:
-            raise ValueError("intent must be one of: get|create|update")
+            raise ValueError("intent must be one of: get|create|update|plan")
     except Exception as e:
         logger.error("NLP intent validation failed: {}", e)
         raise
+
+_source_counts: Dict[str, int] = {"llm": 0, "cache": 0, "fast_path": 0}
+
+def _without_llm(user_message: str, allowed_services: Optional[List[str]]) -> Optional[NLPResult]:
+    """Serve from the intent cache or the rule-based fast path when possible."""
+    cached = intent_cache.get(user_message, allowed_services)
+    if cached is not None:
+        _source_counts["cache"] += 1
+        return NLPResult(intent_json=cached, raw_text=user_message, source="cache")
+    if settings.FAST_INTENT_ENABLED:
+        fast = fast_parse(user_message, allowed_services)
+        if fast is not None and fast.confidence >= settings.FAST_INTENT_THRESHOLD:
+            _source_counts["fast_path"] += 1
+            logger.info("NLP fast-path intent (confidence {}): {}", fast.confidence, fast.intent_json)
+            return NLPResult(intent_json=fast.intent_json, raw_text=user_message, source="fast_path", confidence=fast.confidence)
+    return None
+
+@timed(NLP_LATENCY, lambda *a, **k: (), result_labels=lambda r: (r.source,))
+def parse_to_intent(user_message: str, allowed_services: Optional[List[str]] = None) -> NLPResult:
+    if not available():
+        raise RuntimeError("LangChain is disabled or unavailable. Set USE_LANGCHAIN=true and install deps.")
+    quick = _without_llm(user_message, allowed_services)
+    if quick is not None:
+        return quick
+    chain = get_chain(allowed_services).chain
+    _source_counts["llm"] += 1
+    intent_json = chain.invoke({"message": user_message})
+    logger.info("NLP intent JSON: {}", intent_json)
+    # Validate with our Pydantic union schema
+    _validate_intent(intent_json)
+    intent_cache.put(user_message, intent_json, allowed_services)
+    return NLPResult(intent_json=intent_json, raw_text=user_message)
+
+@timed(NLP_LATENCY, lambda *a, **k: (), result_labels=lambda r: (r.source,))
+async def aparse_to_intent(user_message: str, allowed_services: Optional[List[str]] = None) -> NLPResult:
+    """Async variant of parse_to_intent: never blocks the event loop.
+
+    Calls are bounded by the NLP limiter (LimiterRejected when the queue is full or the wait
+    exceeds NLP_QUEUE_TIMEOUT) and each LLM call is capped at NLP_TIMEOUT (asyncio.TimeoutError).
+    """
+    if not available():
+        raise RuntimeError("LangChain is disabled or unavailable. Set USE_LANGCHAIN=true and install deps.")
+    quick = _without_llm(user_message, allowed_services)
+    if quick is not None:
+        return quick
+    chain = get_chain(allowed_services).chain
+    _source_counts["llm"] += 1
+    async with get_nlp_limiter().acquire():
+        intent_json = await asyncio.wait_for(chain.ainvoke({"message": user_message}), settings.NLP_TIMEOUT)
+    logger.info("NLP intent JSON: {}", intent_json)
+    _validate_intent(intent_json)
+    intent_cache.put(user_message, intent_json, allowed_services)
     return NLPResult(intent_json=intent_json, raw_text=user_message)
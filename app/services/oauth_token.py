@@ -0,0 +1,98 @@
+import asyncio, time
+from typing import Optional
+import httpx
+from loguru import logger
+from app.core.config import settings
+from app.core.http import get_http_client
+from app.utils.security import basic_auth_header
+
+class OAuthTokenProvider:
+    """OAuth2 client-credentials token cache.
+
+    The token is reused until ``refresh_margin`` seconds before ``expires_in``; inside that
+    window callers still get the current token while one background task refreshes it.
+    Only an expired (or missing) token makes a caller wait, and concurrent callers share
+    the same refresh.
+    """
+
+    def __init__(
+        self,
+        token_url: Optional[str] = None,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        scope: Optional[str] = None,
+        refresh_margin: Optional[float] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.token_url = token_url or settings.SAP_OAUTH_TOKEN_URL
+        self.client_id = client_id or settings.SAP_OAUTH_CLIENT_ID
+        self.client_secret = client_secret or settings.SAP_OAUTH_CLIENT_SECRET
+        self.scope = settings.SAP_OAUTH_SCOPE if scope is None else scope
+        self.refresh_margin = settings.SAP_OAUTH_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self._client = client
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    async def _request_token(self) -> None:
+        if not self.token_url:
+            raise RuntimeError("SAP_OAUTH_TOKEN_URL is not configured in .env")
+        data = {"grant_type": "client_credentials"}
+        if self.scope:
+            data["scope"] = self.scope
+        headers = {"Authorization": basic_auth_header(self.client_id, self.client_secret), "Accept": "application/json"}
+        client = self._client or get_http_client()
+        r = await client.post(self.token_url, data=data, headers=headers)
+        r.raise_for_status()
+        body = r.json()
+        token = body.get("access_token")
+        if not token:
+            raise RuntimeError("OAuth token response has no access_token")
+        expires_in = float(body.get("expires_in") or 3600)
+        self._token = token
+        self._expires_at = time.monotonic() + expires_in
+        self.refreshes += 1
+        logger.info("OAuth token refreshed (expires in {}s)", int(expires_in))
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._request_token())
+            self._refresh_task.add_done_callback(self._log_failure)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("OAuth token refresh failed: {}", task.exception())
+
+    async def get_token(self) -> str:
+        now = time.monotonic()
+        if self._token and now < self._expires_at - self.refresh_margin:
+            return self._token
+        if self._token and now < self._expires_at:
+            # still valid: hand it out and refresh in the background
+            self._start_refresh()
+            return self._token
+        await asyncio.shield(self._start_refresh())
+        return self._token
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop the cached token (only if it is still `token`, so concurrent 401s refresh once)."""
+        if token is not None and token != self._token:
+            return
+        self._token = None
+        self._expires_at = 0.0
+
+_provider: Optional[OAuthTokenProvider] = None
+
+def get_token_provider() -> OAuthTokenProvider:
+    global _provider
+    if _provider is None:
+        _provider = OAuthTokenProvider()
+    return _provider
+
+def set_token_provider(provider: Optional[OAuthTokenProvider]) -> None:
+    """Install a specific provider (used by tests)."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,101 @@
+"""OData v2 `$batch` multipart encoding and decoding.
+
+A batch is a list of changesets; each changeset is a list of (method, relative URL, payload)
+operations. The gateway applies a changeset atomically and answers with one response per
+operation, or a single error response when the changeset failed as a whole.
+"""
+import json, uuid
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+CRLF = "\r\n"
+
+class BatchOperation(BaseModel):
+    method: str
+    path: str                 # relative to the service root, e.g. "SalesOrderSet('1')"
+    payload: Optional[Dict[str, Any]] = None
+
+class BatchPartResponse(BaseModel):
+    status_code: int
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+def build_batch_body(changesets: List[List[BatchOperation]]) -> Tuple[str, bytes]:
+    """Return (Content-Type header, body) for a `$batch` POST."""
+    batch = f"batch_{uuid.uuid4().hex}"
+    lines: List[str] = []
+    content_id = 0
+    for ops in changesets:
+        changeset = f"changeset_{uuid.uuid4().hex}"
+        lines += [f"--{batch}", f"Content-Type: multipart/mixed; boundary={changeset}", ""]
+        for op in ops:
+            content_id += 1
+            body = json.dumps(op.payload or {}, ensure_ascii=False, separators=(",", ":"))
+            lines += [
+                f"--{changeset}",
+                "Content-Type: application/http",
+                "Content-Transfer-Encoding: binary",
+                f"Content-ID: {content_id}",
+                "",
+                f"{op.method} {op.path} HTTP/1.1",
+                "Content-Type: application/json",
+                "Accept: application/json",
+                f"Content-Length: {len(body.encode())}",
+                "",
+                body,
+            ]
+        lines += [f"--{changeset}--", ""]
+    lines += [f"--{batch}--", ""]
+    return f"multipart/mixed; boundary={batch}", CRLF.join(lines).encode()
+
+def _boundary(content_type: str) -> Optional[str]:
+    for part in content_type.split(";"):
+        k, _, v = part.strip().partition("=")
+        if k.lower() == "boundary":
+            return v.strip('"')
+    return None
+
+def _split_headers(block: str) -> Tuple[Dict[str, str], str]:
+    head, _, rest = block.partition(CRLF + CRLF)
+    headers: Dict[str, str] = {}
+    for line in head.split(CRLF):
+        k, sep, v = line.partition(":")
+        if sep:
+            headers[k.strip().lower()] = v.strip()
+    return headers, rest
+
+def _split_parts(body: str, boundary: str) -> List[str]:
+    parts = []
+    for chunk in body.split(f"--{boundary}")[1:]:
+        if chunk.startswith("--"):
+            break
+        parts.append(chunk[len(CRLF):] if chunk.startswith(CRLF) else chunk.lstrip("\n"))
+    return parts
+
+def _parse_http(part: str) -> BatchPartResponse:
+    _, http = _split_headers(part)
+    status_line, _, rest = http.partition(CRLF)
+    headers, body = _split_headers(rest)
+    status = int(status_line.split(" ")[1])
+    body = body.strip()
+    try:
+        parsed: Any = json.loads(body) if body else None
+    except ValueError:
+        parsed = body
+    return BatchPartResponse(status_code=status, headers=headers, body=parsed)
+
+def parse_batch_response(content_type: str, body: bytes) -> List[List[BatchPartResponse]]:
+    """One list per changeset, in request order. A failed changeset yields a single response."""
+    text = body.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\n", CRLF)
+    boundary = _boundary(content_type)
+    if not boundary:
+        raise ValueError("$batch response is not multipart")
+    out: List[List[BatchPartResponse]] = []
+    for part in _split_parts(text, boundary):
+        headers, rest = _split_headers(part)
+        ctype = headers.get("content-type", "")
+        if ctype.startswith("multipart/mixed"):
+            out.append([_parse_http(p) for p in _split_parts(rest, _boundary(ctype) or "")])
+        else:
+            out.append([_parse_http(part)])
+    return out
@@ -1,53 +1,79 @@
-import httpx, asyncio, json, time
-from typing import Any, Dict
+import httpx, asyncio, time
+import orjson
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import quote, urljoin
 from loguru import logger
 from app.core.config import settings
-from app.models.schemas import ODataGetRequest, ODataPostRequest, ODataPreviewResponse, ServiceRegistryOut
-from app.utils.url_builder import build_get_url, build_entity_key_segment
+from app.core.http import get_http_client
+from app.core.metrics import CSRF_LATENCY, ODATA_LATENCY, SAP_HTTP_LATENCY, SAP_RETRIES, timed
+from app.models.schemas import ODataGetRequest, ODataJoinRequest, ODataPostRequest, ODataPreviewResponse, ServiceRegistryOut, ODataBatchItemResult
+from app.utils.url_builder import build_filter, build_get_url, build_entity_key_segment
 from app.utils.security import basic_auth_header
-from pathlib import Path
+from app.utils.result_format import compact_rows
+from app.services.query_planner import QueryValidationError, plan_query
+from app.services.odata_join import expanded, hash_join, join_keys, key_chunks, navigation_to, with_fields
+from app.data.registry import get_registry
+from app.services.csrf_cache import CsrfEntry, csrf_cache
+from app.services.oauth_token import get_token_provider
+from app.services.response_cache import response_cache
+from app.services.replica import get_replica
+from app.services import resilience
+from app.services.bulkhead import admit
+from app.core.errors import BackendUnavailable
+from app.services.resilience import RETRYABLE_STATUS, RetryableResponse, get_breaker, is_retryable, retry_wait
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt
+from app.services.odata_batch import BatchOperation, build_batch_body, parse_batch_response
 
-REGISTRY_PATH = Path(__file__).resolve().parents[1] / "data" / "registry.json"
+def _metric_labels(operation: str, service: str, entity: str) -> Tuple[str, str, str]:
+    """ODATA_LATENCY labels: registry names only, anything else folds into "other" to bound cardinality."""
+    svc = get_registry().services.get(service)
+    if svc is None:
+        return operation, "other", "other"
+    return operation, service, entity if entity in svc.entities else "other"
+
+def extract_rows(body: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Rows and next-page link from an OData v2 (`d.results`/`d.__next`) or v4 (`value`/`@odata.nextLink`) body."""
+    if isinstance(body, dict) and "d" in body:
+        d = body["d"]
+        if isinstance(d, dict) and "results" in d:
+            return d["results"], d.get("__next")
+        return (d if isinstance(d, list) else [d]), None
+    if isinstance(body, dict) and "value" in body:
+        return body["value"], body.get("@odata.nextLink")
+    return (body if isinstance(body, list) else [body]), None
+
+EMPTY_RESULTS = b'{"d":{"results":[]}}'
 
 class ODataService:
     """Service that builds dynamic OData URLs from a JSON registry and executes HTTP calls."""
 
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.base_url = settings.SAP_BASE_URL
         if not self.base_url:
             raise RuntimeError("SAP_BASE_URL is not configured in .env")
-        self.session = httpx.AsyncClient(timeout=60.0, verify=True)
-
-    def __del__(self):
-        try:
-            if not self.session.is_closed:
-                asyncio.get_event_loop().run_until_complete(self.session.aclose())
-        except Exception:
-            pass
+        # The pooled client is owned by the app lifespan (app.core.http); never close it here.
+        self.session = client or get_http_client()
 
     # ---------------- Registry ----------------
-    def _load_registry(self) -> Dict[str, Any]:
-        with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-
     def get_registry(self) -> ServiceRegistryOut:
-        data = self._load_registry()
-        return ServiceRegistryOut(**data)
+        return get_registry().out
 
     # ---------------- Auth ----------------
-    def _auth_headers(self) -> Dict[str, str]:
+    async def _auth_headers(self) -> Dict[str, str]:
         if settings.SAP_AUTH_MODE == "basic":
             return {"Authorization": basic_auth_header(settings.SAP_USERNAME, settings.SAP_PASSWORD)}
         elif settings.SAP_AUTH_MODE == "oauth2":
-            # Placeholder: in real-world, fetch & cache token. Keep minimal here.
-            return {"Authorization": f"Bearer {settings.OPENAI_API_KEY or 'YOUR_OAUTH_TOKEN'}"}
+            token = await get_token_provider().get_token()
+            return {"Authorization": f"Bearer {token}"}
         else:
             return {}
 
     # ---------------- CSRF ----------------
-    async def _fetch_csrf(self, url_path: str) -> Dict[str, Any]:
+    @timed(CSRF_LATENCY, lambda self, url_path: (url_path.strip('/'),))
+    async def _fetch_csrf(self, url_path: str) -> CsrfEntry:
         """Fetch CSRF token and cookies for a given service path (not full URL)."""
-        headers = {**self._auth_headers(), "X-CSRF-Token": "Fetch", "Accept": "application/json"}
+        headers = {**(await self._auth_headers()), "X-CSRF-Token": "Fetch", "Accept": "application/json"}
         # Use a HEAD or GET; many SAP systems require GET
         url = f"{self.base_url.rstrip('/')}/{url_path.lstrip('/')}"
         resp = await self.session.get(url, headers=headers)
@@ -55,30 +81,314 @@ class ODataService:
         token = resp.headers.get("x-csrf-token") or resp.headers.get("X-CSRF-Token")
         if not token:
             logger.warning("CSRF token missing in response headers; check SAP config.")
-        cookies = resp.cookies
-        return {"token": token, "cookies": cookies}
+        cookies = {c.name: c.value for c in resp.cookies.jar}
+        return CsrfEntry(token=token, cookies=cookies)
+
+    async def _csrf_for(self, svc_path: str) -> CsrfEntry:
+        """Cached CSRF token for svc_path; concurrent misses share one fetch."""
+        return await csrf_cache.get(svc_path, lambda: self._fetch_csrf(svc_path))
+
+    async def _write_headers(self, csrf: CsrfEntry) -> Dict[str, str]:
+        headers = {**(await self._auth_headers()), "Accept": "application/json", "Content-Type": "application/json"}
+        if csrf.token:
+            headers["X-CSRF-Token"] = csrf.token
+        cookie = csrf.cookie_header()
+        if cookie:
+            headers["Cookie"] = cookie
+        return headers
+
+    @staticmethod
+    def _csrf_required(r: httpx.Response) -> bool:
+        return r.status_code == 403 and (r.headers.get("x-csrf-token") or "").lower() == "required"
 
     # ---------------- GET ----------------
+    def _get_url(self, req: ODataGetRequest, top: Optional[int] = None, skip: Optional[int] = None) -> str:
+        """Collection URL from the query plan (validated fields, collapsed filters, default $select)."""
+        plan = plan_query(req, allow_key_lookup=False)
+        return plan.url(self.base_url, req.top if top is None else top, req.skip if skip is None else skip)
+
+    @timed(ODATA_LATENCY, lambda self, req, *a, **k: _metric_labels("get", req.service, req.entity))
     async def execute_get(self, req: ODataGetRequest):
-        registry = self._load_registry()
-        svc = registry["services"].get(req.service)
-        if not svc:
-            raise ValueError(f"Service '{req.service}' not found in registry")
-        entity = svc["entities"].get(req.entity)
-        if not entity:
-            raise ValueError(f"Entity '{req.entity}' not found in service '{req.service}'")
-        url = build_get_url(
-            base_url=self.base_url,
-            base_path=svc["base_path"],
-            entity=req.entity,
-            fields=req.fields,
-            filters=[f.model_dump() if hasattr(f,'model_dump') else f for f in (req.filters or [])],
-            top=req.top, skip=req.skip, orderby=req.orderby
-        )
-        headers = {**self._auth_headers(), "Accept": "application/json"}
-        logger.info(f"GET -> {url}")
+        if req.parallel:
+            return await self._get_parallel(req)
+        return orjson.loads(await self._get_body(req))
+
+    @timed(ODATA_LATENCY, lambda self, req, *a, **k: _metric_labels("get", req.service, req.entity))
+    async def execute_get_raw(self, req: ODataGetRequest) -> bytes:
+        """Like execute_get, but returns the gateway's JSON body undecoded (for passthrough responses)."""
+        if req.parallel:
+            return orjson.dumps(await self._get_parallel(req))
+        body = await self._get_body(req)
+        if body.lstrip()[:1] not in (b"{", b"["):
+            raise ValueError(f"gateway returned a non-JSON body: {body[:80]!r}")
+        return body
+
+    async def execute_get_compact(self, req: ODataGetRequest) -> Dict[str, Any]:
+        """execute_get reshaped per `req.result_format` (see compact_rows); gateway error bodies pass through."""
+        return self.compact(req, await self.execute_get(req))
+
+    def compact(self, req: ODataGetRequest, body: Any) -> Dict[str, Any]:
+        if isinstance(body, dict) and "error" in body:
+            return body
+        _, entity = get_registry().entity(req.service, req.entity)
+        rows, next_link = extract_rows(body)
+        out = compact_rows(rows, req.fields, entity.field_types, req.result_format)
+        d = body.get("d") if isinstance(body, dict) else None
+        if isinstance(d, dict) and "__count" in d:
+            out["total"] = int(d["__count"])
+        if next_link:
+            out["next"] = next_link
+        return out
+
+    async def _get_parallel(self, req: ODataGetRequest) -> Dict[str, Any]:
+        rows: List[Dict[str, Any]] = []
+        async for page in self.iter_pages_parallel(req, limit=req.limit):
+            rows.extend(page)
+        return {"d": {"results": rows}}
+
+    async def _get_body(self, req: ODataGetRequest) -> bytes:
+        plan = plan_query(req)
+        if plan.empty:
+            logger.info(f"GET {req.service}/{req.entity}: filters can never match, skipping the gateway")
+            return EMPTY_RESULTS
+        replica = get_replica()
+        if replica is not None:
+            local = replica.read(req, plan)
+            if local is not None:
+                return local
+        url = plan.url(self.base_url, req.top, req.skip)
+
+        async def send(etag: Optional[str]) -> httpx.Response:
+            headers = {**(await self._auth_headers()), "Accept": "application/json"}
+            if etag:
+                headers["If-None-Match"] = etag
+            logger.info(f"GET -> {url}" + (" (revalidate)" if etag else ""))
+            return await self._request_with_retry("GET", url, headers=headers)
+
+        if not settings.SAP_GET_CACHE_ENABLED:
+            r = await send(None)
+            code, body = r.status_code, r.content
+        else:
+            _, entity = get_registry().entity(req.service, req.entity)
+            ttl = entity.cache_ttl if entity.cache_ttl is not None else settings.SAP_GET_CACHE_TTL
+            # expanded rows belong to their own entity sets too: writes to those must drop this body
+            tags = [(req.service, req.entity), *((req.service, e) for e in plan.template.expanded)]
+            code, body = await response_cache.fetch(url, tags, ttl, send)
+        if plan.key is None:
+            return body
+        # key lookup: reshape the single entity (or 404) into the collection form callers expect
+        if code == 404:
+            return EMPTY_RESULTS
+        if code >= 400:
+            return body
+        rows, _ = extract_rows(orjson.loads(body))
+        return orjson.dumps({"d": {"results": rows}})
+
+    async def iter_pages(self, req: ODataGetRequest, limit: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the result rows page by page, following server paging (`__next` / `$skiptoken`).
+
+        `req.top` is the page size. When the gateway sends no next link but returns a full
+        page, the next window is requested with `$skip`. Stops after `limit` rows overall.
+        Only one page is held in memory at a time.
+        """
+        page_size = req.top or 1000
+        skip = req.skip or 0
+        plan = plan_query(req, allow_key_lookup=False)
+        url: Optional[str] = None if plan.empty else plan.url(self.base_url, page_size, skip)
+        sent = 0
+        while url:
+            headers = {**(await self._auth_headers()), "Accept": "application/json"}
+            logger.info(f"GET page -> {url}")
+            r = await self._request_with_retry("GET", url, headers=headers)
+            r.raise_for_status()
+            rows, next_link = extract_rows(orjson.loads(r.content))
+            if limit is not None and sent + len(rows) > limit:
+                rows = rows[:limit - sent]
+            if rows:
+                sent += len(rows)
+                yield rows
+            if limit is not None and sent >= limit:
+                return
+            if next_link:
+                url = urljoin(url, next_link)
+            elif len(rows) == page_size:
+                skip += page_size
+                url = plan.url(self.base_url, page_size, skip)
+            else:
+                url = None
+
+    async def count(self, req: ODataGetRequest) -> int:
+        """Number of rows matching req.filters: `$count`, falling back to `$inlinecount=allpages`."""
+        plan = plan_query(req, allow_key_lookup=False)
+        if plan.empty:
+            return 0
+        svc, entity = get_registry().entity(req.service, req.entity)
+        filters = list(plan.filters)
+        headers = await self._auth_headers()
+        url = plan.count_url(self.base_url)
+        logger.info(f"GET count -> {url}")
+        r = await self._request_with_retry("GET", url, headers={**headers, "Accept": "text/plain"})
+        if r.status_code < 400:
+            try:
+                return int(r.text.strip())
+            except ValueError:
+                pass
+        url = build_get_url(self.base_url, svc.base_path, req.entity, fields=list(entity.key_fields) or None,
+                            filters=filters, top=1, inlinecount="allpages", field_types=entity.field_types)
+        logger.info(f"GET inlinecount -> {url}")
+        r = await self._request_with_retry("GET", url, headers={**headers, "Accept": "application/json"})
+        r.raise_for_status()
+        return int(r.json()["d"]["__count"])
+
+    # ---------------- header/item reads ----------------
+    @timed(ODATA_LATENCY, lambda self, req, *a, **k: _metric_labels("get_joined", req.service, req.header))
+    async def execute_get_joined(self, req: ODataJoinRequest) -> Tuple[str, Dict[str, Any]]:
+        """Header rows with their items under `req.items_field`; returns (strategy, body).
+
+        "expand" lets the gateway inline the items through the registry navigation; "join"
+        reads the item set for the returned header keys and joins here (see app.services.odata_join).
+        """
+        _, header = get_registry().entity(req.service, req.header)
+        _, items = get_registry().entity(req.service, req.items)
+        keys = join_keys(header, items)
+        nav = navigation_to(header, items)
+        strategy = req.strategy
+        if strategy == "auto":
+            strategy = "expand" if nav and not req.item_filters else "join"
+        if strategy == "join":
+            return strategy, await self._get_joined(req, keys)
+        if nav is None:
+            raise QueryValidationError(f"No navigation from {req.header} to {req.items} in the registry")
+        if req.item_filters:
+            raise QueryValidationError("item_filters need strategy 'join' (OData v2 cannot filter inside $expand)")
+        return strategy, await self._get_expanded(req, header.fields, nav)
+
+    def _header_request(self, req: ODataJoinRequest, fields: Optional[List[str]], expand: Optional[List[str]] = None) -> ODataGetRequest:
+        return ODataGetRequest(service=req.service, entity=req.header, fields=fields, filters=req.filters,
+                               top=req.top, skip=req.skip, orderby=req.orderby, expand=expand)
+
+    async def _get_expanded(self, req: ODataJoinRequest, header_fields: Tuple[str, ...], nav: str) -> Dict[str, Any]:
+        fields = req.header_fields
+        if req.item_fields is not None:
+            fields = [*(req.header_fields or header_fields), *(f"{nav}/{f}" for f in req.item_fields)]
+        body = orjson.loads(await self._get_body(self._header_request(req, fields, [nav])))
+        if isinstance(body, dict) and "error" in body:
+            return body
+        rows, _ = extract_rows(body)
+        for row in rows:
+            row[req.items_field] = expanded(row, nav)
+        return {"d": {"results": rows}}
+
+    async def _read_all(self, req: ODataGetRequest) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        async for page in self.iter_pages(req):
+            rows.extend(page)
+        return rows
+
+    @staticmethod
+    def _keys_fit_page(req: ODataJoinRequest, filters: List[Dict[str, Any]], keys: Tuple[str, ...]) -> bool:
+        """Whether `filters` pin every join key with eq/in and match no more headers than `top`/`skip` return."""
+        if not filters or not all(f["field"] in keys and f["op"] in ("eq", "in") for f in filters):
+            return False
+        matches = 1
+        for k in keys:
+            counts = [len({str(v) for v in (f["value"] if f["op"] == "in" else [f["value"]])})
+                      for f in filters if f["field"] == k]
+            if not counts:
+                return False
+            matches *= min(counts)
+        return not req.skip and (req.top is None or matches <= req.top)
+
+    async def _get_joined(self, req: ODataJoinRequest, keys: Tuple[str, ...]) -> Dict[str, Any]:
+        header_req = self._header_request(req, with_fields(req.header_fields, keys))
+        item_fields = with_fields(req.item_fields, keys)
+        item_filters = [f.model_dump() for f in req.item_filters or []]
+
+        def items_request(filters: List[Dict[str, Any]]) -> ODataGetRequest:
+            return ODataGetRequest(service=req.service, entity=req.items, fields=item_fields,
+                                   filters=filters + item_filters, top=1000)
+
+        filters = [f.model_dump() for f in req.filters or []]
+        if self._keys_fit_page(req, filters, keys):
+            # headers are picked by key alone and all fit the page: the same predicates select exactly
+            # their items, so read both at once
+            body, item_rows = await asyncio.gather(self._get_body(header_req), self._read_all(items_request(filters)))
+            body = orjson.loads(body)
+            if isinstance(body, dict) and "error" in body:
+                return body
+            headers, _ = extract_rows(body)
+        else:
+            body = orjson.loads(await self._get_body(header_req))
+            if isinstance(body, dict) and "error" in body:
+                return body
+            headers, _ = extract_rows(body)
+            values = list(dict.fromkeys(h.get(keys[0]) for h in headers if h.get(keys[0]) is not None))
+            gate = asyncio.Semaphore(max(1, settings.SAP_FANOUT_MAX_PARALLEL))
+
+            async def read(chunk: List[Any]) -> List[Dict[str, Any]]:
+                async with gate:
+                    return await self._read_all(items_request([{"field": keys[0], "op": "in", "value": chunk}]))
+
+            _, items = get_registry().entity(req.service, req.items)
+
+            def width(value: Any) -> int:
+                # encoded length of one `Key eq value or ` term of the item $filter
+                return len(quote(f"{build_filter([{'field': keys[0], 'value': value}], items.field_types)} or "))
+
+            batches = key_chunks(values, settings.ODATA_JOIN_CHUNK_SIZE, width, settings.ODATA_JOIN_MAX_FILTER_LENGTH)
+            chunks = await asyncio.gather(*(read(c) for c in batches))
+            item_rows = [row for chunk in chunks for row in chunk]
+        logger.info(f"GET joined {req.header}/{req.items}: {len(headers)} headers, {len(item_rows)} items")
+        return {"d": {"results": hash_join(headers, item_rows, keys, req.items_field)}}
+
+    async def fetch_metadata(self, base_path: str) -> bytes:
+        """Raw EDMX document of a gateway service (`<base_path>/$metadata`)."""
+        url = f"{self.base_url.rstrip('/')}/{base_path.strip('/')}/$metadata"
+        headers = {**(await self._auth_headers()), "Accept": "application/xml"}
+        logger.info(f"GET metadata -> {url}")
         r = await self._request_with_retry("GET", url, headers=headers)
-        return r.json()
+        r.raise_for_status()
+        return r.content
+
+    async def iter_pages_parallel(self, req: ODataGetRequest, limit: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Count first, then fetch the `$top`/`$skip` windows concurrently and yield them in order.
+
+        At most `req.parallel` windows (capped by SAP_FANOUT_MAX_PARALLEL) are in flight or
+        waiting to be yielded, so memory stays bounded by that many pages.
+        """
+        page_size = req.top or 1000
+        start = req.skip or 0
+        parallel = max(1, min(req.parallel or 1, settings.SAP_FANOUT_MAX_PARALLEL))
+        total = max(0, await self.count(req) - start)
+        if limit is not None:
+            total = min(total, limit)
+        if not req.orderby:
+            # $skip windows are only disjoint under a stable order; default to the key fields
+            _, entity = get_registry().entity(req.service, req.entity)
+            if entity.key_fields:
+                req = req.model_copy(update={"orderby": ",".join(entity.key_fields)})
+        windows = iter(range(start, start + total, page_size))
+        end = start + total
+
+        async def fetch(skip: int) -> List[Dict[str, Any]]:
+            url = self._get_url(req, top=min(page_size, end - skip), skip=skip)
+            headers = {**(await self._auth_headers()), "Accept": "application/json"}
+            logger.info(f"GET window -> {url}")
+            r = await self._request_with_retry("GET", url, headers=headers)
+            r.raise_for_status()
+            return extract_rows(orjson.loads(r.content))[0]
+
+        inflight: Deque[asyncio.Task] = deque()
+        try:
+            for skip in windows:
+                inflight.append(asyncio.ensure_future(fetch(skip)))
+                if len(inflight) >= parallel:
+                    yield await inflight.popleft()
+            while inflight:
+                yield await inflight.popleft()
+        finally:
+            for t in inflight:
+                t.cancel()
 
     # ---------------- POST (create/update) ----------------
     async def preview_post(self, req: ODataPostRequest) -> ODataPreviewResponse:
@@ -86,37 +396,41 @@ class ODataService:
         headers_preview = {"Accept": "application/json", "Content-Type": "application/json"}
         return ODataPreviewResponse(ok=True, url=url, method=method, headers_preview=headers_preview, payload=payload)
 
+    @timed(ODATA_LATENCY, lambda self, req, *a, **k: _metric_labels(req.action, req.service, req.entity))
     async def execute_post(self, req: ODataPostRequest):
         svc_path, url, method, payload = await self._compose_post(req)
-        # 1) fetch CSRF for svc_path (not full URL)
-        csrf = await self._fetch_csrf(svc_path)
-        headers = {**self._auth_headers(), "Accept": "application/json", "Content-Type": "application/json"}
-        if csrf.get("token"):
-            headers["X-CSRF-Token"] = csrf["token"]
+        # 1) CSRF for svc_path (not full URL), cached per service
+        csrf = await self._csrf_for(svc_path)
         logger.info(f"{method} -> {url} (payload keys: {list(payload.keys())})")
-        r = await self._request_with_retry(method, url, headers=headers, json=payload, cookies=csrf.get("cookies"))
+        r = await self._request_with_retry(method, url, headers=await self._write_headers(csrf), json=payload)
+        if self._csrf_required(r):
+            # token/session expired on the gateway: refresh once and retry
+            logger.info(f"CSRF token rejected for {svc_path}; refreshing")
+            csrf_cache.invalidate(svc_path, csrf)
+            csrf = await self._csrf_for(svc_path)
+            r = await self._request_with_retry(method, url, headers=await self._write_headers(csrf), json=payload)
         # some SAP gateways return 201 with no JSON body on CREATE; handle both
         try:
-            return r.json()
+            data = r.json()
         except ValueError:
-            return {"status_code": r.status_code, "text": r.text}
+            data = {"status_code": r.status_code, "text": r.text}
+        if r.status_code < 400:
+            response_cache.invalidate(req.service, req.entity)
+            replica = get_replica()
+            if replica is not None:
+                await replica.apply_write(req, data)
+        return data
 
     async def _compose_post(self, req: ODataPostRequest):
         if req.action not in ("create","update"):
             raise ValueError("action must be 'create' or 'update'")
-        registry = self._load_registry()
-        svc = registry["services"].get(req.service)
-        if not svc:
-            raise ValueError(f"Service '{req.service}' not found in registry")
-        entity = svc["entities"].get(req.entity)
-        if not entity:
-            raise ValueError(f"Entity '{req.entity}' not found in service '{req.service}'")
-        base_path = svc["base_path"]
+        svc, entity = get_registry().entity(req.service, req.entity)
+        base_path = svc.base_path
         if req.action == "create" or not req.key_fields:
             url_path = f"{base_path.rstrip('/')}/{req.entity}"
             method = "POST"
         else:
-            key_seg = build_entity_key_segment(req.key_fields)
+            key_seg = build_entity_key_segment(req.key_fields, entity.field_types)
             url_path = f"{base_path.rstrip('/')}/{req.entity}{key_seg}"
             # Many SAP OData updates are via MERGE or PATCH; POST with X-HTTP-Method can also be used.
             method = "PATCH"
@@ -124,22 +438,153 @@ class ODataService:
         payload = req.payload
         return base_path, url, method, payload
 
-    # ---------------- retry wrapper ----------------
-    async def _request_with_retry(self, method: str, url: str, **kwargs):
-        max_attempts = 3
-        delay = 0.75
-        last_exc = None
-        for attempt in range(1, max_attempts+1):
+    # ---------------- $batch ----------------
+    async def execute_batch(self, ops: List[ODataPostRequest], atomic: bool = False, batch_size: Optional[int] = None) -> List[ODataBatchItemResult]:
+        """Send create/update operations as multipart `$batch` requests, grouped per service.
+
+        Each service gets one CSRF handshake; operations are sent `batch_size` at a time.
+        Results come back in the order of `ops`, matched by index.
+        """
+        batch_size = batch_size or settings.SAP_BATCH_SIZE
+        results: List[Optional[ODataBatchItemResult]] = [None] * len(ops)
+        groups: Dict[str, List[Tuple[int, BatchOperation]]] = {}
+        for i, op in enumerate(ops):
             try:
-                r = await self.session.request(method, url, **kwargs)
-                if r.status_code >= 500:
-                    raise httpx.HTTPStatusError("server error", request=r.request, response=r)
-                return r
+                svc_path, url, method, payload = await self._compose_post(op)
             except Exception as e:
-                last_exc = e
-                logger.warning(f"Attempt {attempt}/{max_attempts} failed for {method} {url}: {e}")
-                await asyncio.sleep(delay * attempt)
-        logger.error(f"All attempts failed for {method} {url}")
-        if last_exc:
-            raise last_exc
-        raise RuntimeError("request failed without exception")
+                results[i] = ODataBatchItemResult(index=i, ok=False, error=str(e))
+                continue
+            service_root = f"{self.base_url.rstrip('/')}/{svc_path.strip('/')}/"
+            groups.setdefault(svc_path, []).append((i, BatchOperation(method=method, path=url[len(service_root):], payload=payload)))
+
+        async def run_group(svc_path: str, items: List[Tuple[int, BatchOperation]]) -> None:
+            for start in range(0, len(items), batch_size):
+                chunk = items[start:start + batch_size]
+                try:
+                    for (i, _), res in zip(chunk, await self._send_batch(svc_path, [op for _, op in chunk], atomic)):
+                        results[i] = res.model_copy(update={"index": i})
+                except Exception as e:
+                    logger.warning(f"$batch for {svc_path} failed: {e}")
+                    for i, _ in chunk:
+                        results[i] = ODataBatchItemResult(index=i, ok=False, error=str(e))
+
+        await asyncio.gather(*(run_group(p, items) for p, items in groups.items()))
+        replica = get_replica()
+        for res in results:
+            if res.ok:
+                response_cache.invalidate(ops[res.index].service, ops[res.index].entity)
+                if replica is not None:
+                    await replica.apply_write(ops[res.index], res.data)
+        return results
+
+    async def _send_batch(self, svc_path: str, ops: List[BatchOperation], atomic: bool) -> List[ODataBatchItemResult]:
+        changesets = [ops] if atomic else [[op] for op in ops]
+        content_type, body = build_batch_body(changesets)
+        url = f"{self.base_url.rstrip('/')}/{svc_path.strip('/')}/$batch"
+        csrf = await self._csrf_for(svc_path)
+        logger.info(f"POST $batch -> {url} ({len(ops)} operations, atomic={atomic})")
+
+        async def send(csrf: CsrfEntry) -> httpx.Response:
+            headers = {**(await self._write_headers(csrf)), "Content-Type": content_type, "Accept": "multipart/mixed"}
+            return await self._request_with_retry("POST", url, headers=headers, content=body)
+
+        r = await send(csrf)
+        if self._csrf_required(r):
+            csrf_cache.invalidate(svc_path, csrf)
+            r = await send(await self._csrf_for(svc_path))
+        r.raise_for_status()
+        out: List[ODataBatchItemResult] = []
+        for ops_in_set, responses in zip(changesets, parse_batch_response(r.headers.get("content-type", ""), r.content)):
+            if len(responses) != len(ops_in_set):
+                # the changeset failed as a whole: its single error applies to every operation
+                err = responses[0]
+                out += [ODataBatchItemResult(index=0, ok=False, status_code=err.status_code, data=err.body,
+                                             error=f"changeset failed with HTTP {err.status_code}") for _ in ops_in_set]
+                continue
+            for resp in responses:
+                ok = resp.status_code < 400
+                out.append(ODataBatchItemResult(index=0, ok=ok, status_code=resp.status_code, data=resp.body,
+                                                error=None if ok else f"HTTP {resp.status_code}"))
+        if len(out) != len(ops):
+            raise RuntimeError(f"$batch returned {len(out)} results for {len(ops)} operations")
+        return out
+
+    # ---------------- retry wrapper ----------------
+    def _breaker_name(self, url: str) -> str:
+        """Circuit breakers (and bulkheads) are per SAP service: the longest registry base_path
+        the URL path under SAP_BASE_URL starts with, else its first path segment."""
+        base = self.base_url.rstrip('/')
+        path = (url[len(base):] if url.startswith(base) else url).split('?', 1)[0].strip('/')
+        matches = [bp for bp in get_registry().by_base_path if path == bp or path.startswith(bp + "/")]
+        if matches:
+            return max(matches, key=len)
+        return path.split('/', 1)[0] or "default"
+
+    async def _request_with_retry(self, method: str, url: str, *, reauth: bool = True, **kwargs):
+        """Send one request through the service's circuit breaker with an idempotency-aware retry policy.
+
+        Reads retry on transport errors and 429/502/503/504; writes only when the request never
+        reached the gateway or it answered 429/503. Waits honor Retry-After, otherwise use
+        exponential backoff with full jitter, and every retry must be paid from the global
+        retry budget. A final 5xx raises httpx.HTTPStatusError; other statuses are returned.
+        Under OAuth a 401 drops the cached token and the request is sent once more with a new one.
+        """
+        breaker = get_breaker(self._breaker_name(url))
+        breaker.before_call()
+        resilience.retry_budget.record_request()
+
+        def should_retry(exc: BaseException) -> bool:
+            if not is_retryable(method, exc):
+                return False
+            if not resilience.retry_budget.try_spend():
+                logger.warning(f"Retry budget exhausted; not retrying {method} {url}")
+                return False
+            return True
+
+        def before_sleep(state: RetryCallState) -> None:
+            SAP_RETRIES.inc(breaker.name, method)
+            logger.warning(f"Attempt {state.attempt_number}/{settings.SAP_RETRY_MAX_ATTEMPTS} failed for {method} {url}: "
+                           f"{state.outcome.exception()}; retrying in {state.next_action.sleep:.2f}s")
+
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(settings.SAP_RETRY_MAX_ATTEMPTS),
+                wait=retry_wait,
+                retry=retry_if_exception(should_retry),
+                before_sleep=before_sleep,
+                reraise=True,
+            ):
+                with attempt:
+                    async with admit(breaker.name):
+                        t0 = time.perf_counter()
+                        try:
+                            r = await self.session.request(method, url, **kwargs)
+                        except Exception:
+                            SAP_HTTP_LATENCY.observe(time.perf_counter() - t0, breaker.name, method, "error")
+                            raise
+                        SAP_HTTP_LATENCY.observe(time.perf_counter() - t0, breaker.name, method, str(r.status_code))
+                    if r.status_code in RETRYABLE_STATUS:
+                        raise RetryableResponse(r)
+        except RetryableResponse as e:
+            r = e.response
+        except (asyncio.CancelledError, BackendUnavailable):
+            # cancelled, or refused locally by a bulkhead: says nothing about the backend's health
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            logger.error(f"All attempts failed for {method} {url}")
+            raise
+        if r.status_code >= 500:
+            breaker.record_failure()
+            logger.error(f"{method} {url} failed with HTTP {r.status_code}")
+            raise httpx.HTTPStatusError("server error", request=r.request, response=r)
+        breaker.record_success()
+        if r.status_code == 401 and reauth and settings.SAP_AUTH_MODE == "oauth2":
+            # token revoked or rotated before its expiry: fetch a fresh one and try once more
+            headers = kwargs.get("headers") or {}
+            get_token_provider().invalidate(headers.get("Authorization", "").removeprefix("Bearer "))
+            logger.warning(f"{method} {url} got HTTP 401; retrying with a new OAuth token")
+            headers = {**headers, **(await self._auth_headers())}
+            return await self._request_with_retry(method, url, reauth=False, **{**kwargs, "headers": headers})
+        return r
@@ -0,0 +1,67 @@
+"""Header/item composite reads.
+
+A header entity set and its item set (`SalesOrderSet` / `SalesItemSet`) are joined on the
+header key fields the item key repeats. With a registry navigation from the header to the
+items the gateway inlines them (`$expand`); otherwise the header keys are pushed down to
+the item set as `(Key eq 'a' or Key eq 'b' ...)` filters (OData v2 has no `in`) in chunks
+sized to keep the URL short, and the rows are joined here with a hash join.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.data.registry import EntityIndex
+from app.services.query_planner import QueryValidationError
+
+def join_keys(header: EntityIndex, items: EntityIndex) -> Tuple[str, ...]:
+    """Header key fields also present on the items (in header key order)."""
+    item_fields = items.key_set | items.field_set
+    keys = tuple(k for k in header.key_fields if k in item_fields)
+    if not keys:
+        raise QueryValidationError(f"No shared key fields between {header.name} and {items.name}")
+    return keys
+
+def navigation_to(header: EntityIndex, items: EntityIndex) -> Optional[str]:
+    """Name of the to-many navigation property from `header` to `items`, if the registry has one."""
+    for name, nav in header.navigation.items():
+        if nav.get("entity") == items.name and nav.get("multiplicity", "*") == "*":
+            return name
+    return None
+
+def with_fields(fields: Optional[Sequence[str]], required: Iterable[str]) -> Optional[List[str]]:
+    """`fields` plus `required` (None stays None: the registry default selects everything)."""
+    if fields is None:
+        return None
+    return list(dict.fromkeys([*fields, *required]))
+
+def key_chunks(values: List[Any], size: int, width: Callable[[Any], int] = lambda v: 0,
+               max_width: int = 0) -> List[List[Any]]:
+    """Consecutive runs of at most `size` values whose summed `width` stays within `max_width`
+    (0 = unbounded); a value wider than `max_width` on its own still gets a chunk."""
+    chunks: List[List[Any]] = []
+    chunk: List[Any] = []
+    used = 0
+    for value in values:
+        w = width(value)
+        if chunk and (len(chunk) == size or (max_width and used + w > max_width)):
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(value)
+        used += w
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def expanded(row: Dict[str, Any], nav: str) -> List[Dict[str, Any]]:
+    """Rows of an expanded to-many navigation (`{"results": [...]}` in v2, a list in v4)."""
+    value = row.pop(nav, None)
+    if isinstance(value, dict):
+        return value.get("results", [])
+    return value or []
+
+def hash_join(headers: List[Dict[str, Any]], items: Iterable[Dict[str, Any]], keys: Tuple[str, ...],
+              items_field: str) -> List[Dict[str, Any]]:
+    """Attach to each header the items whose `keys` match, in item order; unmatched items are dropped."""
+    buckets: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for item in items:
+        buckets.setdefault(tuple(str(item.get(k)) for k in keys), []).append(item)
+    for header in headers:
+        header[items_field] = buckets.get(tuple(str(header.get(k)) for k in keys), [])
+    return headers
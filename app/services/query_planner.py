@@ -0,0 +1,319 @@
+"""Planning stage between ODataGetRequest and URL building.
+
+For each request shape (service, entity, fields, filter fields/ops, orderby) a template is
+compiled once and cached: fields are validated against the registry, `$select` defaults to the
+entity's field list and key-field predicates are located. Binding the template to the request's
+values then collapses redundant predicates per field and, when every key field is pinned by a
+single `eq` and nothing else is filtered, addresses the entity by key instead of scanning with
+`$filter`. Contradictory predicates (`A eq 1 and A eq 2`) yield an empty plan that never
+reaches the gateway. Only fields with a numeric, date or string type in `field_types` are
+collapsed, comparing the values as that type; predicates on untyped fields are sent as given.
+With a typed registry (see app.data.edmx) filters on non-filterable fields and sorts on
+non-sortable ones are rejected, and literals are checked against the field types.
+"""
+import functools
+from dataclasses import dataclass
+from datetime import timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.data.registry import get_registry
+from app.models.schemas import ODataGetRequest
+from app.utils.lru import LRUTTLCache
+from app.utils.result_format import _to_datetime
+from app.utils.url_builder import build_count_url, build_get_url, build_key_url, format_literal
+
+class QueryValidationError(ValueError):
+    """The request names fields or sort clauses the registry does not know; maps to HTTP 400."""
+
+@dataclass(frozen=True)
+class PlanTemplate:
+    base_path: str
+    entity_path: str
+    key_fields: Tuple[str, ...]
+    select: Optional[Tuple[str, ...]]
+    orderby: Optional[str]
+    field_types: Optional[Dict[str, str]] = None
+    expand: Optional[Tuple[str, ...]] = None    # navigation properties inlined with $expand
+    expanded: Tuple[str, ...] = ()              # entity sets those navigations inline
+
+@dataclass(frozen=True)
+class QueryPlan:
+    template: PlanTemplate
+    filters: Tuple[Dict[str, Any], ...]     # collapsed, in first-seen field order
+    key: Optional[Dict[str, Any]] = None    # set when the read is a direct key lookup
+    empty: bool = False                     # predicates cannot match any row
+
+    @property
+    def fields(self) -> Optional[List[str]]:
+        return list(self.template.select) if self.template.select else None
+
+    def url(self, base_url: str, top: Optional[int], skip: Optional[int]) -> str:
+        t = self.template
+        if self.key is not None:
+            return build_key_url(base_url, t.base_path, t.entity_path, self.key, fields=self.fields,
+                                 field_types=t.field_types, expand=t.expand)
+        return build_get_url(base_url, t.base_path, t.entity_path, fields=self.fields, filters=list(self.filters),
+                             top=top, skip=skip, orderby=t.orderby, field_types=t.field_types, expand=t.expand)
+
+    def count_url(self, base_url: str) -> str:
+        t = self.template
+        return build_count_url(base_url, t.base_path, t.entity_path, filters=list(self.filters), field_types=t.field_types)
+
+_plans = LRUTTLCache(settings.QUERY_PLAN_CACHE_SIZE, float("inf"))
+
+def _filters(req: ODataGetRequest) -> List[Dict[str, Any]]:
+    return [f.model_dump() if hasattr(f, "model_dump") else dict(f) for f in (req.filters or [])]
+
+def _shape(req: ODataGetRequest, filters: List[Dict[str, Any]]) -> tuple:
+    return (
+        get_registry().version, req.service, req.entity,
+        tuple(req.fields) if req.fields else None,
+        tuple((f.get("field"), f.get("op", "eq")) for f in filters),
+        req.orderby,
+        tuple(req.expand) if req.expand else None,
+    )
+
+def _expand_paths(svc, entity, expand: Tuple[str, ...]) -> frozenset:
+    """`$select` entries allowed by `expand`: each navigation and `Nav/Field` for the target's fields."""
+    paths = set(expand)
+    for nav in expand:
+        target = svc.entities.get(entity.navigation[nav].get("entity", ""))
+        if target is not None:
+            paths.update(f"{nav}/{f}" for f in target.field_set | target.key_set)
+    return frozenset(paths)
+
+def _compile(req: ODataGetRequest, filters: List[Dict[str, Any]]) -> PlanTemplate:
+    svc, entity = get_registry().entity(req.service, req.entity)
+    expand = tuple(dict.fromkeys(req.expand or ()))
+    unknown_nav = [n for n in expand if n not in entity.navigation]
+    if unknown_nav:
+        raise QueryValidationError(f"Unknown navigation(s) for {req.service}/{req.entity}: {', '.join(unknown_nav)}")
+    known = entity.field_set | entity.key_set
+    if known:
+        selectable = known | _expand_paths(svc, entity, expand)
+        unknown = [f for f in (req.fields or []) if f not in selectable]
+        unknown += [f.get("field") for f in filters if f.get("field") not in known]
+        if unknown:
+            raise QueryValidationError(f"Unknown field(s) for {req.service}/{req.entity}: {', '.join(map(str, unknown))}")
+    blocked = [f.get("field") for f in filters if f.get("field") in entity.non_filterable]
+    if blocked:
+        raise QueryValidationError(f"Field(s) not filterable for {req.service}/{req.entity}: {', '.join(dict.fromkeys(blocked))}")
+    orderby = None
+    if req.orderby:
+        clauses = []
+        for clause in req.orderby.split(","):
+            name, _, direction = clause.strip().partition(" ")
+            direction = direction.strip().lower()
+            if (known and name not in known) or direction not in ("", "asc", "desc"):
+                raise QueryValidationError(f"Invalid orderby clause '{clause.strip()}' for {req.service}/{req.entity}")
+            if name in entity.non_sortable:
+                raise QueryValidationError(f"Field '{name}' is not sortable for {req.service}/{req.entity}")
+            clauses.append(f"{name} {direction}" if direction else name)
+        orderby = ",".join(clauses)
+    if req.fields:
+        select: Optional[Tuple[str, ...]] = tuple(dict.fromkeys(req.fields))
+    else:
+        select = tuple(entity.fields) or None
+    if select:
+        # an expanded navigation missing from $select would be dropped by the gateway
+        select += tuple(n for n in expand if not any(f == n or f.startswith(n + "/") for f in select))
+    expanded = tuple(dict.fromkeys(entity.navigation[n].get("entity", "") for n in expand))
+    return PlanTemplate(svc.base_path, entity.path, entity.key_fields, select, orderby,
+                        dict(entity.field_types) or None, expand or None, expanded)
+
+def _check_literals(template: PlanTemplate, filters: List[Dict[str, Any]]) -> None:
+    types = template.field_types or {}
+    for f in filters:
+        kind = types.get(f.get("field"))
+        if kind is None or f.get("op") == "like":
+            continue
+        values = f.get("value") if f.get("op") == "in" and isinstance(f.get("value"), list) else [f.get("value")]
+        try:
+            for v in values:
+                format_literal(v, kind)
+        except ValueError as e:
+            raise QueryValidationError(f"Invalid value for {f.get('field')} ({kind}): {e}")
+
+def _as_decimal(v: Any) -> Decimal:
+    if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+        raise ValueError(v)
+    try:
+        return Decimal(str(v).strip())
+    except InvalidOperation:
+        raise ValueError(v)
+
+def _as_integer(v: Any) -> Decimal:
+    d = _as_decimal(v)
+    if d != d.to_integral_value():
+        raise ValueError(v)
+    return d
+
+def _as_instant(v: Any):
+    dt = _to_datetime(v)
+    if dt is None:
+        raise ValueError(v)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def _as_text(v: Any) -> str:
+    if not isinstance(v, str):
+        raise ValueError(v)
+    return v
+
+# field type -> comparison key for collapsing; types not listed (and untyped fields) are not collapsed
+_COMPARE_AS = {
+    "int": _as_integer, "int64": _as_integer, "decimal": _as_decimal, "float": _as_decimal, "single": _as_decimal,
+    "date": _as_instant, "datetime": _as_instant, "datetimeoffset": _as_instant, "string": _as_text,
+}
+
+@functools.total_ordering
+class _Typed:
+    """A filter value compared by its typed key (`'9'` and `9.0` on a decimal field are equal)."""
+    __slots__ = ("raw", "key")
+
+    def __init__(self, raw: Any, key: Any):
+        self.raw, self.key = raw, key
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Typed) and self.key == other.key
+
+    def __lt__(self, other: "_Typed") -> bool:
+        return self.key < other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+def _comparable(a: Any, b: Any) -> bool:
+    return isinstance(a, _Typed) and isinstance(b, _Typed)
+
+def _satisfies(value: Any, op: str, bound: Any) -> Optional[bool]:
+    if not _comparable(value, bound):
+        return None
+    return {"gt": value > bound, "ge": value >= bound, "lt": value < bound, "le": value <= bound,
+            "eq": value == bound, "ne": value != bound}[op]
+
+def _dedupe(values: List[Any]) -> List[Any]:
+    out: List[Any] = []
+    for v in values:
+        if v not in out:
+            out.append(v)
+    return out
+
+def _collapse_field(field: str, preds: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """Simplify the ANDed predicates on one field; None means they cannot all hold."""
+    eqs: List[Any] = []
+    ins: Optional[List[Any]] = None                 # intersection of `in` lists
+    lower: Optional[Tuple[str, Any]] = None         # tightest gt/ge
+    upper: Optional[Tuple[str, Any]] = None         # tightest lt/le
+    others: List[Dict[str, Any]] = []
+    for p in preds:
+        op, value = p.get("op", "eq"), p.get("value")
+        if op == "eq":
+            eqs = _dedupe(eqs + [value])
+        elif op == "in" and isinstance(value, list):
+            ins = _dedupe(value) if ins is None else [v for v in ins if v in value]
+        elif op in ("gt", "ge") and (lower is None or _comparable(value, lower[1])):
+            if lower is None or value > lower[1] or (value == lower[1] and op == "gt"):
+                lower = (op, value)
+        elif op in ("lt", "le") and (upper is None or _comparable(value, upper[1])):
+            if upper is None or value < upper[1] or (value == upper[1] and op == "lt"):
+                upper = (op, value)
+        elif {"field": field, "op": op, "value": value} not in others:
+            others.append({"field": field, "op": op, "value": value})
+    if len(eqs) > 1:
+        return None
+    if ins is not None:
+        if eqs:
+            if eqs[0] not in ins and all(_comparable(eqs[0], v) for v in ins):
+                return None
+            if eqs[0] not in ins:
+                others.insert(0, {"field": field, "op": "in", "value": ins})
+        elif not ins:
+            return None
+        elif len(ins) == 1:
+            eqs = ins
+        else:
+            others.insert(0, {"field": field, "op": "in", "value": ins})
+    bounds = [b for b in (lower, upper) if b is not None]
+    if eqs:
+        kept = []
+        for op, bound in bounds + [(p["op"], p["value"]) for p in others if p["op"] == "ne"]:
+            ok = _satisfies(eqs[0], op, bound)
+            if ok is False:
+                return None
+            if ok is None:
+                kept.append({"field": field, "op": op, "value": bound})
+        others = kept + [p for p in others if p["op"] != "ne"]
+        bounds = []
+    elif lower and upper and _comparable(lower[1], upper[1]):
+        if lower[1] > upper[1] or (lower[1] == upper[1] and (lower[0] == "gt" or upper[0] == "lt")):
+            return None
+        if lower[1] == upper[1]:
+            eqs, bounds = [lower[1]], []
+    return ([{"field": field, "op": "eq", "value": v} for v in eqs]
+            + [{"field": field, "op": op, "value": v} for op, v in bounds] + others)
+
+def _wrap(p: Dict[str, Any], key: Callable[[Any], Any]) -> Dict[str, Any]:
+    value = p.get("value")
+    if p.get("op", "eq") == "like":
+        return p
+    if p.get("op") == "in" and isinstance(value, list):
+        return {**p, "value": [_Typed(v, key(v)) for v in value]}
+    return {**p, "value": _Typed(value, key(value))}
+
+def _unwrap(p: Dict[str, Any]) -> Dict[str, Any]:
+    value = p["value"]
+    if isinstance(value, list):
+        return {**p, "value": [v.raw if isinstance(v, _Typed) else v for v in value]}
+    return {**p, "value": value.raw if isinstance(value, _Typed) else value}
+
+def collapse_filters(filters: List[Dict[str, Any]], field_types: Optional[Dict[str, str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """Collapse predicates per field (they are ANDed); None if the conjunction is unsatisfiable.
+
+    Values are compared as the field's type; untyped fields, or values that do not convert,
+    only lose exact duplicates.
+    """
+    by_field: Dict[str, List[Dict[str, Any]]] = {}
+    for f in filters:
+        by_field.setdefault(f.get("field"), []).append(f)
+    out: List[Dict[str, Any]] = []
+    for field, preds in by_field.items():
+        if any(p.get("op") == "in" and p.get("value") == [] for p in preds):
+            return None     # `in ()` matches nothing, whatever the type
+        key = _COMPARE_AS.get((field_types or {}).get(field))
+        try:
+            typed = [_wrap(p, key) for p in preds] if key is not None else None
+        except ValueError:
+            typed = None
+        if typed is None:
+            out.extend(_dedupe([{"field": field, "op": p.get("op", "eq"), "value": p.get("value")} for p in preds]))
+            continue
+        collapsed = _collapse_field(field, typed)
+        if collapsed is None:
+            return None
+        out.extend(_unwrap(p) for p in collapsed)
+    return out
+
+def plan_query(req: ODataGetRequest, allow_key_lookup: bool = True) -> QueryPlan:
+    """Plan for `req`; raises QueryValidationError for unknown fields or sort clauses."""
+    filters = _filters(req)
+    key = _shape(req, filters)
+    template = _plans.get(key)
+    if template is None:
+        template = _compile(req, filters)
+        _plans.set(key, template)
+    _check_literals(template, filters)
+    collapsed = collapse_filters(filters, template.field_types)
+    if collapsed is None:
+        return QueryPlan(template, (), empty=True)
+    if allow_key_lookup and template.key_fields and not req.skip and not req.parallel:
+        pinned = {f["field"]: f["value"] for f in collapsed if f["op"] == "eq"}
+        if len(collapsed) == len(template.key_fields) and set(pinned) == set(template.key_fields):
+            return QueryPlan(template, tuple(collapsed), key={k: pinned[k] for k in template.key_fields})
+    return QueryPlan(template, tuple(collapsed))
+
+def plan_stats() -> Dict[str, Any]:
+    return _plans.stats()
+
+def clear_plans() -> None:
+    _plans.clear()
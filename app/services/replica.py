@@ -0,0 +1,373 @@
+"""Local replica of slowly changing entity sets (opt-in with REPLICA_ENABLED).
+
+Entities flagged in registry.json with `"replica": {"change_field": "CreatedOn"}` are mirrored
+into an SQLite file: one table per entity set with a column per field, holding the values typed
+per `field_types` (so comparisons and sorts behave like the gateway's; decimals are exact text
+under a collation that compares them as numbers), the gateway row as JSON for output, a unique
+index on the key fields and an index on the change field.
+
+Sync reads rows whose change field is at or after the last watermark (the highest value seen)
+and upserts them by key. Every REPLICA_FULL_SYNC_INTERVAL seconds, or when the entity's fields
+change, the set is reloaded into a new table that replaces the old one, which picks up deleted
+rows and updates that do not move the change field. Creates and updates sent through this app
+are applied to the replica right away.
+
+`read()` answers a GET when the entity was synced within its staleness bound (`max_staleness`
+in the flag, else REPLICA_MAX_STALENESS) and the query translates to SQL; otherwise it returns
+None and the caller asks the gateway. The bound only covers updates when the change field moves
+on every change (flag `"tracks_updates": true`, e.g. a ChangedOn field). With a creation date
+such as CreatedOn, updates made elsewhere arrive with the next full sync, so those sets are
+served only while their last full sync is within REPLICA_FULL_SYNC_INTERVAL: that interval, not
+the staleness bound, is how stale an updated row can be.
+"""
+import asyncio, hashlib, json, sqlite3, threading, time, uuid
+from decimal import Decimal, InvalidOperation
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import orjson
+from loguru import logger
+from app.core.config import settings
+from app.data.registry import EntityIndex, get_registry
+from app.models.schemas import ODataGetRequest, ODataPostRequest
+from app.services.query_planner import QueryPlan
+from app.utils.result_format import COERCERS
+
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / "data" / "replica.sqlite3"
+
+_SQL_OPS = {"eq": "=", "ne": "IS NOT", "gt": ">", "ge": ">=", "lt": "<", "le": "<="}
+
+@dataclass
+class _State:
+    signature: str                  # fields/keys/types the table was built for
+    watermark: Any = None           # highest change-field value synced
+    synced_at: float = 0.0          # wall clock at the start of the last completed sync (0 = stale)
+    full_sync_at: float = 0.0
+    rows: int = 0
+
+@dataclass
+class _Sync:
+    """Writes applied while a sync of the same set runs; replayed once it commits."""
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    stale: bool = False
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _table(service: str, entity: str) -> str:
+    return f"{service}.{entity}"
+
+def _columns(ent: EntityIndex) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys([*ent.key_fields, *ent.fields]))
+
+def _decimal_key(value: str) -> Tuple[int, Decimal, str]:
+    """Numeric order for decimal text; anything that is not a finite number sorts after, as text."""
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return 1, Decimal(0), value
+    return (0, number, "") if number.is_finite() else (1, Decimal(0), value)
+
+def _decimal_collation(a: str, b: str) -> int:
+    x, y = _decimal_key(a), _decimal_key(b)
+    return (x > y) - (x < y)
+
+def _column_def(ent: EntityIndex, name: str) -> str:
+    return f"{_q(name)} TEXT COLLATE decimal" if ent.field_types.get(name) == "decimal" else _q(name)
+
+def _signature(ent: EntityIndex) -> str:
+    spec = [_columns(ent), ent.key_fields, sorted(ent.field_types.items()), ent.replica.get("change_field"),
+            "decimal-text"]    # column layout: tables built before decimals were exact are rebuilt
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+def _column(kind: Optional[str], value: Any) -> Any:
+    """Stored (and compared) form of a value: typed per the field type, other values as text."""
+    if value is None:
+        return None
+    coerce = COERCERS.get(kind or "")
+    if coerce is None:
+        return value if isinstance(value, str) else orjson.dumps(value).decode()
+    value = coerce(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value if isinstance(value, (int, float, str)) else orjson.dumps(value).decode()
+
+def _where(f: Dict[str, Any], field_types: Dict[str, str]) -> Optional[Tuple[str, List[Any]]]:
+    """SQL condition and parameters for one collapsed filter; None if it has no translation."""
+    name, op, value = f.get("field"), f.get("op", "eq"), f.get("value")
+    col, kind = _q(name), field_types.get(name)
+    if op in ("eq", "ne") and value is None:
+        return f"{col} IS {'NOT ' if op == 'ne' else ''}NULL", []
+    if op in _SQL_OPS:
+        return f"{col} {_SQL_OPS[op]} ?", [_column(kind, value)]
+    if op == "in" and isinstance(value, list) and value:
+        return f"{col} IN ({','.join('?' * len(value))})", [_column(kind, v) for v in value]
+    if op == "like" and isinstance(value, str):
+        # substringof is case-sensitive on the gateway; LIKE would ignore ASCII case
+        return f"instr({col}, ?) > 0", [value]
+    return None
+
+def _order_by(orderby: Optional[str], key_fields: Tuple[str, ...]) -> str:
+    clauses, seen = [], set()
+    for clause in (orderby or "").split(","):
+        name, _, direction = clause.strip().partition(" ")
+        if name:
+            seen.add(name)
+            clauses.append(f"{_q(name)} DESC" if direction.strip().lower() == "desc" else _q(name))
+    clauses += [_q(k) for k in key_fields if k not in seen]    # stable $skip windows, as on the gateway
+    return f" ORDER BY {', '.join(clauses)}" if clauses else ""
+
+class ReplicaStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or settings.REPLICA_PATH or DEFAULT_PATH)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()       # the write connection is used from worker threads
+        self._writer = self._connect()
+        self._reader = self._connect()      # event loop only; WAL keeps it off the writer's lock
+        self._writer.execute("CREATE TABLE IF NOT EXISTS _replica_meta (name TEXT PRIMARY KEY, signature TEXT,"
+                             " watermark TEXT, synced_at REAL, full_sync_at REAL, rows INTEGER)")
+        self._writer.commit()
+        self._state: Dict[str, _State] = {
+            name: _State(sig, json.loads(mark) if mark is not None else None, synced, full, rows)
+            for name, sig, mark, synced, full, rows in self._writer.execute("SELECT * FROM _replica_meta")
+        }
+        self._syncs: Dict[str, _Sync] = {}
+        self._signatures: Dict[str, Tuple[EntityIndex, str]] = {}    # per set, for its current definition
+        self._sync_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.stale = 0
+        self.unsupported = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.create_collation("decimal", _decimal_collation)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self) -> None:
+        self._reader.close()
+        with self._lock:
+            self._writer.close()
+
+    # ---------------- reads ----------------
+    def read(self, req: ODataGetRequest, plan: QueryPlan) -> Optional[bytes]:
+        """The GET body answered from the replica, or None when the gateway has to answer."""
+        name = _table(req.service, req.entity)
+        state = self._state.get(name)
+        if state is None:
+            return None
+        _, ent = get_registry().entity(req.service, req.entity)
+        if ent.replica is None or plan.template.expand or state.signature != self._signature(name, ent):
+            self.unsupported += 1
+            return None
+        if not self._fresh(ent, state, time.time()):
+            self.stale += 1
+            return None
+        conditions, params = [], []
+        for f in plan.filters:
+            clause = _where(f, ent.field_types)
+            if clause is None:
+                self.unsupported += 1
+                return None
+            conditions.append(clause[0])
+            params += clause[1]
+        sql = f"SELECT _row FROM {_q(name)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += _order_by(plan.template.orderby, ent.key_fields) + " LIMIT ? OFFSET ?"
+        skip = 0 if plan.key is not None else (req.skip or 0)
+        rows = self._reader.execute(sql, [*params, req.top or -1, skip]).fetchall()
+        self.hits += 1
+        select = plan.fields
+        if not select or set(select) >= set(_columns(ent)):
+            # every column selected: splice the stored JSON rows as they are
+            return b'{"d":{"results":[' + b",".join(r[0] for r in rows) + b"]}}"
+        out = []
+        for (raw,) in rows:
+            row = orjson.loads(raw)
+            projected = {"__metadata": row["__metadata"]} if "__metadata" in row else {}
+            projected.update((f, row.get(f)) for f in select)
+            out.append(projected)
+        return orjson.dumps({"d": {"results": out}})
+
+    def _signature(self, name: str, ent: EntityIndex) -> str:
+        """`_signature(ent)`, hashed once per definition (a registry reload builds new EntityIndex objects)."""
+        cached = self._signatures.get(name)
+        if cached is None or cached[0] is not ent:
+            cached = self._signatures[name] = (ent, _signature(ent))
+        return cached[1]
+
+    @staticmethod
+    def _fresh(ent: EntityIndex, state: _State, now: float) -> bool:
+        max_age = ent.replica.get("max_staleness") or settings.REPLICA_MAX_STALENESS
+        if now - state.synced_at > max_age:
+            return False
+        if ent.replica.get("tracks_updates"):
+            return True
+        # the change field does not move on updates: those are only picked up by a full sync
+        return now - state.full_sync_at <= settings.REPLICA_FULL_SYNC_INTERVAL
+
+    def _row_by_key(self, name: str, ent: EntityIndex, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        sql = f"SELECT _row FROM {_q(name)} WHERE " + " AND ".join(f"{_q(k)} = ?" for k in ent.key_fields)
+        found = self._reader.execute(sql, [_column(ent.field_types.get(k), key.get(k)) for k in ent.key_fields]).fetchone()
+        return orjson.loads(found[0]) if found else None
+
+    # ---------------- writes ----------------
+    def _create(self, table: str, ent: EntityIndex) -> None:
+        columns = ", ".join(_column_def(ent, c) for c in _columns(ent))
+        tag = uuid.uuid4().hex[:8]     # index names are schema-wide and survive the table rename
+        with self._lock, self._writer:
+            self._writer.execute(f"DROP TABLE IF EXISTS {_q(table)}")
+            self._writer.execute(f"CREATE TABLE {_q(table)} ({columns}, _row BLOB NOT NULL)")
+            self._writer.execute(f"CREATE UNIQUE INDEX {_q(f'{table}#key#{tag}')} ON {_q(table)} "
+                                 f"({', '.join(_q(k) for k in ent.key_fields)})")
+            self._writer.execute(f"CREATE INDEX {_q(f'{table}#change#{tag}')} ON {_q(table)} "
+                                 f"({_q(ent.replica['change_field'])})")
+
+    def _upsert(self, table: str, ent: EntityIndex, rows: List[Dict[str, Any]]) -> None:
+        columns = _columns(ent)
+        sql = (f"INSERT OR REPLACE INTO {_q(table)} ({', '.join(_q(c) for c in columns)}, _row) "
+               f"VALUES ({', '.join('?' * (len(columns) + 1))})")
+        values = [[*(_column(ent.field_types.get(c), r.get(c)) for c in columns), orjson.dumps(r)] for r in rows]
+        with self._lock, self._writer:
+            self._writer.executemany(sql, values)
+
+    def _commit(self, name: str, table: str, state: _State) -> int:
+        """Swap in a fully synced table (when `table` is not `name`) and record the sync; returns the row count."""
+        with self._lock, self._writer:
+            if table != name:
+                self._writer.execute(f"DROP TABLE IF EXISTS {_q(name)}")
+                self._writer.execute(f"ALTER TABLE {_q(table)} RENAME TO {_q(name)}")
+            rows = self._writer.execute(f"SELECT COUNT(*) FROM {_q(name)}").fetchone()[0]
+            self._writer.execute("INSERT OR REPLACE INTO _replica_meta VALUES (?, ?, ?, ?, ?, ?)",
+                                 (name, state.signature, json.dumps(state.watermark), state.synced_at, state.full_sync_at, rows))
+        return rows
+
+    async def apply_write(self, req: ODataPostRequest, data: Any) -> None:
+        """Mirror a successful create/update; when the row cannot be rebuilt, reads go to the gateway until the next sync."""
+        name = _table(req.service, req.entity)
+        if name not in self._state and name not in self._syncs:
+            return
+        _, ent = get_registry().entity(req.service, req.entity)
+        row: Optional[Dict[str, Any]] = None
+        if req.action == "update" and req.key_fields:
+            current = self._row_by_key(name, ent, req.key_fields) if name in self._state else None
+            if current is not None:
+                row = {**current, **req.payload}
+        elif isinstance(data, dict) and isinstance(data.get("d"), dict):
+            row = data["d"]
+        if row is None or any(row.get(k) is None for k in ent.key_fields):
+            self.invalidate(req.service, req.entity)
+            return
+        if name in self._syncs:
+            self._syncs[name].rows.append(row)
+        if name in self._state:
+            # off the loop: the writer lock may be held by another set's sync committing a page
+            await asyncio.to_thread(self._upsert, name, ent, [row])
+
+    def invalidate(self, service: str, entity: str) -> None:
+        """Serve the set from the gateway until it is synced again."""
+        name = _table(service, entity)
+        if name in self._state:
+            self._state[name].synced_at = 0.0
+        if name in self._syncs:
+            self._syncs[name].stale = True
+
+    # ---------------- sync ----------------
+    async def sync(self, service: Any, full: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Sync every entity set flagged `replica` through `service` (an ODataService)."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for sname, svc in get_registry().services.items():
+            for ename, ent in svc.entities.items():
+                if ent.replica is None:
+                    continue
+                try:
+                    out[_table(sname, ename)] = await self.sync_entity(service, sname, ename, full)
+                except Exception as e:
+                    logger.warning("Replica sync of {}/{} failed: {}", sname, ename, e)
+                    out[_table(sname, ename)] = {"error": str(e)}
+        return out
+
+    async def sync_entity(self, service: Any, sname: str, ename: str, full: bool = False) -> Dict[str, Any]:
+        name = _table(sname, ename)
+        lock = self._sync_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            _, ent = get_registry().entity(sname, ename)
+            change = (ent.replica or {}).get("change_field")
+            if not ent.key_fields or change not in ent.field_set | ent.key_set:
+                raise ValueError("a replica needs key fields and a change_field among the entity's fields")
+            started = time.time()
+            signature = self._signature(name, ent)
+            state = self._state.get(name)
+            full = (full or state is None or state.signature != signature or state.watermark is None
+                    or started - state.full_sync_at >= settings.REPLICA_FULL_SYNC_INTERVAL)
+            watermark = None if full else state.watermark
+            table = f"{name}#new" if full else name
+            req = ODataGetRequest(
+                service=sname, entity=ename, fields=list(_columns(ent)), top=settings.REPLICA_PAGE_SIZE,
+                filters=None if full else [{"field": change, "op": "ge", "value": watermark}],
+                orderby=",".join(dict.fromkeys([change, *ent.key_fields])),
+            )
+            kind = ent.field_types.get(change)
+            fetched = 0
+            pending = self._syncs[name] = _Sync()
+            try:
+                if full:
+                    await asyncio.to_thread(self._create, table, ent)
+                async for rows in service.iter_pages(req):
+                    fetched += len(rows)
+                    marks = [_column(kind, r.get(change)) for r in rows if r.get(change) is not None]
+                    if marks:
+                        latest = _decimal_key if kind == "decimal" else None
+                        watermark = max(marks, key=latest) if watermark is None else max(watermark, *marks, key=latest)
+                    await asyncio.to_thread(self._upsert, table, ent, rows)
+                new = _State(signature, watermark, started, started if full else state.full_sync_at)
+                new.rows = await asyncio.to_thread(self._commit, name, table, new)
+            finally:
+                self._syncs.pop(name, None)
+            if pending.rows:
+                # writes that raced with pages read before them
+                await asyncio.to_thread(self._upsert, name, ent, pending.rows)
+            if pending.stale:
+                new.synced_at = 0.0
+            self._state[name] = new
+        mode = "full" if full else "incremental"
+        logger.info("Replica {} sync of {}: {} rows fetched, {} held, watermark {}", mode, name, fetched, new.rows, watermark)
+        return {"mode": mode, "fetched": fetched, "rows": new.rows, "watermark": watermark}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "enabled": True, "path": self.path,
+            "hits": self.hits, "stale": self.stale, "unsupported": self.unsupported,
+            "entities": {
+                name: {"rows": s.rows, "watermark": s.watermark, "synced_at": s.synced_at or None,
+                       "age": round(now - s.synced_at, 3) if s.synced_at else None}
+                for name, s in self._state.items()
+            },
+        }
+
+async def sync_forever(store: ReplicaStore, make_service: Callable[[], Any]) -> None:
+    """Background task: sync the replicated sets every REPLICA_SYNC_INTERVAL seconds."""
+    while True:
+        try:
+            await store.sync(make_service())
+        except Exception as e:
+            logger.warning("Replica sync failed: {}", e)
+        await asyncio.sleep(settings.REPLICA_SYNC_INTERVAL)
+
+_replica: Optional[ReplicaStore] = None
+
+def get_replica() -> Optional[ReplicaStore]:
+    """The process-wide replica, or None when REPLICA_ENABLED is off."""
+    global _replica
+    if not settings.REPLICA_ENABLED:
+        return None
+    if _replica is None:
+        _replica = ReplicaStore()
+    return _replica
+
+def set_replica(store: Optional[ReplicaStore]) -> None:
+    global _replica
+    _replica = store
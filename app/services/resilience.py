@@ -0,0 +1,164 @@
+"""Retry policy, retry budget and per-service circuit breakers for SAP calls."""
+import email.utils, time
+from typing import Any, Dict, Optional
+import httpx
+from tenacity import RetryCallState, wait_random_exponential
+from loguru import logger
+from app.core.config import settings
+from app.core.errors import BackendUnavailable
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Statuses worth retrying for reads; writes only retry when the gateway says it did not process them
+RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+WRITE_RETRYABLE_STATUS = frozenset({429, 503})
+# Transport errors raised before the request reached the server: safe to retry for any method
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class CircuitOpenError(BackendUnavailable):
+    pass
+
+class RetryableResponse(Exception):
+    """Raised inside the retry loop for a response whose status may be retried."""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+def is_retryable(method: str, exc: BaseException) -> bool:
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    if isinstance(exc, RetryableResponse):
+        status = exc.response.status_code
+        return status in (RETRYABLE_STATUS if idempotent else WRITE_RETRYABLE_STATUS)
+    if isinstance(exc, NOT_SENT_ERRORS):
+        return True
+    return idempotent and isinstance(exc, httpx.TransportError)
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_wait(state: RetryCallState) -> float:
+    """Honor Retry-After (capped at SAP_RETRY_MAX_DELAY), else exponential backoff with full jitter."""
+    exc = state.outcome.exception() if state.outcome else None
+    if isinstance(exc, RetryableResponse):
+        after = retry_after_seconds(exc.response)
+        if after is not None:
+            return min(after, settings.SAP_RETRY_MAX_DELAY)
+    return wait_random_exponential(multiplier=settings.SAP_RETRY_BASE_DELAY, max=settings.SAP_RETRY_MAX_DELAY)(state)
+
+class RetryBudget:
+    """Caps retry amplification: each request earns `ratio` retry tokens, each retry spends one.
+
+    A floor of `min_per_second` tokens keeps a trickle of retries possible at low traffic.
+    """
+
+    def __init__(self, ratio: Optional[float] = None, min_per_second: Optional[float] = None, cap: Optional[float] = None):
+        self.ratio = settings.SAP_RETRY_BUDGET_RATIO if ratio is None else ratio
+        self.min_per_second = settings.SAP_RETRY_BUDGET_MIN_PER_SEC if min_per_second is None else min_per_second
+        self.cap = max(1.0, settings.SAP_RETRY_BUDGET_CAP if cap is None else cap)
+        self.tokens = self.cap
+        self._last = time.monotonic()
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self._last) * self.min_per_second)
+        self._last = now
+
+    def record_request(self) -> None:
+        self._refill()
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {"tokens": round(self.tokens, 2), "cap": self.cap, "spent": self.spent, "denied": self.denied}
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; open -> half_open after
+    `reset_timeout` seconds, where one trial call decides between closed and open again."""
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = settings.SAP_BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.reset_timeout = settings.SAP_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_inflight = False
+        self.rejected = 0
+
+    def before_call(self) -> None:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit open for '{self.name}'")
+            self.state = "half_open"
+            self._trial_inflight = False
+        if self.state == "half_open":
+            if self._trial_inflight:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit half-open for '{self.name}', trial in progress")
+            self._trial_inflight = True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("Circuit '{}' closed", self.name)
+        self.state = "closed"
+        self.failures = 0
+        self._trial_inflight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_inflight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Circuit '{}' opened after {} failures", self.name, self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The call was abandoned (e.g. cancelled) without an outcome."""
+        self._trial_inflight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+retry_budget = RetryBudget()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+def reset() -> None:
+    """Forget breaker state and refill the budget (tests, admin)."""
+    global retry_budget
+    _breakers.clear()
+    retry_budget = RetryBudget()
+
+def resilience_stats() -> Dict[str, Any]:
+    return {
+        "retry_budget": retry_budget.stats(),
+        "breakers": {name: b.stats() for name, b in _breakers.items()},
+    }
@@ -0,0 +1,140 @@
+import asyncio, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Set, Tuple
+import httpx
+from loguru import logger
+from app.core.config import settings
+
+Tag = Tuple[str, str]   # (service, entity)
+
+class _Entry:
+    __slots__ = ("content", "etag", "fresh_until", "tags")
+
+    def __init__(self, content: bytes, etag: Optional[str], fresh_until: float, tags: Tuple[Tag, ...]):
+        self.content = content
+        self.etag = etag
+        self.fresh_until = fresh_until
+        self.tags = tags
+
+class ResponseCache:
+    """GET response bodies keyed by canonical URL.
+
+    - fresh for the entity's TTL; afterwards entries with an ETag are revalidated with
+      `If-None-Match` (a 304 renews them without transferring the body)
+    - LRU eviction once the cached bodies exceed ``max_bytes``
+    - concurrent identical misses share one upstream request (single flight)
+    - `invalidate(service, entity)` drops every entry tagged with the entity after a write;
+      a response is tagged with each entity it contains (the entity read and any it expands)
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = settings.SAP_GET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_tag: Dict[Tag, Set[str]] = {}
+        self._generation: Dict[Tag, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _drop(self, url: str) -> None:
+        e = self._entries.pop(url, None)
+        if e is not None:
+            self.bytes -= len(e.content)
+            for tag in e.tags:
+                urls = self._by_tag.get(tag)
+                if urls is not None:
+                    urls.discard(url)
+
+    def _store(self, url: str, entry: _Entry) -> None:
+        self._drop(url)
+        if len(entry.content) > self.max_bytes:
+            return
+        self._entries[url] = entry
+        for tag in entry.tags:
+            self._by_tag.setdefault(tag, set()).add(url)
+        self.bytes += len(entry.content)
+        while self.bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def fetch(self, url: str, tags: Sequence[Tag], ttl: float,
+                    send: Callable[[Optional[str]], Awaitable[httpx.Response]]) -> Tuple[int, bytes]:
+        """Return (status, body) for `url`; `send(etag)` performs the upstream GET (conditional when etag is set).
+
+        Only 200s are cached, so hits and revalidations report 200; callers sharing an
+        in-flight request get that request's own status.
+        """
+        entry = self._entries.get(url)
+        if entry is not None:
+            if entry.fresh_until > time.monotonic():
+                self._entries.move_to_end(url)
+                self.hits += 1
+                return 200, entry.content
+            if not entry.etag:
+                self._drop(url)
+                entry = None
+        fut = self._inflight.get(url)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(self._load(url, tuple(tags), ttl, send, entry))
+        self._inflight[url] = fut
+        fut.add_done_callback(lambda f: self._settled(url, f))
+        # shielded for the leader too: its cancellation must not cancel the load the others wait on
+        return await asyncio.shield(fut)
+
+    def _settled(self, url: str, fut: asyncio.Future) -> None:
+        if self._inflight.get(url) is fut:
+            del self._inflight[url]
+        if not fut.cancelled():
+            fut.exception()     # retrieved here in case every waiter was cancelled
+
+    async def _load(self, url: str, tags: Tuple[Tag, ...], ttl: float, send, stale: Optional[_Entry]) -> Tuple[int, bytes]:
+        generations = [self._generation.get(tag, 0) for tag in tags]
+        r = await send(stale.etag if stale is not None else None)
+        # a write to any of the entities while we were waiting makes this response unsafe to keep
+        current = [self._generation.get(tag, 0) for tag in tags] == generations
+        if r.status_code == 304 and stale is not None:
+            self.revalidated += 1
+            if current:
+                stale.fresh_until = time.monotonic() + ttl
+                self._store(url, stale)
+            return 200, stale.content
+        self.misses += 1
+        content = r.content
+        if r.status_code == 200 and ttl > 0 and current:
+            self._store(url, _Entry(content, r.headers.get("etag"), time.monotonic() + ttl, tags))
+        return r.status_code, content
+
+    def invalidate(self, service: str, entity: str) -> None:
+        tag = (service, entity)
+        self._generation[tag] = self._generation.get(tag, 0) + 1
+        urls = self._by_tag.pop(tag, set())
+        for url in list(urls):
+            self._drop(url)
+        if urls:
+            logger.info("GET cache: invalidated {} entries for {}/{}", len(urls), service, entity)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_tag.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
+
+response_cache = ResponseCache()
@@ -0,0 +1,121 @@
+import csv, io, json, re
+import orjson
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+def _clean(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if k != "__metadata"}
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(_clean(row), ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+def clean_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [_clean(row) for row in rows]
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, default=str) + b"\n\n"
+
+class CsvWriter:
+    """Incremental CSV encoder: the header comes from `fields` or the first row's keys."""
+
+    def __init__(self, fields: Optional[List[str]] = None):
+        self.fields = fields
+        self._header_sent = False
+
+    def _line(self, values: List[Any]) -> str:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(values)
+        return buf.getvalue()
+
+    def lines(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        for row in rows:
+            row = _clean(row)
+            if self.fields is None:
+                self.fields = list(row.keys())
+            if not self._header_sent:
+                self._header_sent = True
+                yield self._line(self.fields)
+            yield self._line([
+                json.dumps(v, default=str) if isinstance(v, (dict, list)) else ("" if v is None else v)
+                for v in (row.get(f) for f in self.fields)
+            ])
+
+# ---------------- compact (columnar / row-array) results ----------------
+_V2_DATE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+
+def _to_datetime(v: Any) -> Optional[datetime]:
+    if isinstance(v, str):
+        m = _V2_DATE.match(v)
+        if m:
+            return datetime.fromtimestamp(int(m.group(1)) / 1000, tz=timezone.utc)
+        try:
+            return datetime.fromisoformat(v.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return None
+
+def _as_date(v: Any) -> Any:
+    dt = _to_datetime(v)
+    return dt.date().isoformat() if dt else v
+
+def _as_datetime(v: Any) -> Any:
+    dt = _to_datetime(v)
+    if dt is None:
+        return v
+    return dt.isoformat().replace("+00:00", "Z")
+
+def _as_number(cast: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    def convert(v: Any) -> Any:
+        if isinstance(v, str) and v.strip():
+            try:
+                return cast(v)
+            except ValueError:
+                return v
+        return v
+    return convert
+
+def _as_decimal(v: Any) -> Any:
+    # a float would round currency amounts; numbers become their exact decimal text
+    if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool):
+        return str(Decimal(str(v)))
+    return v
+
+# OData v2 sends Edm.Decimal/Int64 as strings and dates as "/Date(ms)/"; typed output uses JSON numbers
+# (decimals stay exact strings) and ISO dates
+COERCERS: Dict[str, Callable[[Any], Any]] = {
+    "int": _as_number(int),
+    "int64": _as_number(int),
+    "decimal": _as_decimal,
+    "float": _as_number(float),
+    "single": _as_number(float),
+    "bool": lambda v: v in (True, "true", "X") if isinstance(v, (bool, str)) else v,
+    "date": _as_date,
+    "datetime": _as_datetime,
+    "datetimeoffset": _as_datetime,
+}
+
+def _plain_fields(row: Dict[str, Any]) -> List[str]:
+    # drop __metadata and deferred navigation properties
+    return [k for k, v in row.items() if k != "__metadata" and not (isinstance(v, dict) and "__deferred" in v)]
+
+def compact_rows(rows: List[Dict[str, Any]], fields: Optional[List[str]], field_types: Mapping[str, str], layout: str) -> Dict[str, Any]:
+    """Rows as `{fields, columns, count}` (layout "columnar") or `{fields, rows, count}` ("rows").
+
+    `fields` defaults to the first row's plain properties. Values of fields listed in
+    `field_types` are converted (see COERCERS); anything that does not convert is kept as is.
+    """
+    if fields is None:
+        fields = _plain_fields(rows[0]) if rows else []
+    converters = [COERCERS.get(field_types.get(f, "")) for f in fields]
+    if layout == "columnar":
+        columns = []
+        for f, conv in zip(fields, converters):
+            col = [r.get(f) for r in rows]
+            columns.append([conv(v) for v in col] if conv else col)
+        return {"fields": fields, "columns": columns, "count": len(rows)}
+    return {"fields": fields, "rows": [
+        [conv(r.get(f)) if conv else r.get(f) for f, conv in zip(fields, converters)] for r in rows
+    ], "count": len(rows)}
@@ -1,7 +1,90 @@
-from typing import List, Dict, Any, Optional
+import re, uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import List, Dict, Any, Mapping, Optional
 from urllib.parse import urlencode, quote
 
-def build_filter(filters: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+_V2_DATE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+_CLOCK = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+def _quoted(value: Any) -> str:
+    return "'%s'" % str(value).replace("'", "''")
+
+def _iso_datetime(value: Any, offset: bool = False) -> str:
+    if isinstance(value, str):
+        m = _V2_DATE.match(value)
+        if m:
+            value = datetime.fromtimestamp(int(m.group(1)) / 1000, tz=timezone.utc)
+        else:
+            try:
+                value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                raise ValueError(f"not a date/time: {value!r}")
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if not isinstance(value, datetime):
+        raise ValueError(f"not a date/time: {value!r}")
+    if offset:
+        value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%dT%H:%M:%S")
+
+def _duration(value: Any) -> str:
+    text = str(value)
+    if text.startswith("PT"):
+        return text
+    m = _CLOCK.match(text)
+    if not m:
+        raise ValueError(f"not a time of day: {value!r}")
+    return f"PT{int(m.group(1))}H{m.group(2)}M{m.group(3) or '00'}S"
+
+def _decimal(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"not a number: {value!r}")
+
+def format_literal(value: Any, kind: Optional[str] = None) -> str:
+    """OData v2 literal for `value`. `kind` is a registry field type (see app.data.edmx.EDM_TYPES);
+    without one, strings are quoted and everything else is written as is. Raises ValueError when
+    the value does not fit the type."""
+    if kind is None:
+        return _quoted(value) if isinstance(value, str) else str(value)
+    if kind == "string":
+        return _quoted(value)
+    if kind == "bool":
+        if isinstance(value, str) and value.lower() in ("true", "false", "x", ""):
+            return "true" if value.lower() in ("true", "x") else "false"
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        raise ValueError(f"not a boolean: {value!r}")
+    if kind in ("int", "int64"):
+        number = _decimal(value)
+        if number != number.to_integral_value():
+            raise ValueError(f"not an integer: {value!r}")
+        return f"{int(number)}" + ("L" if kind == "int64" else "")
+    if kind == "decimal":
+        return f"{_decimal(value)}M"
+    if kind in ("float", "single"):
+        return f"{float(_decimal(value))}" + ("d" if kind == "float" else "f")
+    if kind in ("date", "datetime"):
+        return f"datetime'{_iso_datetime(value)}'"
+    if kind == "datetimeoffset":
+        return f"datetimeoffset'{_iso_datetime(value, offset=True)}'"
+    if kind == "time":
+        return f"time'{_duration(value)}'"
+    if kind == "guid":
+        try:
+            return f"guid'{uuid.UUID(str(value))}'"
+        except ValueError:
+            raise ValueError(f"not a GUID: {value!r}")
+    if kind == "binary":
+        return f"binary'{value}'"
+    return _quoted(value) if isinstance(value, str) else str(value)
+
+def build_filter(filters: Optional[List[Dict[str, Any]]], field_types: Optional[Mapping[str, str]] = None) -> Optional[str]:
     if not filters:
         return None
     frags = []
@@ -14,23 +97,29 @@ def build_filter(filters: Optional[List[Dict[str, Any]]]) -> Optional[str]:
         field = f.get("field")
         op = op_map.get(f.get("op","eq"), "eq")
         value = f.get("value")
-        if op == "like":
+        if op == "substringof":
             # substringof('value', field)
-            frags.append(f"substringof('{value}', {field})")
+            frags.append(f"substringof({_quoted(str(value))}, {field})")
         elif op == "in" and isinstance(value, list):
-            list_vals = ",".join([f"'{v}'" if isinstance(v,str) else str(v) for v in value])
-            frags.append(f"{field} in ({list_vals})")
+            # OData v2 has no `in`: (field eq a or field eq b ...)
+            if not value:
+                raise ValueError(f"empty value list for {field} in")
+            kind = (field_types or {}).get(field)
+            terms = [f"{field} eq {format_literal(v, kind)}" for v in value]
+            frags.append(terms[0] if len(terms) == 1 else f"({' or '.join(terms)})")
         else:
-            v = f"'{value}'" if isinstance(value, str) else str(value)
+            v = format_literal(value, (field_types or {}).get(field))
             frags.append(f"{field} {op} {v}")
     return " and ".join(frags)
 
-def build_get_url(base_url: str, base_path: str, entity: str, fields=None, filters=None, top=100, skip=0, orderby=None) -> str:
+def build_get_url(base_url: str, base_path: str, entity: str, fields=None, filters=None, top=100, skip=0, orderby=None, inlinecount=None, field_types=None, expand=None) -> str:
     entity_path = f"{base_path.rstrip('/')}/{entity}"
     params = {}
     if fields:
         params['$select'] = ",".join(fields)
-    fil = build_filter(filters)
+    if expand:
+        params['$expand'] = ",".join(expand)
+    fil = build_filter(filters, field_types)
     if fil:
         params['$filter'] = fil
     if orderby:
@@ -39,11 +128,44 @@ def build_get_url(base_url: str, base_path: str, entity: str, fields=None, filte
         params['$top'] = str(top)
     if skip:
         params['$skip'] = str(skip)
+    if inlinecount:
+        # OData v2: "allpages" adds d.__count with the total matching rows
+        params['$inlinecount'] = inlinecount
     qs = urlencode(params, quote_via=quote, doseq=True)
     return f"{base_url.rstrip('/')}/{entity_path}?{qs}" if qs else f"{base_url.rstrip('/')}/{entity_path}"
 
-def build_entity_key_segment(key_fields: Dict[str, Any]) -> str:
+def build_count_url(base_url: str, base_path: str, entity: str, filters=None, field_types=None) -> str:
+    """URL of the `$count` segment: the gateway answers with the number of matching rows as plain text."""
+    entity_path = f"{base_path.rstrip('/')}/{entity}/$count"
+    params = {}
+    fil = build_filter(filters, field_types)
+    if fil:
+        params['$filter'] = fil
+    qs = urlencode(params, quote_via=quote, doseq=True)
+    return f"{base_url.rstrip('/')}/{entity_path}?{qs}" if qs else f"{base_url.rstrip('/')}/{entity_path}"
+
+def build_entity_key_segment(key_fields: Dict[str, Any], field_types: Optional[Mapping[str, str]] = None) -> str:
     parts = []
     for k,v in key_fields.items():
-        parts.append(f"{k}='{v}'" if isinstance(v,str) else f"{k}={v}")
+        if field_types and k in field_types:
+            parts.append(f"{k}={format_literal(v, field_types[k])}")
+        else:
+            parts.append(f"{k}='{v}'" if isinstance(v,str) else f"{k}={v}")
     return f"({','.join(parts)})" if parts else ""
+
+def build_key_url(base_url: str, base_path: str, entity: str, key_fields: Dict[str, Any], fields=None, field_types=None, expand=None) -> str:
+    """URL addressing one entity by key, e.g. `POHeaderSet('4500001234')?$select=...`."""
+    if len(key_fields) == 1:
+        (name, value), = key_fields.items()
+        key_seg = f"({format_literal(value, (field_types or {}).get(name))})"
+    else:
+        key_seg = build_entity_key_segment(key_fields, field_types)
+    key_seg = quote(key_seg, safe="()=,'")
+    entity_path = f"{base_path.rstrip('/')}/{entity}{key_seg}"
+    params = {}
+    if fields:
+        params['$select'] = ",".join(fields)
+    if expand:
+        params['$expand'] = ",".join(expand)
+    qs = urlencode(params, quote_via=quote)
+    return f"{base_url.rstrip('/')}/{entity_path}?{qs}" if qs else f"{base_url.rstrip('/')}/{entity_path}"
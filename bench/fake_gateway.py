@@ -0,0 +1,414 @@
+"""In-process stand-in for an SAP OData v2 gateway, driven by `registry.json`.
+
+Serves every entity set of the registry with synthetic rows and supports what the app
+uses: `$select`, `$filter` (comparisons joined with `and`, `substringof`, parenthesized `or`
+groups of comparisons; like a v2 gateway it rejects `in`),
+`$orderby`, `$top`/`$skip`, `$inlinecount=allpages`, the `$count` segment, server-driven
+paging (`__next` with `$skiptoken`), key lookups, POST/PATCH/MERGE with a CSRF handshake,
+ETags with `If-None-Match`, and multipart `$batch`. Latency and errors can be injected.
+
+    gw = FakeGateway(GatewayConfig(latency=0.02, error_rate=0.01))
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app))
+
+or standalone (needs uvicorn): ``python -m bench.fake_gateway --port 8900``
+"""
+import argparse, asyncio, hashlib, json, random, re, uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, quote
+from fastapi import FastAPI, Request, Response
+from app.data.registry import CompiledRegistry, get_registry
+from app.services.odata_batch import CRLF, _boundary, _split_headers, _split_parts
+
+@dataclass
+class GatewayConfig:
+    rows: int = 2000                  # rows per header entity set (item sets get items_per_header x rows)
+    items_per_header: int = 3
+    page_size: int = 0                # server-driven paging: max rows per response (0 = off)
+    latency: float = 0.0              # seconds added to every request
+    jitter: float = 0.0               # extra uniform random latency, 0..jitter seconds
+    error_rate: float = 0.0           # share of requests answered with error_status
+    error_status: int = 503
+    retry_after: Optional[float] = None
+    metadata: bool = True             # add a v2 `__metadata` block (uri, type) to every row
+    seed: int = 7
+
+_NUMERIC = re.compile(r"(amount|qty|quantity|price|menge|netpr|value)$", re.I)
+_DATE = re.compile(r"(date|createdon|changedon|bedat|erdat)$", re.I)
+_CURRENCY = re.compile(r"(currency|waers)$", re.I)
+_KEY_SEGMENT = re.compile(r"^(?P<entity>[^(]+)\((?P<keys>.*)\)$")
+_COMPARISON = re.compile(r"^(?P<field>\w+) (?P<op>eq|ne|gt|ge|lt|le) (?P<value>(?:[a-z]+)?'(?:[^']|'')*'|[-\w.:]+)$")
+_SUBSTRINGOF = re.compile(r"^substringof\('(?P<value>(?:[^']|'')*)', ?(?P<field>\w+)\)$")
+_TYPED = re.compile(r"^(?P<prefix>[a-z]+)'(?P<value>.*)'$")
+_SUFFIXED = re.compile(r"^(?P<number>-?[\d.]+(?:E[-+]?\d+)?)[LMmdDfF]$")
+
+def _literal(token: str) -> Any:
+    token = token.strip()
+    if token.startswith("'") and token.endswith("'"):
+        return token[1:-1].replace("''", "'")
+    m = _TYPED.match(token)   # datetime'...', guid'...', time'...'
+    if m:
+        value = m["value"]
+        return value[:-9] if m["prefix"] == "datetime" and value.endswith("T00:00:00") else value   # rows hold plain dates
+    if token in ("true", "false"):
+        return token == "true"
+    m = _SUFFIXED.match(token)   # 5L, 12.5M, 1.5d, 2f
+    if m:
+        token = m["number"]
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return token
+
+def _comparable(a: Any, b: Any) -> Tuple[Any, Any]:
+    if isinstance(a, (int, float)) and not isinstance(b, (int, float)):
+        b = _literal(str(b))
+    if isinstance(b, (int, float)) and not isinstance(a, (int, float)):
+        try:
+            return float(a), b     # Edm.Decimal values travel as strings
+        except (TypeError, ValueError):
+            return str(a), str(b)
+    return a, b
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b, "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a > b, "ge": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b, "le": lambda a, b: a <= b,
+}
+
+def _comparison(term: str) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    m = _COMPARISON.match(term)
+    if not m:
+        return None
+    field, op, value = m["field"], _OPS[m["op"]], _literal(m["value"])
+    return lambda row: field in row and op(*_comparable(row[field], value))
+
+def parse_filter(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """Compile the `$filter` subset produced by `build_filter`; raises ValueError otherwise."""
+    preds: List[Callable[[Dict[str, Any]], bool]] = []
+    for term in re.split(r" and ", expr.strip()):
+        term = term.strip()
+        pred = _comparison(term)
+        if pred:
+            preds.append(pred)
+            continue
+        m = _SUBSTRINGOF.match(term)
+        if m:
+            field, value = m["field"], m["value"].replace("''", "'")
+            preds.append(lambda row, f=field, v=value: v in str(row.get(f, "")))   # case-sensitive, as on SAP
+            continue
+        if term.startswith("(") and term.endswith(")"):
+            alternatives = [_comparison(t.strip()) for t in term[1:-1].split(" or ")]
+            if all(alternatives):
+                preds.append(lambda row, alts=alternatives: any(a(row) for a in alts))
+                continue
+        raise ValueError(f"unsupported $filter term: {term}")
+    return lambda row: all(p(row) for p in preds)
+
+def _parse_keys(spec: str, key_fields: List[str]) -> Dict[str, Any]:
+    if "=" not in spec:
+        return {key_fields[0]: _literal(spec)}
+    out = {}
+    for part in re.findall(r"(\w+)=('(?:[^']|'')*'|[^,]+)", spec):
+        out[part[0]] = _literal(part[1])
+    return out
+
+class FakeGateway:
+    def __init__(self, config: Optional[GatewayConfig] = None, registry: Optional[CompiledRegistry] = None):
+        self.config = config or GatewayConfig()
+        self.registry = registry or get_registry()
+        self._rng = random.Random(self.config.seed)
+        self.tables: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.csrf_tokens: Dict[str, str] = {}     # session cookie -> token
+        self.requests: Dict[str, int] = {}
+        self.injected_errors = 0
+        self._seed_tables()
+        self.app = self._build_app()
+
+    # ---------------- synthetic data ----------------
+    def _value(self, field: str, i: int) -> Any:
+        if _NUMERIC.search(field):
+            return f"{10 + (i * 37 % 9900) / 10:.2f}"   # Edm.Decimal is serialized as a string in v2
+        if _DATE.search(field):
+            return f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"
+        if _CURRENCY.search(field):
+            return ("EUR", "USD", "GBP")[i % 3]
+        return f"{1000 + i % 50}"
+
+    def _seed_tables(self) -> None:
+        cfg = self.config
+        for svc in self.registry.services.values():
+            for ent in svc.entities.values():
+                keys = list(ent.key_fields)
+                rows = []
+                per_header = cfg.items_per_header if len(keys) > 1 else 1
+                for i in range(cfg.rows * per_header):
+                    row = {f: self._value(f, i) for f in ent.fields}
+                    if keys:
+                        row[keys[0]] = f"{4500000000 + i // per_header:010d}"
+                    if len(keys) > 1:
+                        row[keys[1]] = f"{(i % per_header + 1) * 10:05d}"
+                    rows.append(row)
+                self.tables[(svc.base_path, ent.path)] = rows
+
+    # ---------------- helpers ----------------
+    def _entity(self, base_path: str, entity_path: str):
+        for svc in self.registry.services.values():
+            if svc.base_path == base_path:
+                for ent in svc.entities.values():
+                    if ent.path == entity_path:
+                        return ent
+        return None
+
+    @staticmethod
+    def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        body = json.dumps({"error": {"code": str(status), "message": {"lang": "en", "value": message}}})
+        return Response(body, status_code=status, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _json(payload: Any, request: Request, status: int = 200) -> Response:
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        if status == 200 and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, status_code=status, media_type="application/json", headers={"ETag": etag})
+
+    def _csrf_ok(self, request: Request) -> bool:
+        session = request.cookies.get("SAP_SESSIONID")
+        token = request.headers.get("x-csrf-token")
+        return bool(session and token and self.csrf_tokens.get(session) == token)
+
+    def expire_csrf_tokens(self) -> None:
+        """Invalidate every issued token, as a gateway restart or session timeout would."""
+        self.csrf_tokens.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": dict(self.requests), "injected_errors": self.injected_errors}
+
+    # ---------------- reads ----------------
+    def _query(self, rows: List[Dict[str, Any]], params) -> List[Dict[str, Any]]:
+        if params.get("$filter"):
+            pred = parse_filter(params["$filter"])
+            rows = [r for r in rows if pred(r)]
+        if params.get("$orderby"):
+            for clause in reversed(params["$orderby"].split(",")):
+                field, _, direction = clause.strip().partition(" ")
+                rows = sorted(rows, key=lambda r: (r.get(field) is None, r.get(field)), reverse=direction.lower() == "desc")
+        return rows
+
+    def _expand(self, base_path: str, ent, rows: List[Dict[str, Any]], nav: str) -> List[Dict[str, Any]]:
+        """`rows` with the to-many navigation `nav` inlined as `{"results": [...]}`."""
+        target = self._entity(base_path, ent.navigation[nav]["entity"])
+        keys = [k for k in ent.key_fields if k in target.key_set]
+        index: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for item in self.tables[(base_path, target.path)]:
+            index.setdefault(tuple(str(item.get(k)) for k in keys), []).append(item)
+        return [{**r, nav: {"results": index.get(tuple(str(r.get(k)) for k in keys), [])}} for r in rows]
+
+    def _project(self, params, base_path: str, ent, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply `$expand` and `$select` (including `Nav/Field` paths) to a window of rows."""
+        expand = [n.strip() for n in (params.get("$expand") or "").split(",") if n.strip()]
+        for nav in expand:
+            if nav not in ent.navigation:
+                raise ValueError(f"unknown navigation property {nav}")
+            rows = self._expand(base_path, ent, rows, nav)
+        if not params.get("$select"):
+            return rows
+        fields = [f.strip() for f in params["$select"].split(",")]
+        plain = [f for f in fields if "/" not in f and f not in expand]
+        nested: Dict[str, List[str]] = {}
+        for f in fields:
+            nav, _, sub = f.partition("/")
+            if nav in expand:
+                nested.setdefault(nav, [])
+                if sub:
+                    nested[nav].append(sub)
+        out = []
+        for r in rows:
+            row = {f: r.get(f) for f in plain}
+            for nav, subs in nested.items():
+                items = r[nav]["results"]
+                row[nav] = {"results": [{f: i.get(f) for f in subs} for i in items] if subs else items}
+            out.append(row)
+        return out
+
+    def _read(self, request: Request, rows: List[Dict[str, Any]], base_path: str, entity_path: str, ent) -> Response:
+        params = request.query_params
+        path = f"{base_path}/{entity_path}"
+        key_fields = ent.key_fields
+        try:
+            rows = self._query(rows, params)
+            self._project(params, base_path, ent, [])   # reject bad $expand before paging
+        except ValueError as e:
+            return self._error(400, str(e))
+        total = len(rows)
+        skip = int(params.get("$skiptoken") or params.get("$skip") or 0)
+        top = int(params["$top"]) if params.get("$top") else None
+        window = rows[skip:] if top is None else rows[skip:skip + top]
+        next_link = None
+        page_size = self.config.page_size
+        if page_size and len(window) > page_size:
+            window = window[:page_size]
+            query = {k: v for k, v in params.items() if k not in ("$skiptoken", "$skip", "$top")}
+            query["$skiptoken"] = str(skip + page_size)
+            if top is not None:
+                query["$top"] = str(top - page_size)
+            next_link = f"{str(request.base_url).rstrip('/')}/{path}?{urlencode(query, quote_via=quote)}"
+        window = self._project(params, base_path, ent, window)
+        if self.config.metadata:
+            root = f"{str(request.base_url).rstrip('/')}/{path}"
+            kind = f"{path.split('/')[0]}.{path.split('/')[-1]}"
+            window = [{"__metadata": {"id": uri, "uri": uri, "type": kind}, **r} for r, uri in (
+                (r, root + "(" + ",".join(f"{k}='{r.get(k)}'" for k in key_fields) + ")") for r in window)]
+        d: Dict[str, Any] = {"results": window}
+        if params.get("$inlinecount") == "allpages":
+            d["__count"] = str(total)
+        if next_link:
+            d["__next"] = next_link
+        return self._json({"d": d}, request)
+
+    # ---------------- writes ----------------
+    def _apply(self, method: str, base_path: str, resource: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        m = _KEY_SEGMENT.match(resource)
+        entity_path = m["entity"] if m else resource
+        ent = self._entity(base_path, entity_path)
+        if ent is None:
+            return 404, {"error": {"message": {"value": f"resource {resource} not found"}}}
+        table = self.tables[(base_path, entity_path)]
+        unknown = set(payload) - set(ent.fields) - set(ent.key_fields)
+        if unknown:
+            return 400, {"error": {"message": {"value": f"unknown properties: {sorted(unknown)}"}}}
+        if method == "POST" and not m:
+            row = {f: None for f in ent.fields}
+            row.update(payload)
+            table.append(row)
+            return 201, {"d": row}
+        if method in ("PATCH", "MERGE", "PUT") and m:
+            keys = _parse_keys(m["keys"], list(ent.key_fields))
+            for row in table:
+                if all(str(row.get(k)) == str(v) for k, v in keys.items()):
+                    row.update(payload)
+                    return 204, None
+            return 404, {"error": {"message": {"value": "entity not found"}}}
+        return 405, {"error": {"message": {"value": f"{method} not allowed on {resource}"}}}
+
+    def _batch(self, base_path: str, content_type: str, body: bytes) -> Response:
+        boundary = _boundary(content_type)
+        if not boundary:
+            return self._error(400, "$batch requires multipart/mixed")
+        text = body.decode().replace("\r\n", "\n").replace("\n", CRLF)
+        out_boundary = f"batchresponse_{uuid.uuid4().hex}"
+        lines: List[str] = []
+        for part in _split_parts(text, boundary):
+            headers, rest = _split_headers(part)
+            cs_boundary = _boundary(headers.get("content-type", "")) or ""
+            results = []
+            for op in _split_parts(rest, cs_boundary):
+                _, http = _split_headers(op)
+                request_line, _, tail = http.partition(CRLF)
+                _, payload_text = _split_headers(tail)
+                method, resource, _ = request_line.split(" ", 2)
+                payload = json.loads(payload_text.strip() or "{}")
+                results.append(self._apply(method, base_path, resource, payload))
+            lines += [f"--{out_boundary}"]
+            failed = next(((s, b) for s, b in results if s >= 400), None)
+            if failed is not None and len(results) > 1:
+                lines += ["Content-Type: application/http", "", f"HTTP/1.1 {failed[0]} Error",
+                          "Content-Type: application/json", "", json.dumps(failed[1])]
+                continue
+            inner = f"changesetresponse_{uuid.uuid4().hex}"
+            lines += [f"Content-Type: multipart/mixed; boundary={inner}", ""]
+            for status, payload in results:
+                lines += [f"--{inner}", "Content-Type: application/http", "", f"HTTP/1.1 {status} OK",
+                          "Content-Type: application/json", "", json.dumps(payload) if payload is not None else ""]
+            lines += [f"--{inner}--"]
+        lines += [f"--{out_boundary}--", ""]
+        return Response(CRLF.join(lines).encode(), status_code=202,
+                        media_type=f"multipart/mixed; boundary={out_boundary}")
+
+    # ---------------- app ----------------
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake SAP OData gateway")
+        gw = self
+
+        @app.middleware("http")
+        async def inject(request: Request, call_next):
+            cfg = gw.config
+            gw.requests[request.method] = gw.requests.get(request.method, 0) + 1
+            delay = cfg.latency + (gw._rng.uniform(0, cfg.jitter) if cfg.jitter else 0.0)
+            if delay:
+                await asyncio.sleep(delay)
+            if cfg.error_rate and gw._rng.random() < cfg.error_rate:
+                gw.injected_errors += 1
+                headers = {"Retry-After": str(cfg.retry_after)} if cfg.retry_after is not None else None
+                return gw._error(cfg.error_status, "injected error", headers)
+            return await call_next(request)
+
+        @app.api_route("/{base_path}", methods=["GET"])
+        @app.api_route("/{base_path}/{resource:path}", methods=["GET", "POST", "PATCH", "MERGE", "PUT"])
+        async def resource(base_path: str, request: Request, resource: str = ""):
+            if request.method == "GET":
+                response = gw._get(base_path, resource, request)
+                if request.headers.get("x-csrf-token", "").lower() == "fetch":
+                    session = request.cookies.get("SAP_SESSIONID") or uuid.uuid4().hex
+                    token = gw.csrf_tokens.setdefault(session, uuid.uuid4().hex)
+                    response.headers["x-csrf-token"] = token
+                    response.set_cookie("SAP_SESSIONID", session)
+                return response
+            if not gw._csrf_ok(request):
+                return gw._error(403, "CSRF token validation failed", {"x-csrf-token": "Required"})
+            if resource == "$batch":
+                return gw._batch(base_path, request.headers.get("content-type", ""), await request.body())
+            status, body = gw._apply(request.method, base_path, resource, json.loads(await request.body() or b"{}"))
+            if body is None:
+                return Response(status_code=status)
+            return gw._json(body, request, status)
+
+        return app
+
+    def _get(self, base_path: str, resource: str, request: Request) -> Response:
+        if resource in ("", "$metadata"):
+            return Response(status_code=200)
+        entity_path, _, segment = resource.partition("/")
+        m = _KEY_SEGMENT.match(entity_path)
+        ent = self._entity(base_path, m["entity"] if m else entity_path)
+        if ent is None:
+            return self._error(404, f"resource {resource} not found")
+        rows = self.tables[(base_path, ent.path)]
+        if segment == "$count":
+            try:
+                rows = self._query(rows, request.query_params)
+            except ValueError as e:
+                return self._error(400, str(e))
+            return Response(str(len(rows)), media_type="text/plain")
+        if m:
+            keys = _parse_keys(m["keys"], list(ent.key_fields))
+            for row in rows:
+                if all(str(row.get(k)) == str(v) for k, v in keys.items()):
+                    try:
+                        (row,) = self._project(request.query_params, base_path, ent, [row])
+                    except ValueError as e:
+                        return self._error(400, str(e))
+                    return self._json({"d": row}, request)
+            return self._error(404, "entity not found")
+        return self._read(request, rows, base_path, entity_path, ent)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--page-size", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    import uvicorn
+    gw = FakeGateway(GatewayConfig(rows=args.rows, page_size=args.page_size, latency=args.latency,
+                                   jitter=args.jitter, error_rate=args.error_rate))
+    uvicorn.run(gw.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Canned-intent stand-in for the LangChain chain used by `app.services.nlp_router`.
+
+`installed()` swaps the chain builder, so chain caching, the NLP limiter, the intent cache and
+the fast path all run as in production; only the model call is replaced.
+"""
+import asyncio, time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.services import nlp_router
+
+DEFAULT_INTENT: Dict[str, Any] = {
+    "intent": "get", "service": "Z_SALES", "entity": "SalesOrderSet",
+    "fields": ["SalesOrderId", "Customer", "Amount"],
+    "filters": [{"field": "Customer", "op": "eq", "value": "1001"}],
+    "top": 20,
+}
+
+class FakeChain:
+    """Answers every message with `intents[message]` (or `default`) after `latency` seconds."""
+
+    def __init__(self, intents: Optional[Dict[str, Dict[str, Any]]] = None, default: Optional[Dict[str, Any]] = None, latency: float = 0.0):
+        self.intents = intents or {}
+        self.default = default or DEFAULT_INTENT
+        self.latency = latency
+        self.calls = 0
+
+    def _answer(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        return dict(self.intents.get(inputs["message"], self.default))
+
+    def invoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(inputs)
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(inputs)
+
+@contextmanager
+def installed(chain: FakeChain):
+    """Route NLP parsing through `chain` for the duration of the block."""
+    saved = (nlp_router._build_chain, nlp_router.LANGCHAIN_AVAILABLE, settings.USE_LANGCHAIN)
+    nlp_router._build_chain = lambda allowed=None: (chain, nlp_router._build_system_prompt(allowed))
+    nlp_router.LANGCHAIN_AVAILABLE = True
+    settings.USE_LANGCHAIN = True
+    nlp_router._chain_cache.clear()
+    try:
+        yield chain
+    finally:
+        nlp_router._build_chain, nlp_router.LANGCHAIN_AVAILABLE, settings.USE_LANGCHAIN = saved
+        nlp_router._chain_cache.clear()
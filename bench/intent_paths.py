@@ -0,0 +1,67 @@
+"""Fast-path vs LLM intent parsing latency.
+
+    python -m bench.intent_paths            # fast path only
+    python -m bench.intent_paths --llm      # also time the LangChain chain (needs OPENAI_API_KEY)
+"""
+import argparse, asyncio, statistics, time
+from typing import Callable, List
+
+from app.core.config import settings
+from app.services.fast_intent import fast_parse
+
+MESSAGES = [
+    "top 50 SalesOrderSet where Customer eq 1000 order by CreatedOn desc",
+    "show PO 4500001234",
+    "PO items 4500001234",
+    "sales orders for Customer 1000",
+    "show POHeaderSet where BEDAT >= 2025-10-01 select EBELN,LIFNR",
+    "sales items with Material 'M-01' top 5",
+    "Show purchase orders after 2025-10-01 for vendor 100045",
+]
+
+def _summary(name: str, samples: List[float]) -> str:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"{name:<10} n={len(samples):<6} p50={statistics.median(samples) * 1000:.3f}ms p95={p95 * 1000:.3f}ms"
+
+def _time(fn: Callable[[], object], repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+async def _time_llm(messages: List[str]) -> List[float]:
+    from app.services.nlp_router import get_chain
+    chain = get_chain().chain
+    out = []
+    for m in messages:
+        t0 = time.perf_counter()
+        await chain.ainvoke({"message": m})
+        out.append(time.perf_counter() - t0)
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=2000)
+    ap.add_argument("--llm", action="store_true")
+    args = ap.parse_args()
+
+    served = 0
+    for m in MESSAGES:
+        r = fast_parse(m)
+        hit = r is not None and r.confidence >= settings.FAST_INTENT_THRESHOLD
+        served += hit
+        print(f"{'fast' if hit else 'llm ':<5} {r.confidence if r else 0:.2f}  {m}")
+    print(f"fast path serves {served}/{len(MESSAGES)} messages (threshold {settings.FAST_INTENT_THRESHOLD})")
+
+    samples: List[float] = []
+    for m in MESSAGES:
+        samples += _time(lambda: fast_parse(m), args.repeat)
+    print(_summary("fast_path", samples))
+    if args.llm:
+        print(_summary("llm", asyncio.run(_time_llm(MESSAGES))))
+
+if __name__ == "__main__":
+    main()
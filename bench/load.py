@@ -0,0 +1,223 @@
+"""Offline load test of the `/api/odata/*` and `/api/chat` paths against the fake gateway.
+
+The app and the fake gateway (`bench.fake_gateway`) run in this process over ASGI
+transports, and the LLM is replaced by canned intents (`bench.fake_llm`), so the numbers
+show the app's own overhead plus whatever gateway/LLM latency is injected.
+
+    python -m bench.load                                    # all scenarios
+    python -m bench.load -s odata_get -s chat_llm -n 2000 -c 64
+    python -m bench.load --latency 0.02 --error-rate 0.01 --save before.json
+    python -m bench.load --baseline before.json             # exit 1 if p95 or RPS regressed
+"""
+import argparse, asyncio, json, sys, time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.http import build_http_client, set_http_client
+from app.services import bulkhead, resilience
+from app.services.csrf_cache import csrf_cache
+from app.services.intent_cache import intent_cache
+from app.services.response_cache import response_cache
+from bench.fake_gateway import FakeGateway, GatewayConfig
+from bench.fake_llm import FakeChain, installed
+
+FAKE_SAP_URL = "http://fake-sap"
+
+@dataclass
+class Scenario:
+    name: str
+    path: str
+    body: Callable[[int], Dict[str, Any]]     # request number -> JSON body
+
+def _customer(i: int) -> str:
+    return str(1000 + i % 50)
+
+def _plan_message(i: int) -> str:
+    return f"compare POs of vendors {_customer(i)} and {_customer(i + 1)} with their items"
+
+def _vendor_steps(tag: str, vendor: str) -> List[Dict[str, Any]]:
+    return [
+        {"id": f"po{tag}", "intent": "get", "service": "Z_MM_PURCHASE", "entity": "POHeaderSet", "top": 20,
+         "filters": [{"field": "LIFNR", "op": "eq", "value": vendor}]},
+        {"id": f"items{tag}", "intent": "get", "service": "Z_MM_PURCHASE", "entity": "POItemSet", "top": 100,
+         "filters": [{"field": "EBELN", "op": "in", "value": {"$ref": f"po{tag}.EBELN"}}]},
+    ]
+
+# canned multi-step plans: two independent header reads, each followed by its item read
+PLAN_INTENTS: Dict[str, Dict[str, Any]] = {
+    _plan_message(i): {"intent": "plan", "steps": _vendor_steps("1", _customer(i)) + _vendor_steps("2", _customer(i + 1))}
+    for i in range(50)
+}
+
+SCENARIOS: Dict[str, Scenario] = {s.name: s for s in [
+    Scenario("odata_get", "/api/odata/get", lambda i: {
+        "service": "Z_SALES", "entity": "SalesOrderSet", "fields": ["SalesOrderId", "Customer", "Amount"],
+        "filters": [{"field": "Customer", "op": "eq", "value": _customer(i)}], "top": 20}),
+    Scenario("odata_get_large", "/api/odata/get", lambda i: {
+        "service": "Z_SALES", "entity": "SalesItemSet", "top": 1000, "skip": (i % 5) * 1000}),
+    Scenario("odata_get_columnar", "/api/odata/get", lambda i: {
+        "service": "Z_SALES", "entity": "SalesItemSet", "top": 1000, "skip": (i % 5) * 1000, "result_format": "columnar"}),
+    Scenario("odata_get_parallel", "/api/odata/get", lambda i: {
+        "service": "Z_MM_PURCHASE", "entity": "POItemSet", "top": 250, "parallel": 4, "limit": 1000,
+        "filters": [{"field": "WAERS", "op": "eq", "value": ("EUR", "USD", "GBP")[i % 3]}]}),
+    Scenario("odata_get_joined", "/api/odata/get/joined", lambda i: {
+        "service": "Z_SALES", "header": "SalesOrderSet", "items": "SalesItemSet", "top": 50, "skip": (i % 20) * 50}),
+    Scenario("odata_get_joined_chunks", "/api/odata/get/joined", lambda i: {
+        "service": "Z_MM_PURCHASE", "header": "POHeaderSet", "items": "POItemSet", "top": 50, "skip": (i % 20) * 50}),
+    Scenario("odata_stream", "/api/odata/get/stream", lambda i: {
+        "service": "Z_SALES", "entity": "SalesItemSet", "top": 500, "limit": 1500, "format": "ndjson"}),
+    Scenario("odata_post", "/api/odata/post/confirm", lambda i: {
+        "action": "update", "service": "Z_SALES", "entity": "SalesOrderSet", "confirm": True,
+        "key_fields": {"SalesOrderId": f"{4500000000 + i % 1000:010d}"}, "payload": {"Amount": i % 997}}),
+    Scenario("odata_batch", "/api/odata/batch/confirm", lambda i: {
+        "confirm": True, "operations": [
+            {"action": "update", "service": "Z_SALES", "entity": "SalesOrderSet", "confirm": True,
+             "key_fields": {"SalesOrderId": f"{4500000000 + (i * 20 + j) % 1000:010d}"}, "payload": {"Amount": j}}
+            for j in range(20)]}),
+    Scenario("chat_fast", "/api/chat", lambda i: {
+        "message": f"top 20 SalesOrderSet where Customer eq {_customer(i)}"}),
+    Scenario("chat_llm", "/api/chat", lambda i: {
+        "message": f"what did our biggest customers order recently? (request {i})"}),
+    Scenario("chat_plan", "/api/chat", lambda i: {"message": _plan_message(i)}),
+    Scenario("chat_stream", "/api/chat/stream", lambda i: {
+        "message": f"what did our biggest customers order recently? (request {i})"}),
+]}
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples))) - 1))]
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for i in counter:
+            t0 = time.perf_counter()
+            r = await client.post(scenario.path, json=scenario.body(i))
+            await r.aread()
+            latencies.append(time.perf_counter() - t0)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": scenario.name,
+        "requests": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if status >= 400),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def _reset_state() -> None:
+    response_cache.clear()
+    csrf_cache.clear()
+    intent_cache.clear()
+    resilience.reset()
+    bulkhead.reset()
+
+async def run(names: List[str], requests: int, concurrency: int, gateway_config: GatewayConfig,
+              llm_latency: float = 0.0, cache: bool = True, warmup: int = 20) -> List[Dict[str, Any]]:
+    """Run the named scenarios one after another and return one summary dict per scenario.
+
+    Each scenario starts from empty caches, then `warmup` unrecorded requests run first.
+    """
+    gateway = FakeGateway(gateway_config)
+    saved = (settings.SAP_BASE_URL, settings.SAP_GET_CACHE_ENABLED)
+    settings.SAP_BASE_URL = FAKE_SAP_URL
+    settings.SAP_GET_CACHE_ENABLED = cache
+    set_http_client(build_http_client(transport=httpx.ASGITransport(app=gateway.app)))
+    results = []
+    try:
+        with installed(FakeChain(intents=PLAN_INTENTS, latency=llm_latency)):
+            from app.main import app   # imported with NLP enabled so /api/chat is mounted
+            mounted = {getattr(r, "path", None) for r in app.routes}
+            missing = [n for n in names if SCENARIOS[n].path not in mounted]
+            if missing:
+                raise RuntimeError(f"routes not mounted for {missing} (app.main was imported before NLP was enabled)")
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=None) as client:
+                for name in names:
+                    _reset_state()
+                    if warmup:
+                        await run_scenario(client, SCENARIOS[name], warmup, min(warmup, concurrency))
+                    results.append(await run_scenario(client, SCENARIOS[name], requests, concurrency))
+    finally:
+        set_http_client(None)
+        settings.SAP_BASE_URL, settings.SAP_GET_CACHE_ENABLED = saved
+        _reset_state()
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Scenarios whose p95 grew or whose RPS dropped by more than `tolerance` (a fraction)."""
+    before = {r["scenario"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        b = before.get(r["scenario"])
+        if b is None:
+            continue
+        if b["p95_ms"] and r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r['scenario']}: p95 {b['p95_ms']}ms -> {r['p95_ms']}ms")
+        if b["rps"] and r["rps"] < b["rps"] * (1 - tolerance):
+            regressions.append(f"{r['scenario']}: rps {b['rps']} -> {r['rps']}")
+    return regressions
+
+def _print_table(results: List[Dict[str, Any]], baseline: Optional[List[Dict[str, Any]]] = None) -> None:
+    before = {r["scenario"]: r for r in baseline or []}
+    print(f"{'scenario':<26}{'n':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        line = f"{r['scenario']:<26}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        b = before.get(r["scenario"])
+        if b and b["p95_ms"]:
+            line += f"   p95 {(r['p95_ms'] / b['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default: all")
+    ap.add_argument("-n", "--requests", type=int, default=500, help="requests per scenario")
+    ap.add_argument("-c", "--concurrency", type=int, default=32)
+    ap.add_argument("--warmup", type=int, default=20, help="unrecorded requests before each scenario")
+    ap.add_argument("--rows", type=int, default=2000, help="rows per header entity set")
+    ap.add_argument("--page-size", type=int, default=0, help="gateway server-driven page size")
+    ap.add_argument("--latency", type=float, default=0.0, help="gateway latency per request (s)")
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-latency", type=float, default=0.0)
+    ap.add_argument("--no-cache", action="store_true", help="disable the GET response cache")
+    ap.add_argument("--log-level", default="WARNING", help="app log level during the run (INFO logs every SAP call)")
+    ap.add_argument("--save", help="write results as JSON")
+    ap.add_argument("--baseline", help="compare against a saved JSON run")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline (fraction)")
+    args = ap.parse_args()
+
+    settings.LOG_LEVEL = args.log_level
+    gateway_config = GatewayConfig(rows=args.rows, page_size=args.page_size, latency=args.latency,
+                                   jitter=args.jitter, error_rate=args.error_rate)
+    results = asyncio.run(run(args.scenario or list(SCENARIOS), args.requests, args.concurrency,
+                              gateway_config, args.llm_latency, cache=not args.no_cache, warmup=args.warmup))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    _print_table(results, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.core.concurrency import LimiterRejected, TokenBucket
+from app.core.config import settings
+from app.data.registry import RegistryStore, set_store
+from app.services import bulkhead, resilience
+from app.services.bulkhead import Bulkhead
+from app.services.odata_client import ODataService
+
+
+@pytest.fixture(autouse=True)
+def _limits(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    monkeypatch.setattr(settings, "SAP_SERVICE_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "SAP_SERVICE_MAX_QUEUE", 1)
+    monkeypatch.setattr(settings, "SAP_LIMIT_QUEUE_TIMEOUT", 1.0)
+    bulkhead.reset()
+    resilience.reset()
+    yield
+    bulkhead.reset()
+
+
+def test_service_bulkhead_caps_concurrency_and_sheds_excess():
+    state = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        state["now"] += 1
+        state["peak"] = max(state["peak"], state["now"])
+        await asyncio.sleep(0.05)
+        state["now"] -= 1
+        return httpx.Response(200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            svc = ODataService(client)
+            url = "http://sap.local/Z_SALES_SRV/SalesOrderSet"
+            calls = [svc._request_with_retry("GET", url) for _ in range(4)]
+            other = svc._request_with_retry("GET", "http://sap.local/Z_MM_PURCH_SRV/POHeaderSet")
+            return await asyncio.gather(*calls, other, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, LimiterRejected) for r in results[:4]) == 1
+    assert isinstance(results[4], httpx.Response)
+    assert state["peak"] <= 3  # 2 for Z_SALES_SRV + 1 for Z_MM_PURCH_SRV
+    assert bulkhead.bulkhead_stats()["services"]["Z_SALES_SRV"]["rejected"] == 1
+    assert resilience.resilience_stats()["breakers"]["Z_SALES_SRV"]["state"] == "closed"
+
+
+def test_token_bucket_rejects_when_wait_exceeds_timeout():
+    async def run():
+        bucket = TokenBucket("t", rate=10, burst=1)
+        await bucket.take(timeout=0.5)
+        await bucket.take(timeout=0.5)   # waits ~0.1s
+        with pytest.raises(LimiterRejected):
+            await bucket.take(timeout=0.01)
+
+    asyncio.run(run())
+
+
+def test_services_under_a_shared_prefix_get_their_own_bulkhead_and_breaker(tmp_path):
+    path = tmp_path / "registry.json"
+    path.write_text(json.dumps({"services": {
+        "A": {"name": "A", "base_path": "/sap/opu/odata/sap/ZA_SRV", "entities": {},
+              "limits": {"max_concurrency": 1, "max_queue": 0}},
+        "B": {"name": "B", "base_path": "/sap/opu/odata/sap/ZB_SRV", "entities": {}},
+    }}))
+    set_store(RegistryStore(path, reload_interval=0))
+
+    async def handler(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            svc = ODataService(client)
+            a = [svc._request_with_retry("GET", "http://sap.local/sap/opu/odata/sap/ZA_SRV/Orders?$top=1") for _ in range(2)]
+            b = svc._request_with_retry("GET", "http://sap.local/sap/opu/odata/sap/ZB_SRV/Items")
+            return await asyncio.gather(*a, b, return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        set_store(None)
+    assert isinstance(results[0], httpx.Response) and isinstance(results[2], httpx.Response)
+    assert isinstance(results[1], LimiterRejected)   # max_queue: 0 means no waiting, not the default
+    services = bulkhead.bulkhead_stats()["services"]
+    assert set(services) == {"sap/opu/odata/sap/ZA_SRV", "sap/opu/odata/sap/ZB_SRV"}
+    assert set(resilience.resilience_stats()["breakers"]) == set(services)
+
+
+def test_cancelled_caller_gets_its_rate_token_back():
+    async def run():
+        bh = Bulkhead("t", max_concurrency=1, max_queue=5, queue_timeout=5, rate_per_sec=0.01, burst=2)
+        release = asyncio.Event()
+
+        async def hold():
+            async with bh.acquire():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        before = bh.bucket.tokens
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        release.set()
+        await holder
+        return before, bh.bucket.tokens
+
+    before, after = asyncio.run(run())
+    assert before < 1 and after == pytest.approx(before + 1, abs=0.01)
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.api import chat
+from app.core.config import settings
+from app.services.chat_plan import execute_plan, parse_plan, resolve
+from app.services.intent_cache import intent_cache
+from app.services.response_cache import response_cache
+from app.services.odata_client import ODataService
+from bench.fake_gateway import FakeGateway, GatewayConfig
+from bench.fake_llm import FakeChain, installed
+
+
+def _get(entity, **kw):
+    return {"intent": "get", "service": "Z_MM_PURCHASE", "entity": entity, **kw}
+
+
+def test_parse_plan_validates_dependencies():
+    steps = parse_plan({"intent": "plan", "steps": [
+        {"id": "h", **_get("POHeaderSet")},
+        {"id": "i", **_get("POItemSet", filters=[{"field": "EBELN", "op": "in", "value": {"$ref": "h.EBELN"}}])}]})
+    assert [s.depends_on for s in steps] == [(), ("h",)]   # $ref implies the dependency
+    assert parse_plan(_get("POHeaderSet"))[0].id == "s1"
+    for bad in ([{"id": "a", "depends_on": ["b"], **_get("X")}, {"id": "b", "depends_on": ["a"], **_get("X")}],
+                [{"id": "a", "depends_on": ["zz"], **_get("X")}],
+                [{"id": "a", "intent": "delete"}]):
+        with pytest.raises(ValueError):
+            parse_plan({"intent": "plan", "steps": bad})
+
+
+def test_resolve_turns_refs_into_values():
+    rows = {"h": [{"EBELN": "1"}, {"EBELN": "2"}, {"EBELN": "1"}]}
+    out = resolve({"filters": [{"field": "EBELN", "op": "eq", "value": {"$ref": "h.EBELN"}}],
+                   "key_fields": {"EBELN": {"$ref": "h.EBELN"}}}, rows)
+    assert out["filters"] == [{"field": "EBELN", "op": "in", "value": ["1", "2"]}]
+    assert out["key_fields"] == {"EBELN": "1"}
+
+
+def test_independent_steps_overlap_and_failures_skip_dependents():
+    steps = parse_plan({"intent": "plan", "steps": [
+        {"id": "a", **_get("A")}, {"id": "b", **_get("B")},
+        {"id": "c", "depends_on": ["a"], **_get("C")}, {"id": "d", "depends_on": ["b"], **_get("D")}]})
+
+    async def run(intent):
+        await asyncio.sleep(0.1)
+        if intent["entity"] == "B":
+            raise RuntimeError("gateway down")
+        return "get", intent["entity"], []
+
+    t0 = time.perf_counter()
+    outcomes = asyncio.run(execute_plan(steps, run))
+    assert time.perf_counter() - t0 < 0.3            # two levels of 0.1s, not four steps in a row
+    assert [(o["id"], o["stage"]) for o in outcomes] == [("a", "get"), ("b", "error"), ("c", "get"), ("d", "skipped")]
+
+
+def test_chat_plan_reads_headers_then_their_items(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    response_cache.clear()
+    intent_cache.clear()
+    gw = FakeGateway(GatewayConfig(rows=20, items_per_header=2))
+    plan = {"intent": "plan", "steps": [
+        {"id": "po", **_get("POHeaderSet", filters=[{"field": "LIFNR", "value": "1003"}])},
+        {"id": "items", **_get("POItemSet", filters=[{"field": "EBELN", "op": "in", "value": {"$ref": "po.EBELN"}}])},
+        {"id": "fix", "intent": "update", "service": "Z_MM_PURCHASE", "entity": "POHeaderSet",
+         "key_fields": {"EBELN": {"$ref": "po.EBELN"}}, "payload": {"BSART": "NB"}}]}
+    message = "open POs for vendor 1003 with their items, and set the first to NB"
+
+    async def run():
+        app = FastAPI()
+        app.include_router(chat.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as sap:
+            app.dependency_overrides[chat.get_service] = lambda: ODataService(sap)
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+                with installed(FakeChain(intents={message: plan})):
+                    return (await client.post("/chat", json={"message": message})).json()
+
+    body = asyncio.run(run())
+    assert body["stage"] == "plan" and body["ok"]
+    po, items, fix = body["result"]["steps"]
+    headers = po["result"]["d"]["results"]
+    assert headers and all(h["LIFNR"] == "1003" for h in headers)
+    assert {i["EBELN"] for i in items["result"]["d"]["results"]} == {h["EBELN"] for h in headers}
+    assert fix["stage"] == "preview" and headers[0]["EBELN"] in fix["result"]["url"]
+    assert gw.requests.get("PATCH") is None       # writes stay behind preview/confirm
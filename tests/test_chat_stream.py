@@ -0,0 +1,72 @@
+import asyncio
+import json
+import httpx
+from fastapi import FastAPI
+from app.api import chat
+from app.core.config import settings
+from app.services.intent_cache import intent_cache
+from app.services.odata_client import ODataService
+from bench.fake_gateway import FakeGateway, GatewayConfig
+from bench.fake_llm import FakeChain, installed
+
+
+def _events(text):
+    out = []
+    for block in filter(None, text.split("\n\n")):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def _stream(monkeypatch, intents, body, page_size=20):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    monkeypatch.setattr(settings, "CHAT_STREAM_PAGE_SIZE", page_size)
+    intent_cache.clear()
+    gw = FakeGateway(GatewayConfig(rows=100))
+
+    async def run():
+        app = FastAPI()
+        app.include_router(chat.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as sap:
+            app.dependency_overrides[chat.get_service] = lambda: ODataService(sap)
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+                with installed(FakeChain(intents=intents)):
+                    r = await client.post("/chat/stream", json=body)
+                    return r.status_code, r.headers.get("content-type", ""), r.text
+
+    return asyncio.run(run())
+
+
+def test_get_streams_intent_endpoint_and_row_chunks(monkeypatch):
+    intent = {"intent": "get", "service": "Z_SALES", "entity": "SalesOrderSet", "top": 50,
+              "fields": ["SalesOrderId", "Amount"]}
+    status, ctype, text = _stream(monkeypatch, {"orders": intent}, {"message": "orders", "result_format": "columnar"})
+    assert status == 200 and ctype.startswith("text/event-stream")
+    events = _events(text)
+    assert [e for e, _ in events] == ["intent", "endpoint", "rows", "rows", "rows", "done"]
+    assert events[0][1]["nlp_json"] == intent
+    assert "%24top=20" in events[1][1]["resolved_endpoint"]
+    assert [d["count"] for e, d in events if e == "rows"] == [20, 20, 10]
+    assert isinstance(events[2][1]["columns"][1][0], str)       # decimal Amount stays exact
+    assert events[-1][1] == {"ok": True, "count": 50}
+
+
+def test_write_preview_and_validation_errors(monkeypatch):
+    update = {"intent": "update", "service": "Z_SALES", "entity": "SalesOrderSet",
+              "key_fields": {"SalesOrderId": "4500000001"}, "payload": {"Amount": 5}}
+    bad = {"intent": "get", "service": "Z_SALES", "entity": "SalesOrderSet", "fields": ["Nope"]}
+    _, _, text = _stream(monkeypatch, {"fix": update}, {"message": "fix"})
+    assert [e for e, _ in _events(text)] == ["intent", "endpoint", "preview", "done"]
+    status, _, _ = _stream(monkeypatch, {"fix": update}, {"message": "fix", "preview_only": False})
+    assert status == 400
+    status, _, _ = _stream(monkeypatch, {"bad": bad}, {"message": "bad"})
+    assert status == 400
+
+
+def test_plan_streams_one_event_per_step(monkeypatch):
+    get = lambda entity: {"intent": "get", "service": "Z_MM_PURCHASE", "entity": entity, "top": 5}
+    plan = {"intent": "plan", "steps": [{"id": "a", **get("POHeaderSet")}, {"id": "b", **get("POItemSet")}]}
+    _, _, text = _stream(monkeypatch, {"both": plan}, {"message": "both"})
+    events = _events(text)
+    assert [e for e, _ in events] == ["intent", "step", "step", "done"]
+    assert {d["id"] for e, d in events if e == "step"} == {"a", "b"}
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from app.core.concurrency import ConcurrencyLimiter, LimiterRejected, TokenBucket
+
+
+def test_limiter_bounds_active_and_rejects_when_queue_full():
+    async def run():
+        limiter = ConcurrencyLimiter("t", max_concurrency=2, max_queue=1)
+        peak = 0
+        release = asyncio.Event()
+
+        async def worker():
+            nonlocal peak
+            async with limiter.acquire():
+                peak = max(peak, limiter.active)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert limiter.active == 2 and limiter.waiting == 1
+        with pytest.raises(LimiterRejected):
+            async with limiter.acquire():
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        assert peak == 2 and limiter.rejected == 1
+
+    asyncio.run(run())
+
+
+def test_limiter_queue_timeout():
+    async def run():
+        limiter = ConcurrencyLimiter("t", max_concurrency=1, queue_timeout=0.01)
+        async with limiter.acquire():
+            with pytest.raises(LimiterRejected):
+                async with limiter.acquire():
+                    pass
+        assert limiter.stats()["waiting"] == 0
+
+    asyncio.run(run())
+
+
+def test_freed_slot_goes_to_the_queued_caller_first():
+    async def run():
+        limiter = ConcurrencyLimiter("t", max_concurrency=1)
+        order = []
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire():
+                await release.wait()
+
+        async def worker(name):
+            async with limiter.acquire():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(worker("queued"))
+        await asyncio.sleep(0)
+        release.set()
+        await holder            # slot freed; the queued caller has not resumed yet
+        await worker("late")
+        await queued
+        return order
+
+    assert asyncio.run(run()) == ["queued", "late"]
+
+
+def test_token_bucket_refunds_a_cancelled_wait():
+    async def run():
+        bucket = TokenBucket("t", rate=1, burst=1)
+        await bucket.take()
+        waiter = asyncio.ensure_future(bucket.take())     # reserves the next token, sleeps ~1s
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return bucket.tokens
+
+    assert asyncio.run(run()) == pytest.approx(0, abs=0.05)
@@ -0,0 +1,80 @@
+import asyncio
+import httpx
+from app.core.config import settings
+from app.models.schemas import ODataPostRequest
+from app.services.csrf_cache import CsrfCache, CsrfEntry, csrf_cache
+from app.services.odata_client import ODataService
+
+
+def _gateway(calls, reject_first_write=False):
+    state = {"token": "t1", "rejected": not reject_first_write}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            calls["fetch"] += 1
+            if calls["fetch"] > 1:
+                state["token"] = f"t{calls['fetch']}"
+            return httpx.Response(200, headers={"x-csrf-token": state["token"], "set-cookie": "SAP_SESSIONID=abc; Path=/"}, json={})
+        calls["write"] += 1
+        if not state["rejected"]:
+            state["rejected"] = True
+            return httpx.Response(403, headers={"x-csrf-token": "Required"})
+        assert request.headers["x-csrf-token"] == state["token"]
+        assert "SAP_SESSIONID=abc" in request.headers["cookie"]
+        return httpx.Response(201, json={"d": {"ok": True}})
+
+    return handler
+
+
+def _post():
+    return ODataPostRequest(action="create", service="Z_SALES", entity="SalesOrderSet", payload={"Customer": "1000"}, confirm=True)
+
+
+def test_concurrent_writes_share_one_csrf_fetch(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    csrf_cache.clear()
+    calls = {"fetch": 0, "write": 0}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_gateway(calls))) as client:
+            svc = ODataService(client)
+            results = await asyncio.gather(*[svc.execute_post(_post()) for _ in range(5)])
+            assert all(r == {"d": {"ok": True}} for r in results)
+
+    asyncio.run(run())
+    assert calls == {"fetch": 1, "write": 5}
+
+
+def test_403_required_refreshes_token_once(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    csrf_cache.clear()
+    calls = {"fetch": 0, "write": 0}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_gateway(calls, reject_first_write=True))) as client:
+            return await ODataService(client).execute_post(_post())
+
+    assert asyncio.run(run()) == {"d": {"ok": True}}
+    assert calls == {"fetch": 2, "write": 2}
+
+
+def test_cancelled_first_caller_keeps_the_shared_token_fetch():
+    cache = CsrfCache(ttl=60)
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.02)
+        return CsrfEntry(token="t")
+
+    async def run():
+        first = asyncio.ensure_future(cache.get("/svc", fetch))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get("/svc", fetch))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        entry = await second
+        return entry, await cache.get("/svc", fetch)
+
+    entry, cached = asyncio.run(run())
+    assert entry.token == "t" and cached is entry and len(fetches) == 1
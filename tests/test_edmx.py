@@ -0,0 +1,121 @@
+import json
+from urllib.parse import unquote_plus
+import pytest
+from app.core.config import settings
+from app.data import edmx
+from app.data.registry import RegistryStore, set_store
+from app.models.schemas import ODataGetRequest
+from app.services.query_planner import QueryValidationError, clear_plans, plan_query
+from app.utils.url_builder import build_filter, format_literal
+
+EDMX = b"""<?xml version="1.0" encoding="utf-8"?>
+<edmx:Edmx Version="1.0" xmlns:edmx="http://schemas.microsoft.com/ado/2007/06/edmx"
+    xmlns:m="http://schemas.microsoft.com/ado/2007/08/dataservices/metadata" xmlns:sap="http://www.sap.com/Protocols/SAPData">
+ <edmx:DataServices m:DataServiceVersion="2.0">
+  <Schema Namespace="Z_SALES_SRV" xmlns="http://schemas.microsoft.com/ado/2008/09/edm">
+   <EntityType Name="SalesOrder">
+    <Key><PropertyRef Name="SalesOrderId"/></Key>
+    <Property Name="SalesOrderId" Type="Edm.String" Nullable="false" MaxLength="10"/>
+    <Property Name="Customer" Type="Edm.String" MaxLength="10"/>
+    <Property Name="Amount" Type="Edm.Decimal" Precision="15" Scale="2"/>
+    <Property Name="CreatedOn" Type="Edm.DateTime" sap:display-format="Date"/>
+    <Property Name="Note" Type="Edm.String" sap:filterable="false" sap:sortable="false"/>
+    <NavigationProperty Name="Items" Relationship="Z_SALES_SRV.OrderItems" FromRole="FromRole_OrderItems" ToRole="ToRole_OrderItems"/>
+   </EntityType>
+   <EntityType Name="SalesItem">
+    <Key><PropertyRef Name="SalesOrderId"/><PropertyRef Name="ItemNo"/></Key>
+    <Property Name="SalesOrderId" Type="Edm.String" Nullable="false"/>
+    <Property Name="ItemNo" Type="Edm.Int32" Nullable="false"/>
+    <Property Name="Qty" Type="Edm.Int64"/>
+    <Property Name="Guid" Type="Edm.Guid"/>
+   </EntityType>
+   <Association Name="OrderItems">
+    <End Type="Z_SALES_SRV.SalesOrder" Multiplicity="1" Role="FromRole_OrderItems"/>
+    <End Type="Z_SALES_SRV.SalesItem" Multiplicity="*" Role="ToRole_OrderItems"/>
+   </Association>
+   <EntityContainer Name="Z_SALES_SRV_Entities" m:IsDefaultEntityContainer="true">
+    <EntitySet Name="SalesOrderSet" EntityType="Z_SALES_SRV.SalesOrder"/>
+    <EntitySet Name="SalesItemSet" EntityType="Z_SALES_SRV.SalesItem"/>
+   </EntityContainer>
+  </Schema>
+ </edmx:DataServices>
+</edmx:Edmx>"""
+
+
+def test_parse_types_flags_and_navigation():
+    entities = edmx.parse_edmx(EDMX)
+    order, item = entities["SalesOrderSet"], entities["SalesItemSet"]
+    assert order["key_fields"] == ["SalesOrderId"]
+    assert order["field_types"] == {"SalesOrderId": "string", "Customer": "string", "Amount": "decimal",
+                                    "CreatedOn": "date", "Note": "string"}
+    assert order["non_filterable"] == ["Note"] and order["non_sortable"] == ["Note"]
+    assert order["navigation"] == {"Items": {"entity": "SalesItemSet", "multiplicity": "*"}}
+    assert item["key_fields"] == ["SalesOrderId", "ItemNo"]
+    assert item["field_types"]["Qty"] == "int64" and item["field_types"]["Guid"] == "guid"
+
+
+def test_parsed_edmx_is_cached_by_content_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REGISTRY_EDMX_CACHE_DIR", str(tmp_path))
+    first = edmx.load_or_parse("Z_SALES", "Z_SALES_SRV", EDMX)
+    monkeypatch.setattr(edmx, "parse_edmx", lambda source: pytest.fail("cached EDMX parsed again"))
+    assert edmx.load_or_parse("Z_SALES", "Z_SALES_SRV", EDMX) == first
+    assert edmx.latest_cached("Z_SALES")["metadata_digest"] == first["metadata_digest"]
+    assert len(list(tmp_path.glob("Z_SALES.*.json"))) == 1
+
+
+def test_merge_keeps_curated_fields():
+    registry = {"services": {"Z_SALES": {"name": "Z_SALES", "base_path": "Z_SALES_SRV", "entities": {
+        "SalesOrderSet": {"name": "SalesOrderSet", "path": "SalesOrderSet", "cache_ttl": 30,
+                          "key_fields": ["SalesOrderId"], "fields": ["SalesOrderId", "Amount"]}}}}}
+    merged = edmx.merge_typed(registry, edmx.typed_service("Z_SALES", "Z_SALES_SRV", EDMX))
+    order = merged["services"]["Z_SALES"]["entities"]["SalesOrderSet"]
+    assert order["fields"] == ["SalesOrderId", "Amount"] and order["cache_ttl"] == 30
+    assert order["field_types"] == {"SalesOrderId": "string", "Amount": "decimal"}
+    assert "SalesItemSet" in merged["services"]["Z_SALES"]["entities"]
+
+
+def test_typed_literals():
+    assert format_literal(5, "int64") == "5L"
+    assert format_literal("12.50", "decimal") == "12.50M"
+    assert format_literal(1000, "string") == "'1000'"
+    assert format_literal("O'Neil", "string") == "'O''Neil'"
+    assert format_literal("2025-03-01", "date") == "datetime'2025-03-01T00:00:00'"
+    assert format_literal("/Date(1740787200000)/", "datetime") == "datetime'2025-03-01T00:00:00'"
+    assert format_literal("2025-03-01T10:00:00+01:00", "datetimeoffset") == "datetimeoffset'2025-03-01T09:00:00Z'"
+    assert format_literal("X", "bool") == "true"
+    assert format_literal("12:30", "time") == "time'PT12H30M00S'"
+    for value, kind in (("abc", "decimal"), (1.5, "int"), ("tomorrow", "date"), ("nope", "guid")):
+        with pytest.raises(ValueError):
+            format_literal(value, kind)
+    assert build_filter([{"field": "Amount", "op": "gt", "value": 50}, {"field": "Qty", "op": "in", "value": [1, 2]}],
+                        {"Amount": "decimal", "Qty": "int64"}) == "Amount gt 50M and (Qty eq 1L or Qty eq 2L)"
+    assert build_filter([{"field": "Name", "op": "like", "value": "O'N"}]) == "substringof('O''N', Name)"
+
+
+def test_planner_uses_typed_registry(tmp_path):
+    path = tmp_path / "registry.json"
+    path.write_text(json.dumps({"services": {"Z_SALES": {"name": "Z_SALES", "base_path": "Z_SALES_SRV", "entities": {}}}}))
+    store = RegistryStore(path, reload_interval=0)
+    store.apply_typed([edmx.typed_service("Z_SALES", "Z_SALES_SRV", EDMX)])
+    set_store(store)
+    clear_plans()
+    try:
+        req = lambda **kw: ODataGetRequest(service="Z_SALES", entity="SalesOrderSet", **kw)
+        plan = plan_query(req(filters=[{"field": "Amount", "op": "ge", "value": 100},
+                                       {"field": "CreatedOn", "op": "lt", "value": "2025-04-01"}]))
+        assert "Amount ge 100M and CreatedOn lt datetime'2025-04-01T00:00:00'" in unquote_plus(plan.count_url("http://h"))
+        with pytest.raises(QueryValidationError, match="not filterable"):
+            plan_query(req(filters=[{"field": "Note", "op": "eq", "value": "x"}]))
+        with pytest.raises(QueryValidationError, match="not sortable"):
+            plan_query(req(orderby="Note desc"))
+        with pytest.raises(QueryValidationError, match="decimal"):
+            plan_query(req(filters=[{"field": "Amount", "op": "eq", "value": "lots"}]))
+    finally:
+        set_store(None)
+        clear_plans()
+
+
+def test_string_key_lengths_come_from_max_length():
+    entities = edmx.parse_edmx(EDMX)
+    assert entities["SalesOrderSet"]["key_max_lengths"] == {"SalesOrderId": 10}
+    assert "key_max_lengths" not in entities["SalesItemSet"]    # no MaxLength on its keys
@@ -0,0 +1,55 @@
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.models.schemas import ODataGetRequest, ODataPostRequest
+from app.services.csrf_cache import csrf_cache
+from app.services.odata_client import ODataService
+from bench import load
+from bench.fake_gateway import FakeGateway, GatewayConfig, parse_filter
+
+
+def test_filter_subset_matches_build_filter_output():
+    pred = parse_filter("Customer eq '1001' and Amount gt 50 and substringof('o', Name)")
+    assert pred({"Customer": "1001", "Amount": 60.5, "Name": "Foo"})
+    assert not pred({"Customer": "1001", "Amount": 10, "Name": "Foo"})
+    assert parse_filter("(WAERS eq 'EUR' or WAERS eq 'USD')")({"WAERS": "USD"})
+    with pytest.raises(ValueError):
+        parse_filter("WAERS in ('EUR','USD')")     # not OData v2
+
+
+def test_service_pages_writes_and_batches_against_fake_gateway(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    csrf_cache.clear()
+    gw = FakeGateway(GatewayConfig(rows=50, page_size=20))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as client:
+            svc = ODataService(client)
+            req = ODataGetRequest(service="Z_SALES", entity="SalesItemSet", top=1000)
+            pages = [len(p) async for p in svc.iter_pages(req)]
+            count = await svc.count(ODataGetRequest(service="Z_SALES", entity="SalesItemSet",
+                                                    filters=[{"field": "Currency", "op": "eq", "value": "EUR"}]))
+            update = ODataPostRequest(action="update", service="Z_SALES", entity="SalesOrderSet",
+                                      key_fields={"SalesOrderId": "4500000003"}, payload={"Amount": 1}, confirm=True)
+            await svc.execute_post(update)
+            gw.expire_csrf_tokens()   # the next write gets 403 Required and must refetch the token
+            await svc.execute_post(update.model_copy(update={"payload": {"Amount": 2}}))
+            batch = await svc.execute_batch([update, update.model_copy(update={"key_fields": {"SalesOrderId": "missing"}})])
+            return pages, count, batch
+
+    pages, count, batch = asyncio.run(run())
+    assert pages == [20] * 7 + [10]
+    assert count == 50
+    assert gw.tables[("Z_SALES_SRV", "SalesOrderSet")][3]["Amount"] == 1
+    assert [r.ok for r in batch] == [True, False] and batch[1].status_code == 404
+
+
+def test_load_driver_reports_percentiles():
+    results = asyncio.run(load.run(["odata_get", "odata_post"], requests=20, concurrency=4,
+                                   gateway_config=GatewayConfig(rows=100), warmup=0))
+    assert [r["scenario"] for r in results] == ["odata_get", "odata_post"]
+    for r in results:
+        assert r["requests"] == 20 and r["errors"] == 0
+        assert 0 < r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+    assert load.compare(results, [{**results[0], "p95_ms": results[0]["p95_ms"] / 10}], 0.2)
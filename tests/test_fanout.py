@@ -0,0 +1,40 @@
+import asyncio
+import httpx
+from app.core.config import settings
+from app.models.schemas import ODataGetRequest
+from app.services.odata_client import ODataService
+from app.utils.url_builder import build_count_url, build_get_url
+
+ROWS = [{"EBELN": f"{i:010d}"} for i in range(95)]
+
+
+def test_count_and_inlinecount_urls():
+    assert build_count_url("http://h", "S_SRV", "ASet", [{"field": "A", "op": "eq", "value": "1"}]) == \
+        "http://h/S_SRV/ASet/$count?%24filter=A%20eq%20%271%27"
+    assert build_get_url("http://h", "S_SRV", "ASet", top=1, inlinecount="allpages").endswith("%24top=1&%24inlinecount=allpages")
+
+
+def test_parallel_windows_are_reassembled_in_order(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    inflight = {"now": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/$count"):
+            return httpx.Response(200, text=str(len(ROWS)))
+        assert request.url.params["$orderby"] == "EBELN"
+        inflight["now"] += 1
+        inflight["peak"] = max(inflight["peak"], inflight["now"])
+        skip, top = int(request.url.params.get("$skip", "0")), int(request.url.params["$top"])
+        # later windows answer first to prove reordering
+        await asyncio.sleep(0.01 * (10 - skip // 10))
+        inflight["now"] -= 1
+        return httpx.Response(200, json={"d": {"results": ROWS[skip:skip + top]}})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            req = ODataGetRequest(service="Z_MM_PURCHASE", entity="POHeaderSet", top=10, parallel=4)
+            return await ODataService(client).execute_get(req)
+
+    body = asyncio.run(run())
+    assert body["d"]["results"] == ROWS
+    assert 1 < inflight["peak"] <= 4
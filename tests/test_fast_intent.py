@@ -0,0 +1,29 @@
+from app.services.fast_intent import fast_parse
+
+
+def test_full_query_is_parsed_with_high_confidence():
+    r = fast_parse("top 50 SalesOrderSet where Customer eq 1000 order by CreatedOn desc")
+    assert r.confidence == 1.0
+    assert r.intent_json == {
+        "intent": "get", "service": "Z_SALES", "entity": "SalesOrderSet", "top": 50, "skip": 0,
+        "orderby": "CreatedOn desc", "filters": [{"field": "Customer", "op": "eq", "value": "1000"}],
+    }
+
+
+def test_bare_number_maps_to_key_field():
+    r = fast_parse("show PO 4500001234")
+    assert r.intent_json["entity"] == "POHeaderSet"
+    assert r.intent_json["filters"] == [{"field": "EBELN", "op": "eq", "value": "4500001234"}]
+    assert r.confidence >= 0.8
+
+
+def test_unknown_words_writes_and_disallowed_services_fall_back():
+    assert fast_parse("open sales orders for customer 1000").confidence < 0.8
+    assert fast_parse("create PO header for vendor 100045") is None
+    assert fast_parse("show PO 4500001234", allowed_services=["Z_SALES"]) is None
+
+
+def test_years_dates_and_ordinals_are_not_key_values():
+    for message in ("show sales orders from 2024", "sales orders from 2025-01-01",
+                    "list sales orders of the 2nd", "show PO 12345", "sales items 2024"):
+        assert fast_parse(message) is None, message
@@ -0,0 +1,34 @@
+import asyncio
+import sys
+from app.core import http as http_pool
+from app.core.config import settings
+from app.services.odata_client import ODataService
+
+
+def test_services_share_pooled_client(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+
+    async def run():
+        client = await http_pool.startup_http_client()
+        a, b = ODataService(), ODataService()
+        assert a.session is client and b.session is client
+        assert http_pool.pool_stats()["started"] is True
+        await http_pool.shutdown_http_client()
+        assert client.is_closed
+        assert http_pool.pool_stats()["started"] is False
+
+    asyncio.run(run())
+
+
+def test_pool_stats_report_http2_as_applied(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_HTTP2", True)
+    monkeypatch.setitem(sys.modules, "h2", None)     # h2 missing: the client falls back to HTTP/1.1
+
+    async def run():
+        await http_pool.startup_http_client()
+        try:
+            return http_pool.pool_stats()["http2"]
+        finally:
+            await http_pool.shutdown_http_client()
+
+    assert asyncio.run(run()) is False
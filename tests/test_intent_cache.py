@@ -0,0 +1,22 @@
+from app.services.intent_cache import IntentCache, normalize_message
+
+
+def test_normalization_collapses_trivial_variants():
+    assert normalize_message("  Open  Sales Orders for customer 1000?? ") == "open sales orders for customer 1000"
+
+
+def test_only_get_intents_are_cached_and_keyed_by_allowed_services():
+    cache = IntentCache(maxsize=2, ttl=60)
+    get = {"intent": "get", "service": "Z_SALES", "entity": "SalesOrderSet"}
+    cache.put("open orders", get)
+    cache.put("create order", {"intent": "create", "service": "Z_SALES", "entity": "SalesOrderSet", "payload": {}})
+
+    hit = cache.get("Open orders.")
+    assert hit == get and hit is not get
+    assert cache.get("create order") is None
+    assert cache.get("open orders", ["Z_SALES"]) is None
+
+    cache.put("a", get)
+    cache.put("b", get)
+    assert cache.get("open orders") is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+from app.core.metrics import Counter, Histogram, render, timed
+from app.main import app
+from app.services.odata_client import _metric_labels
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = []     # kept off the process-wide /metrics list
+    h = Histogram("t_latency_seconds", "test", ("op",), buckets=(0.1, 1.0), registry=registry)
+    c = Counter("t_calls_total", "test", ("op",), registry=registry)
+
+    @timed(h, lambda x: ("sq",))
+    def square(x):
+        return x * x
+
+    assert square(3) == 9
+    h.observe(0.5, "manual")
+    c.inc("a")
+    c.inc("a", amount=2)
+    text = render(registry)
+    assert 't_latency_seconds_bucket{op="manual",le="1"} 1' in text
+    assert 't_latency_seconds_bucket{op="manual",le="0.1"} 0' in text
+    assert 't_latency_seconds_count{op="sq"} 1' in text
+    assert 't_calls_total{op="a"} 3' in text
+    assert "t_calls_total" not in render()
+
+
+def test_odata_labels_only_carry_registry_names():
+    assert _metric_labels("get", "Z_SALES", "SalesOrderSet") == ("get", "Z_SALES", "SalesOrderSet")
+    assert _metric_labels("get", "Z_SALES", "Nope'); --") == ("get", "Z_SALES", "other")
+    assert _metric_labels("get", "RANDOM_4711", "X") == ("get", "other", "other")
+
+
+def test_metrics_endpoint_reports_route_latency():
+    with TestClient(app) as client:
+        client.get("/")
+        body = client.get("/metrics").text
+    assert '# TYPE app_http_request_duration_seconds histogram' in body
+    assert 'app_http_requests_total{route="/",method="GET",status="200"}' in body
+    assert 'sap_pool_connections{state="active"}' in body
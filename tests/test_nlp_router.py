@@ -0,0 +1,47 @@
+import json
+import os
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from app.core.config import settings
+from app.data import registry as registry_store
+from app.services import nlp_router
+
+
+@pytest.fixture
+def registry_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    path = tmp_path / "registry.json"
+    doc = {"services": {"S": {"name": "S", "base_path": "S_SRV", "entities": {
+        "ASet": {"name": "ASet", "path": "ASet", "key_fields": ["Id"], "fields": ["Id", "Name"]}}},
+        "T": {"name": "T", "base_path": "T_SRV", "entities": {
+        "BSet": {"name": "BSet", "path": "BSet", "key_fields": ["No"], "fields": ["No"]}}}}}
+    path.write_text(json.dumps(doc))
+    store = registry_store.RegistryStore(path, reload_interval=0)
+    registry_store.set_store(store)
+    nlp_router._chain_cache.clear()
+    yield path, doc, store
+    registry_store.set_store(None)
+    nlp_router._chain_cache.clear()
+
+
+def test_chain_is_cached_per_registry_version_and_filter(registry_file):
+    path, doc, store = registry_file
+    first = nlp_router.get_chain()
+    assert nlp_router.get_chain() is first
+    assert "S ASet k=Id f=Id,Name" in first.system_prompt
+    assert first.prompt_tokens > 0
+
+    only_t = nlp_router.get_chain(["T"])
+    assert only_t is not first
+    assert "ASet" not in only_t.system_prompt and "T BSet" in only_t.system_prompt
+
+    doc["services"]["S"]["entities"]["ASet"]["fields"].append("City")
+    path.write_text(json.dumps(doc))
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 5))
+    store.refresh()
+    rebuilt = nlp_router.get_chain()
+    assert rebuilt is not first and rebuilt.registry_version == 2
+    assert "f=Id,Name,City" in rebuilt.system_prompt
@@ -0,0 +1,75 @@
+import asyncio
+import httpx
+from app.core.config import settings
+from app.services.oauth_token import OAuthTokenProvider, set_token_provider
+from app.services.odata_client import ODataService
+
+
+def _token_endpoint(calls, expires_in=3600):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"access_token": f"tok{len(calls)}", "expires_in": expires_in})
+    return handler
+
+
+def test_concurrent_callers_share_one_grant():
+    calls = []
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_token_endpoint(calls))) as client:
+            provider = OAuthTokenProvider("http://idp.local/token", "cid", "secret", scope="openid", client=client)
+            tokens = await asyncio.gather(*[provider.get_token() for _ in range(10)])
+            assert set(tokens) == {"tok1"}
+            assert await provider.get_token() == "tok1"
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    body = calls[0].content.decode()
+    assert "grant_type=client_credentials" in body and "scope=openid" in body
+    assert calls[0].headers["authorization"].startswith("Basic ")
+
+
+def test_token_near_expiry_is_served_while_refreshing_in_background():
+    calls = []
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_token_endpoint(calls, expires_in=30))) as client:
+            provider = OAuthTokenProvider("http://idp.local/token", "cid", "secret", refresh_margin=60, client=client)
+            assert await provider.get_token() == "tok1"
+            # inside the refresh margin: the current token is returned immediately
+            assert await provider.get_token() == "tok1"
+            await provider._refresh_task
+            assert await provider.get_token() == "tok2"
+
+    asyncio.run(run())
+
+
+def test_rejected_token_is_refreshed_once_and_the_request_retried(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    monkeypatch.setattr(settings, "SAP_AUTH_MODE", "oauth2")
+    calls, seen, accepted = [], [], {"Bearer tok2"}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "idp.local":
+            return await _token_endpoint(calls)(request)
+        seen.append(request.headers["authorization"])
+        return httpx.Response(200 if request.headers["authorization"] in accepted else 401)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            set_token_provider(OAuthTokenProvider("http://idp.local/token", "cid", "secret", client=client))
+            svc = ODataService(client)
+            url = "http://sap.local/Z_SALES_SRV/SalesOrderSet"
+            ok = await svc._request_with_retry("GET", url, headers=await svc._auth_headers())
+            accepted.clear()   # every token rejected now: one refresh, then the 401 is returned
+            denied = await svc._request_with_retry("GET", url, headers=await svc._auth_headers())
+            return ok.status_code, denied.status_code
+
+    try:
+        statuses = asyncio.run(run())
+    finally:
+        set_token_provider(None)
+    assert statuses == (200, 401)
+    assert seen == ["Bearer tok1", "Bearer tok2", "Bearer tok2", "Bearer tok3"]
+    assert len(calls) == 3
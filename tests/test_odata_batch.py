@@ -0,0 +1,68 @@
+import asyncio
+import json
+import re
+import httpx
+from app.core.config import settings
+from app.models.schemas import ODataPostRequest
+from app.services.csrf_cache import csrf_cache
+from app.services.odata_batch import BatchOperation, build_batch_body, parse_batch_response
+from app.services.odata_client import ODataService
+
+
+def _fake_batch_gateway(calls):
+    """Answers each changeset: 201 per operation, or one 400 if any payload has Customer=BAD."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, headers={"x-csrf-token": "tok"})
+        calls.append(str(request.url))
+        body = request.content.decode()
+        out = ["--resp"]
+        for cs in re.split(r"--batch_\w+\r\nContent-Type: multipart/mixed; boundary=changeset_\w+\r\n\r\n", body)[1:]:
+            payloads = [json.loads(p) for p in re.findall(r"Content-Length: \d+\r\n\r\n(\{.*?\})\r\n", cs)]
+            if any(p.get("Customer") == "BAD" for p in payloads):
+                out += ["Content-Type: application/http", "", "HTTP/1.1 400 Bad Request", "Content-Type: application/json", "",
+                        '{"error":"bad"}', "--resp"]
+                continue
+            out += ["Content-Type: multipart/mixed; boundary=cs", "", ]
+            for p in payloads:
+                out += ["--cs", "Content-Type: application/http", "", "HTTP/1.1 201 Created", "Content-Type: application/json", "",
+                        json.dumps({"d": p})]
+            out += ["--cs--", "--resp"]
+        out[-1] = "--resp--"
+        return httpx.Response(202, headers={"content-type": "multipart/mixed; boundary=resp"}, content="\r\n".join(out).encode())
+    return handler
+
+
+def test_batch_body_round_trip():
+    ctype, body = build_batch_body([[BatchOperation(method="PATCH", path="SalesOrderSet('1')", payload={"A": 1})]])
+    assert ctype.startswith("multipart/mixed; boundary=batch_")
+    text = body.decode()
+    assert "PATCH SalesOrderSet('1') HTTP/1.1\r\n" in text and text.endswith("--\r\n")
+    resp = ("--b\r\nContent-Type: application/http\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n\r\n--b--\r\n").encode()
+    [[part]] = parse_batch_response("multipart/mixed; boundary=b", resp)
+    assert part.status_code == 204 and part.body is None
+
+
+def test_execute_batch_groups_by_service_and_maps_results_by_index(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    csrf_cache.clear()
+    calls = []
+    ops = [
+        ODataPostRequest(action="create", service="Z_SALES", entity="SalesOrderSet", payload={"Customer": "1"}),
+        ODataPostRequest(action="update", service="Z_MM_PURCHASE", entity="POHeaderSet", key_fields={"EBELN": "45"}, payload={"LIFNR": "9"}),
+        ODataPostRequest(action="create", service="Z_SALES", entity="SalesOrderSet", payload={"Customer": "BAD"}),
+        ODataPostRequest(action="create", service="Z_SALES", entity="NoSuchSet", payload={}),
+        ODataPostRequest(action="create", service="Z_SALES", entity="SalesOrderSet", payload={"Customer": "3"}),
+    ]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_fake_batch_gateway(calls))) as client:
+            return await ODataService(client).execute_batch(ops, batch_size=2)
+
+    results = asyncio.run(run())
+    assert [r.index for r in results] == [0, 1, 2, 3, 4]
+    assert [r.ok for r in results] == [True, True, False, False, True]
+    assert results[0].data == {"d": {"Customer": "1"}}
+    assert results[2].status_code == 400
+    assert "NoSuchSet" in results[3].error
+    assert sorted(calls) == ["http://sap.local/Z_MM_PURCH_SRV/$batch", "http://sap.local/Z_SALES_SRV/$batch", "http://sap.local/Z_SALES_SRV/$batch"]
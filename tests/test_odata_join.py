@@ -0,0 +1,120 @@
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.models.schemas import ODataJoinRequest, ODataPostRequest
+from app.services.odata_client import ODataService
+from app.services.odata_join import hash_join, key_chunks
+from app.services.query_planner import QueryValidationError
+from app.services.response_cache import response_cache
+from bench.fake_gateway import FakeGateway, GatewayConfig
+
+
+def test_hash_join_nests_matching_items():
+    headers = [{"EBELN": "1"}, {"EBELN": "2"}]
+    items = [{"EBELN": "1", "EBELP": 10}, {"EBELN": "3", "EBELP": 10}, {"EBELN": "1", "EBELP": 20}]
+    joined = hash_join(headers, items, ("EBELN",), "items")
+    assert [len(h["items"]) for h in joined] == [2, 0]
+    assert [i["EBELP"] for i in joined[0]["items"]] == [10, 20]
+
+
+def test_key_chunks_respect_count_and_width():
+    values = ["a", "bb", "ccc", "d", "e"]
+    assert key_chunks(values, 2) == [["a", "bb"], ["ccc", "d"], ["e"]]
+    assert key_chunks(values, 10, len, 3) == [["a", "bb"], ["ccc"], ["d", "e"]]
+    assert key_chunks(["toolong"], 10, len, 3) == [["toolong"]]
+
+
+def _run(gw, *reqs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as client:
+            svc = ODataService(client)
+            return [await svc.execute_get_joined(r) for r in reqs]
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    monkeypatch.setattr(settings, "ODATA_JOIN_CHUNK_SIZE", 4)
+    response_cache.clear()
+    yield FakeGateway(GatewayConfig(rows=30, items_per_header=3))
+    response_cache.clear()
+
+
+def test_expand_and_join_strategies_agree(gateway):
+    base = dict(service="Z_SALES", header="SalesOrderSet", items="SalesItemSet", top=10,
+                header_fields=["SalesOrderId", "Customer"], item_fields=["ItemNo", "Material"])
+    (s1, expanded), (s2, joined) = _run(gateway, ODataJoinRequest(**base), ODataJoinRequest(**base, strategy="join"))
+    assert (s1, s2) == ("expand", "join")
+    ex, jo = expanded["d"]["results"], joined["d"]["results"]
+    assert len(ex) == len(jo) == 10
+    assert [[i["ItemNo"] for i in h["items"]] for h in ex] == [[i["ItemNo"] for i in h["items"]] for h in jo] == [["00010", "00020", "00030"]] * 10
+    assert "ToItems" not in ex[0] and set(ex[0]["items"][0]) == {"ItemNo", "Material"}
+
+
+def test_join_chunks_header_keys_and_reads_by_key_concurrently(gateway):
+    (strategy, body), (_, by_key) = _run(gateway,
+        ODataJoinRequest(service="Z_MM_PURCHASE", header="POHeaderSet", items="POItemSet", top=10,
+                         item_filters=[{"field": "EBELP", "op": "ne", "value": "00030"}]),
+        ODataJoinRequest(service="Z_MM_PURCHASE", header="POHeaderSet", items="POItemSet",
+                         filters=[{"field": "EBELN", "op": "in", "value": ["4500000001", "4500000002"]}]))
+    assert strategy == "join"   # no navigation in the registry
+    headers = body["d"]["results"]
+    assert len(headers) == 10 and all([i["EBELP"] for i in h["items"]] == ["00010", "00020"] for h in headers)
+    assert [len(h["items"]) for h in by_key["d"]["results"]] == [3, 3]
+
+
+def test_expand_requires_a_navigation(gateway):
+    with pytest.raises(QueryValidationError):
+        _run(gateway, ODataJoinRequest(service="Z_MM_PURCHASE", header="POHeaderSet", items="POItemSet", strategy="expand"))
+
+
+def test_join_pushes_keys_as_or_groups_sized_to_the_url(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "ODATA_JOIN_CHUNK_SIZE", 100)
+    monkeypatch.setattr(settings, "ODATA_JOIN_MAX_FILTER_LENGTH", 150)   # four encoded `EBELN eq '45...' or ` terms
+    req = ODataJoinRequest(service="Z_MM_PURCHASE", header="POHeaderSet", items="POItemSet", top=10)
+    before = gateway.requests.get("GET", 0)
+    (_, body), = _run(gateway, req)
+    assert all(len(h["items"]) == 3 for h in body["d"]["results"])
+    assert gateway.requests["GET"] - before == 1 + 3    # headers, then 10 keys in chunks of 4, 4, 2
+
+
+def test_item_write_drops_cached_expanded_reads(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "SAP_GET_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SAP_GET_CACHE_TTL", 30)
+    req = ODataJoinRequest(service="Z_SALES", header="SalesOrderSet", items="SalesItemSet", top=2,
+                           item_fields=["ItemNo", "Material"])
+    first_item = {"SalesOrderId": "4500000000", "ItemNo": "00010"}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app)) as client:
+            svc = ODataService(client)
+            _, before = await svc.execute_get_joined(req)
+            await svc.execute_post(ODataPostRequest(action="update", service="Z_SALES", entity="SalesItemSet",
+                                                    key_fields=first_item, payload={"Material": "NEW-1"}, confirm=True))
+            _, after = await svc.execute_get_joined(req)
+            return before, after
+
+    before, after = asyncio.run(run())
+    assert before["d"]["results"][0]["items"][0]["Material"] != "NEW-1"
+    assert after["d"]["results"][0]["items"][0]["Material"] == "NEW-1"
+
+
+def test_item_read_is_limited_to_the_returned_header_page(gateway):
+    urls = []
+    keys = [f"45000000{i:02d}" for i in range(10)]
+    req = ODataJoinRequest(service="Z_MM_PURCHASE", header="POHeaderSet", items="POItemSet", top=2, orderby="EBELN",
+                           filters=[{"field": "EBELN", "op": "in", "value": keys}])
+
+    async def run():
+        async def record(request):
+            urls.append(str(request.url))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app),
+                                     event_hooks={"request": [record]}) as client:
+            return await ODataService(client).execute_get_joined(req)
+
+    _, body = asyncio.run(run())
+    item_urls = [u for u in urls if "/POItemSet" in u]
+    assert [h["EBELN"] for h in body["d"]["results"]] == keys[:2]
+    assert len(item_urls) == 1 and all(k in item_urls[0] for k in keys[:2]) and keys[2] not in item_urls[0]
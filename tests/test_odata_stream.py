@@ -0,0 +1,55 @@
+import json
+import httpx
+from fastapi.testclient import TestClient
+from app.api import odata
+from app.core.config import settings
+from app.main import app
+from app.services.odata_client import ODataService
+
+ROWS = [{"__metadata": {"uri": f"x{i}"}, "SalesOrderId": str(i), "Customer": "1000"} for i in range(25)]
+
+
+def _paged_gateway(seen):
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        token = int(request.url.params.get("$skiptoken", "0"))
+        page = ROWS[token:token + 10]
+        body = {"d": {"results": page}}
+        if token + 10 < len(ROWS):
+            body["d"]["__next"] = f"SalesOrderSet?$skiptoken={token + 10}"
+        return httpx.Response(200, json=body)
+    return handler
+
+
+def _client(monkeypatch, seen):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    http = httpx.AsyncClient(transport=httpx.MockTransport(_paged_gateway(seen)))
+    app.dependency_overrides[odata.get_service] = lambda: ODataService(http)
+    return TestClient(app)
+
+
+def test_stream_follows_next_links_as_ndjson(monkeypatch):
+    seen = []
+    try:
+        resp = _client(monkeypatch, seen).post("/api/odata/get/stream", json={"service": "Z_SALES", "entity": "SalesOrderSet", "top": 10})
+    finally:
+        app.dependency_overrides.clear()
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [r["SalesOrderId"] for r in rows] == [str(i) for i in range(25)]
+    assert "__metadata" not in rows[0]
+    assert len(seen) == 3 and "Z_SALES_SRV/SalesOrderSet?$skiptoken=20" in seen[-1]
+
+
+def test_stream_csv_honors_limit(monkeypatch):
+    seen = []
+    try:
+        resp = _client(monkeypatch, seen).post("/api/odata/get/stream", json={
+            "service": "Z_SALES", "entity": "SalesOrderSet", "top": 10, "limit": 12,
+            "format": "csv", "fields": ["SalesOrderId", "Customer"]})
+    finally:
+        app.dependency_overrides.clear()
+    lines = resp.text.splitlines()
+    assert lines[0] == "SalesOrderId,Customer"
+    assert len(lines) == 13 and lines[-1] == "11,1000"
+    assert len(seen) == 2
@@ -0,0 +1,88 @@
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.models.schemas import ODataGetRequest
+from app.services.odata_client import ODataService
+from app.services.query_planner import QueryValidationError, clear_plans, collapse_filters, plan_query, plan_stats
+from app.services.response_cache import response_cache
+from bench.fake_gateway import FakeGateway, GatewayConfig
+
+
+def _req(entity="POHeaderSet", service="Z_MM_PURCHASE", **kw):
+    return ODataGetRequest(service=service, entity=entity, **kw)
+
+
+def test_key_lookup_rewrite_and_default_select():
+    plan = plan_query(_req(filters=[{"field": "EBELN", "op": "eq", "value": "4500001234"},
+                                    {"field": "EBELN", "op": "eq", "value": "4500001234"}]))
+    assert plan.key == {"EBELN": "4500001234"}
+    assert plan.url("http://h", 100, 0) == "http://h/Z_MM_PURCH_SRV/POHeaderSet('4500001234')?%24select=EBELN%2CLIFNR%2CBEDAT%2CBSART%2CWAERS"
+    # a partial composite key, an extra predicate or paging keeps the collection read
+    assert plan_query(_req("POItemSet", filters=[{"field": "EBELN", "value": "1"}])).key is None
+    assert plan_query(_req(filters=[{"field": "EBELN", "value": "1"}, {"field": "LIFNR", "value": "2"}])).key is None
+    assert plan_query(_req(filters=[{"field": "EBELN", "value": "1"}], skip=5)).key is None
+
+
+def test_collapse_predicates():
+    f = lambda op, v, field="A": {"field": field, "op": op, "value": v}
+    types = {"A": "int", "B": "string", "D": "decimal"}
+    collapse = lambda filters: collapse_filters(filters, types)
+    assert collapse([f("eq", 1), f("eq", 1)]) == [f("eq", 1)]
+    assert collapse([f("gt", 5), f("ge", 10), f("le", 20), f("lt", 30)]) == [f("ge", 10), f("le", 20)]
+    assert collapse([f("eq", 7), f("gt", 5), f("ne", 3)]) == [f("eq", 7)]
+    assert collapse([f("in", [1, 2, 3]), f("in", [3, 4])]) == [f("eq", 3)]
+    assert collapse([f("ge", 4), f("le", 4), f("like", "x", "B")]) == [f("eq", 4), f("like", "x", "B")]
+    for contradiction in ([f("eq", 1), f("eq", 2)], [f("eq", 1), f("gt", 1)], [f("gt", 5), f("lt", 2)],
+                          [f("in", [1]), f("in", [2])], [f("eq", "a", "B"), f("ne", "a", "B")],
+                          [f("eq", 1), f("eq", "2")]):
+        assert collapse(contradiction) is None
+    # values compare as the field's type: 1 and "1" are the same int
+    assert collapse([f("eq", 1), f("eq", "1")]) == [f("eq", 1)]
+
+
+def test_string_values_on_numeric_fields_compare_as_numbers():
+    f = lambda op, v, field="D": {"field": field, "op": op, "value": v}
+    bounds = [f("gt", "9"), f("lt", "10")]
+    assert collapse_filters(bounds, {"D": "decimal"}) == bounds          # '9' < '10' as numbers
+    assert collapse_filters([f("gt", "10"), f("lt", "9.5")], {"D": "decimal"}) is None
+    plan = plan_query(_req("SalesOrderSet", "Z_SALES", filters=[{"field": "Amount", "op": "gt", "value": "9"},
+                                                               {"field": "Amount", "op": "lt", "value": "10"}]))
+    assert not plan.empty and len(plan.filters) == 2
+    # untyped fields, or values that do not convert, are left for the gateway
+    assert collapse_filters([f("gt", "9", "X"), f("lt", "10", "X")]) == [f("gt", "9", "X"), f("lt", "10", "X")]
+    assert collapse_filters([f("eq", "a"), f("eq", "b")], {"D": "decimal"}) == [f("eq", "a"), f("eq", "b")]
+
+
+def test_validation_and_plan_cache():
+    clear_plans()
+    with pytest.raises(QueryValidationError):
+        plan_query(_req(fields=["EBELN", "NOPE"]))
+    with pytest.raises(QueryValidationError):
+        plan_query(_req(orderby="BEDAT sideways"))
+    before = plan_stats()["hits"]
+    for v in ("1", "2", "3"):
+        plan_query(_req(filters=[{"field": "LIFNR", "value": v}], orderby="BEDAT DESC"))
+    assert plan_stats()["hits"] == before + 2
+    assert plan_query(_req(orderby="BEDAT DESC")).template.orderby == "BEDAT desc"
+
+
+def test_service_reshapes_key_lookups_and_skips_empty_plans(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    response_cache.clear()
+    gw = FakeGateway(GatewayConfig(rows=10))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as client:
+            svc = ODataService(client)
+            found = await svc.execute_get(_req(filters=[{"field": "EBELN", "value": "4500000003"}]))
+            missing = await svc.execute_get(_req(filters=[{"field": "EBELN", "value": "nope"}]))
+            calls = dict(gw.requests)
+            empty = await svc.execute_get(_req(filters=[{"field": "BEDAT", "value": "2025-01-01"},
+                                                        {"field": "BEDAT", "value": "2025-02-01"}]))
+            return found, missing, calls, empty
+
+    found, missing, calls, empty = asyncio.run(run())
+    assert [r["EBELN"] for r in found["d"]["results"]] == ["4500000003"]
+    assert missing == {"d": {"results": []}}
+    assert empty == {"d": {"results": []}} and gw.requests == calls
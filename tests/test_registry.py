@@ -0,0 +1,37 @@
+import json
+import os
+import pytest
+from app.data.registry import RegistryStore, get_registry
+
+
+def test_bundled_registry_is_indexed():
+    reg = get_registry()
+    svc, ent = reg.entity("Z_MM_PURCHASE", "POHeaderSet")
+    assert svc.base_path == "Z_MM_PURCH_SRV"
+    assert ent.key_set == frozenset({"EBELN"})
+    assert "LIFNR" in ent.field_set
+    assert reg.out.services["Z_SALES"].entities["SalesItemSet"].key_fields == ["SalesOrderId", "ItemNo"]
+    with pytest.raises(ValueError):
+        reg.entity("Z_SALES", "Nope")
+
+
+def test_hot_reload_bumps_version_only_on_content_change(tmp_path):
+    path = tmp_path / "registry.json"
+    doc = {"services": {"S": {"name": "S", "base_path": "S_SRV", "entities": {
+        "ASet": {"name": "ASet", "path": "ASet", "key_fields": ["Id"], "fields": ["Id"]}}}}}
+    path.write_text(json.dumps(doc))
+    store = RegistryStore(path, reload_interval=0)
+    first = store.get()
+    assert first.version == 1
+
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert store.refresh().version == 1
+
+    doc["services"]["S"]["entities"]["BSet"] = {"name": "BSet", "path": "BSet", "key_fields": ["Id"], "fields": ["Id"]}
+    path.write_text(json.dumps(doc))
+    os.utime(path, (st.st_atime, st.st_mtime + 20))
+    second = store.refresh()
+    assert second.version == 2
+    assert "BSet" in second.services["S"].entities
+    assert "BSet" not in first.services["S"].entities
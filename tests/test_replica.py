@@ -0,0 +1,116 @@
+import asyncio
+from decimal import Decimal
+import httpx
+import pytest
+from app.core.config import settings
+from app.models.schemas import ODataGetRequest, ODataPostRequest
+from app.services.odata_client import ODataService, extract_rows
+from app.services.replica import ReplicaStore, set_replica
+from app.services.response_cache import response_cache
+from app.utils.result_format import clean_rows
+from bench.fake_gateway import FakeGateway, GatewayConfig
+
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://fake-sap")
+    monkeypatch.setattr(settings, "SAP_GET_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "REPLICA_PAGE_SIZE", 50)
+    store = ReplicaStore(tmp_path / "replica.sqlite3")
+    set_replica(store)
+    response_cache.clear()
+    yield store
+    set_replica(None)
+    store.close()
+
+
+def _run(gw, work):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gw.app)) as client:
+            return await work(ODataService(client))
+    return asyncio.run(run())
+
+
+def _orders(**kw):
+    return ODataGetRequest(service="Z_SALES", entity="SalesOrderSet", **kw)
+
+
+QUERIES = [
+    _orders(top=5, skip=3),
+    _orders(fields=["SalesOrderId", "Amount"], filters=[{"field": "Amount", "op": "gt", "value": 500},
+                                                        {"field": "Customer", "op": "in", "value": ["1003", "1010"]}],
+            orderby="Amount desc", top=20),
+    _orders(filters=[{"field": "CreatedOn", "op": "ge", "value": "2025-11-01"},
+                     {"field": "Currency", "op": "ne", "value": "EUR"}], orderby="CreatedOn,SalesOrderId desc", top=50),
+    _orders(filters=[{"field": "SalesOrderId", "value": "4500000042"}]),
+    _orders(filters=[{"field": "Currency", "op": "like", "value": "U"}], top=20),
+    _orders(filters=[{"field": "Currency", "op": "like", "value": "u"}]),     # substringof is case-sensitive
+]
+
+
+def test_synced_set_answers_reads_like_the_gateway(replica, monkeypatch):
+    gw = FakeGateway(GatewayConfig(rows=300))
+
+    async def work(svc):
+        monkeypatch.setattr(settings, "REPLICA_ENABLED", False)
+        live = [clean_rows(extract_rows(await svc.execute_get(q))[0]) for q in QUERIES]
+        monkeypatch.setattr(settings, "REPLICA_ENABLED", True)
+        synced = await replica.sync(svc)
+        before = gw.requests["GET"]
+        local = [clean_rows(extract_rows(await svc.execute_get(q))[0]) for q in QUERIES]
+        return live, synced, before, local
+
+    live, synced, before, local = _run(gw, work)
+    assert synced["Z_SALES.SalesOrderSet"] == {"mode": "full", "fetched": 300, "rows": 300, "watermark": "2025-12-28"}
+    assert synced["Z_MM_PURCHASE.POHeaderSet"]["rows"] == 300
+    assert gw.requests["GET"] == before          # every query answered locally
+    assert local == live and replica.hits == len(QUERIES)
+
+
+def test_incremental_sync_write_through_and_staleness(replica, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICA_ENABLED", True)
+    gw = FakeGateway(GatewayConfig(rows=100))
+    orders = gw.tables[("Z_SALES_SRV", "SalesOrderSet")]
+    key = [{"field": "SalesOrderId", "value": "4500000007"}]
+
+    async def work(svc):
+        await replica.sync_entity(svc, "Z_SALES", "SalesOrderSet")
+        orders.append({"SalesOrderId": "4600000000", "Customer": "2000", "Amount": "1.00",
+                       "Currency": "EUR", "CreatedOn": "2026-01-15"})
+        again = await replica.sync_entity(svc, "Z_SALES", "SalesOrderSet")
+        new = await svc.execute_get(_orders(filters=[{"field": "Customer", "value": "2000"}]))
+        await svc.execute_post(ODataPostRequest(action="update", service="Z_SALES", entity="SalesOrderSet",
+                                                key_fields={"SalesOrderId": "4500000007"}, payload={"Currency": "CHF"},
+                                                confirm=True))
+        gets = gw.requests["GET"]
+        updated = await svc.execute_get(_orders(filters=key))
+        served_locally = gw.requests["GET"] == gets
+        monkeypatch.setattr(settings, "REPLICA_FULL_SYNC_INTERVAL", 1e-9)
+        await svc.execute_get(_orders(filters=key))     # CreatedOn misses updates: bounded by the full sync
+        monkeypatch.setattr(settings, "REPLICA_FULL_SYNC_INTERVAL", 86400)
+        monkeypatch.setattr(settings, "REPLICA_MAX_STALENESS", 1e-9)
+        await svc.execute_get(_orders(filters=key))
+        return again, new, updated, served_locally, gw.requests["GET"] - gets
+
+    again, new, updated, served_locally, stale_gets = _run(gw, work)
+    assert again["mode"] == "incremental" and again["watermark"] == "2026-01-15"
+    assert again["fetched"] < 10 and again["rows"] == 101
+    assert [r["SalesOrderId"] for r in new["d"]["results"]] == ["4600000000"]
+    assert updated["d"]["results"][0]["Currency"] == "CHF" and served_locally
+    assert stale_gets == 2 and replica.stale == 2     # past either bound: back to the gateway
+
+
+def test_decimals_compare_and_sort_as_exact_numbers(replica, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICA_ENABLED", True)
+    gw = FakeGateway(GatewayConfig(rows=100))
+    expected = sorted((r["Amount"] for r in gw.tables[("Z_SALES_SRV", "SalesOrderSet")]
+                       if Decimal(r["Amount"]) >= Decimal("100.1")), key=Decimal, reverse=True)
+
+    async def work(svc):
+        await replica.sync_entity(svc, "Z_SALES", "SalesOrderSet")
+        return await svc.execute_get(_orders(filters=[{"field": "Amount", "op": "ge", "value": 100.1}],
+                                             orderby="Amount desc", top=100))
+
+    body = _run(gw, work)
+    assert replica.hits == 1 and len(expected) > 1
+    assert [r["Amount"] for r in body["d"]["results"]] == expected    # "13.70" < "100.1" as numbers, not as text
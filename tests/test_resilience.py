@@ -0,0 +1,86 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.core.config import settings
+from app.services import resilience
+from app.services.odata_client import ODataService
+from app.services.resilience import CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+@pytest.fixture(autouse=True)
+def _fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    monkeypatch.setattr(settings, "SAP_RETRY_BASE_DELAY", 0.001)
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+def _run(handler, method, url="http://sap.local/Z_SALES_SRV/SalesOrderSet"):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ODataService(client)._request_with_retry(method, url)
+    return asyncio.run(go())
+
+
+def test_reads_retry_honoring_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(503, headers={"retry-after": "0"}) if len(calls) == 1 else httpx.Response(200)
+
+    assert _run(handler, "GET").status_code == 200
+    assert calls == ["GET", "GET"]
+
+
+def test_writes_are_not_retried_on_502():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(502)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(handler, "PATCH")
+    assert calls == ["PATCH"]
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, cap=1)
+    assert budget.try_spend() is True
+    assert budget.try_spend() is False
+
+
+def test_breaker_opens_then_half_opens():
+    b = CircuitBreaker("svc", failure_threshold=2, reset_timeout=0.01)
+    b.record_failure()
+    b.record_failure()
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    time.sleep(0.02)
+    b.before_call()
+    assert b.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    b.record_success()
+    assert b.state == "closed"
+
+
+def test_open_circuit_fails_fast_without_calling_gateway(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BREAKER_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "SAP_RETRY_MAX_ATTEMPTS", 1)
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(500)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(handler, "GET")
+    with pytest.raises(CircuitOpenError):
+        _run(handler, "GET")
+    assert len(calls) == 1
+    assert resilience.resilience_stats()["breakers"]["Z_SALES_SRV"]["state"] == "open"
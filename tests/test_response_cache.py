@@ -0,0 +1,112 @@
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.models.schemas import ODataGetRequest, ODataPostRequest
+from app.services.csrf_cache import csrf_cache
+from app.services.odata_client import ODataService
+from app.services.response_cache import ResponseCache, response_cache
+
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    monkeypatch.setattr(settings, "SAP_GET_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SAP_GET_CACHE_TTL", 30)
+    response_cache.clear()
+    csrf_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def _gateway(counts):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("x-csrf-token") == "Fetch":
+            return httpx.Response(200, headers={"x-csrf-token": "t"})
+        if request.method != "GET":
+            return httpx.Response(204)
+        counts["get"] += 1
+        if request.headers.get("if-none-match") == '"v1"':
+            counts["304"] += 1
+            return httpx.Response(304)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, headers={"etag": '"v1"'}, json={"d": {"results": [{"n": counts["get"]}]}})
+    return handler
+
+
+def test_identical_gets_are_collapsed_cached_and_invalidated_by_writes():
+    counts = {"get": 0, "304": 0}
+    req = ODataGetRequest(service="Z_SALES", entity="SalesOrderSet")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_gateway(counts))) as client:
+            svc = ODataService(client)
+            first = await asyncio.gather(*[svc.execute_get(req) for _ in range(5)])
+            assert counts["get"] == 1 and all(r == first[0] for r in first)
+            await svc.execute_get(req)
+            assert counts["get"] == 1
+            await svc.execute_post(ODataPostRequest(service="Z_SALES", entity="SalesOrderSet", payload={"Customer": "1"}))
+            await svc.execute_get(req)
+            assert counts["get"] == 2
+
+    asyncio.run(run())
+    assert response_cache.stats()["coalesced"] == 4
+
+
+def test_expired_entry_with_etag_is_revalidated():
+    counts = {"get": 0, "304": 0}
+    cache = ResponseCache(max_bytes=1024)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_gateway(counts))) as client:
+            async def send(etag):
+                headers = {"If-None-Match": etag} if etag else {}
+                return await client.get("http://sap.local/x", headers=headers)
+            a = await cache.fetch("u", [("S", "E")], 0.001, send)
+            await asyncio.sleep(0.01)
+            b = await cache.fetch("u", [("S", "E")], 0.001, send)
+            return a, b
+
+    a, b = asyncio.run(run())
+    assert a == b and counts == {"get": 2, "304": 1}
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_concurrent_lookups_of_a_missing_key_share_the_404():
+    counts = {"get": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        counts["get"] += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(404, json={"error": {"message": {"value": "not found"}}})
+
+    req = ODataGetRequest(service="Z_MM_PURCHASE", entity="POHeaderSet",
+                          filters=[{"field": "EBELN", "value": "4599999999"}])
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            svc = ODataService(client)
+            return await asyncio.gather(svc.execute_get(req), svc.execute_get(req))
+
+    assert asyncio.run(run()) == [{"d": {"results": []}}] * 2
+    assert counts["get"] == 1 and response_cache.stats()["coalesced"] >= 1
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_followers():
+    cache = ResponseCache(max_bytes=1024)
+
+    async def send(etag):
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, content=b'{"d":{"results":[]}}')
+
+    async def run():
+        leader = asyncio.ensure_future(cache.fetch("u", [("S", "E")], 10, send))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.fetch("u", [("S", "E")], 10, send))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    (status, body), leader_cancelled = asyncio.run(run())
+    assert leader_cancelled and status == 200 and body == b'{"d":{"results":[]}}'
+    assert cache.stats()["inflight"] == 0 and cache.stats()["entries"] == 1
@@ -0,0 +1,33 @@
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.core import http as http_pool
+from app.core.config import settings
+from app.core.responses import splice_json
+from app.main import app
+from app.services.response_cache import response_cache
+
+UPSTREAM = b'{"d":{"results":[{"SalesOrderId":"1","Amount":1.50}, {"SalesOrderId":"2"}]}}'
+
+
+def test_splice_json_keeps_upstream_bytes_verbatim():
+    out = splice_json({"ok": True, "step": "get"}, "data", UPSTREAM)
+    assert out.endswith(b'"data":' + UPSTREAM + b"}")
+    assert json.loads(out)["data"] == json.loads(UPSTREAM)
+    assert json.loads(splice_json({}, "data", b"[]")) == {"data": []}
+
+
+@pytest.mark.parametrize("passthrough", [True, False])
+def test_get_endpoint_passthrough_matches_decoded_response(monkeypatch, passthrough):
+    monkeypatch.setattr(settings, "SAP_BASE_URL", "http://sap.local")
+    monkeypatch.setattr(settings, "ODATA_RAW_PASSTHROUGH", passthrough)
+    response_cache.clear()
+    http_pool.set_http_client(httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, content=UPSTREAM))))
+    try:
+        r = TestClient(app).post("/api/odata/get", json={"service": "Z_SALES", "entity": "SalesOrderSet"})
+    finally:
+        http_pool.set_http_client(None)
+    assert r.status_code == 200
+    assert r.json() == {"ok": True, "step": "get", "message": "GET executed", "data": json.loads(UPSTREAM)}
+    assert (UPSTREAM in r.content) is passthrough
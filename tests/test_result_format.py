@@ -0,0 +1,22 @@
+from app.utils.result_format import compact_rows
+
+ROWS = [
+    {"__metadata": {"uri": "x", "type": "Z.Item"}, "SalesOrderId": "1", "Qty": "2.000", "CreatedOn": "/Date(1735689600000)/",
+     "ToHeader": {"__deferred": {"uri": "y"}}},
+    {"__metadata": {"uri": "z", "type": "Z.Item"}, "SalesOrderId": "2", "Qty": "n/a", "CreatedOn": None,
+     "ToHeader": {"__deferred": {"uri": "w"}}},
+]
+TYPES = {"Qty": "decimal", "CreatedOn": "date"}
+
+
+def test_columnar_strips_metadata_and_types_values():
+    out = compact_rows(ROWS, None, TYPES, "columnar")
+    assert out == {"fields": ["SalesOrderId", "Qty", "CreatedOn"],
+                   "columns": [["1", "2"], ["2.000", "n/a"], ["2025-01-01", None]], "count": 2}
+
+
+def test_row_arrays_follow_requested_fields():
+    out = compact_rows(ROWS, ["Qty", "SalesOrderId"], TYPES, "rows")
+    assert out == {"fields": ["Qty", "SalesOrderId"], "rows": [["2.000", "1"], ["n/a", "2"]], "count": 2}
+    assert compact_rows([], None, TYPES, "rows") == {"fields": [], "rows": [], "count": 0}
+    assert compact_rows([{"Qty": 0.1}, {"Qty": 3}], None, TYPES, "rows")["rows"] == [["0.1"], ["3"]]